@@ -0,0 +1,107 @@
+"""
+Times `BoxUtility.merge_boxes` on dense detections against the original pairwise loop.
+
+    python -m benchmarks.box_merge --sizes 10 100 1000 5000
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+from utils import BoxUtility, ImageHandle
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+def detections(count: int, seed: int = 0) -> List[Dict[str, float]]:
+    """
+    Random normalized boxes clustered around a few hundred UI elements, so many of them overlap
+    """
+
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0.05, 0.95, size=(max(1, count // 4), 2))[rng.integers(0, max(1, count // 4), count)]
+    centers += rng.normal(0, 0.005, size=centers.shape)
+    sizes = rng.uniform(0.01, 0.08, size=(count, 2))
+
+    return [
+        {"x_min": x - w / 2, "y_min": y - h / 2, "x_max": x + w / 2, "y_max": y + h / 2}
+        for (x, y), (w, h) in zip(centers.tolist(), sizes.tolist())
+    ]
+
+
+def reference(box_utility: BoxUtility, image: ImageHandle, boxes: List[Dict], iou_threshold: float = 0.5) -> List:
+    """
+    The original `list.pop(0)` merge loop, kept to check equivalence
+    """
+
+    absolute_boxes = [box_utility.absolute_pixels(image, box) for box in boxes]
+    merged = []
+
+    while absolute_boxes:
+        current_box = absolute_boxes.pop(0)
+        overlapping_boxes = []
+
+        for box in absolute_boxes:
+            if box_utility.IOU(current_box, box) > iou_threshold:
+                current_box = (
+                    min(current_box[0], box[0]),
+                    min(current_box[1], box[1]),
+                    max(current_box[2], box[2]),
+                    max(current_box[3], box[3]),
+                )
+            else:
+                overlapping_boxes.append(box)
+
+        merged.append(current_box)
+        absolute_boxes = overlapping_boxes
+
+    return merged
+
+
+def timed(function, repeat: int) -> float:
+    """
+    Best of `repeat` runs, in seconds
+    """
+
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start_time)
+
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1_000, 5_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--nms", action="store_true", help="Also time the torchvision NMS mode")
+    args = parser.parse_args()
+
+    box_utility = BoxUtility()
+    image = ImageHandle(image=Image.new("RGB", (WIDTH, HEIGHT)))
+
+    for size in args.sizes:
+        boxes = detections(size)
+
+        expected = reference(box_utility, image, boxes)
+        merged = box_utility.merge_boxes(image, boxes)
+        assert merged == expected, f"merge_boxes diverged from the reference loop at {size} boxes"
+
+        results = {
+            "reference": timed(lambda: reference(box_utility, image, boxes), args.repeat),
+            "merge": timed(lambda: box_utility.merge_boxes(image, boxes), args.repeat),
+        }
+        if args.nms:
+            results["nms"] = timed(lambda: box_utility.merge_boxes(image, boxes, mode="nms"), args.repeat)
+
+        timings = " ".join(f"{name}={seconds * 1000:.2f}ms" for name, seconds in results.items())
+        print(f"[BoxMerge]: boxes={size} merged={len(merged)} {timings}")
+
+
+if __name__ == "__main__":
+    main()
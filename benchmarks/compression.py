@@ -0,0 +1,158 @@
+"""
+Measures compressed semantic cache storage: bytes per entry and recall at the hit threshold.
+
+    python -m benchmarks.compression --size 100000 --queries 1000
+    python -m benchmarks.compression --modes float32 int8 int8+rescore --output compression.json
+
+Each mode loads the same vectors into `NumpyVectorDB`. Queries are stored vectors plus noise of
+varying strength, so their best similarity spreads around SIMILARITY_THRESHOLD. Against the
+float32 run it reports:
+
+- agreement: same hit / miss decision
+- recall: float32 hits that return the same entry
+- near-threshold recall: the same, for float32 hits within 0.02 of the threshold
+
+Response compression is reported separately, on synthetic detection responses of varying size.
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from cache.compression import compress
+from constants import INDEX_DIMENSION, RESPONSE_COMPRESSION_THRESHOLD, SIMILARITY_THRESHOLD
+from database import NumpyVectorDB
+
+MODES = {
+    "float32": {"storage": "float32"},
+    "float16": {"storage": "float16"},
+    "int8": {"storage": "int8"},
+    "int8+rescore": {"storage": "int8", "rescore": 16},
+}
+
+
+def entries(vectors: np.ndarray, offset: int) -> List[Dict]:
+    """
+    Builds `insert_many` entries for `vectors`
+    """
+
+    return [
+        {
+            "key": f"query {offset + index}",
+            "embedding": vector,
+            "response": f"response {offset + index}",
+            "metadata": {"extras": {}, "timestamp": time.time(), "file_path": None},
+        }
+        for index, vector in enumerate(vectors)
+    ]
+
+
+def run(mode: str, vectors: np.ndarray, queries: np.ndarray, batch_size: int) -> Dict[str, Any]:
+    """
+    Loads `vectors` in `mode` and returns the matched entry (or `None`) and best score per query
+    """
+
+    db = NumpyVectorDB(name="bench", dimension=vectors.shape[1], capacity=len(vectors), **MODES[mode])
+    for offset in range(0, len(vectors), batch_size):
+        db.insert_many(entries(vectors[offset : offset + batch_size], offset))
+
+    start_time = time.perf_counter()
+    matches = [db.top_k(query, k=1)[0] for query in queries]
+    latency = (time.perf_counter() - start_time) / len(queries) * 1000
+
+    return {
+        "stats": db.stats(),
+        "latency_ms": latency,
+        "hits": [match[0][1]["query"] if match[0][0] >= SIMILARITY_THRESHOLD else None for match in matches],
+        "scores": np.array([match[0][0] for match in matches]),
+    }
+
+
+def recall(baseline: Dict[str, Any], result: Dict[str, Any], margin: Optional[float] = None) -> Optional[float]:
+    """
+    Fraction of baseline hits (within `margin` of the threshold when given) returning the same entry
+    """
+
+    hits = [
+        index
+        for index, hit in enumerate(baseline["hits"])
+        if hit and (margin is None or baseline["scores"][index] < SIMILARITY_THRESHOLD + margin)
+    ]
+    if not hits:
+        return None
+
+    return sum(result["hits"][index] == baseline["hits"][index] for index in hits) / len(hits)
+
+
+def responses(count: int, seed: int = 0) -> List[List[Dict]]:
+    """
+    Detection-like responses from one to a few hundred boxes
+    """
+
+    rng = np.random.default_rng(seed)
+    return [
+        [
+            {"x_min": float(x), "y_min": float(y), "x_max": float(x + 0.1), "y_max": float(y + 0.05), "label": "button"}
+            for x, y in rng.random((int(size), 2)).round(4)
+        ]
+        for size in rng.integers(1, 300, count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=INDEX_DIMENSION)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.size, args.dimension), dtype=np.float32)
+    picks = rng.integers(0, args.size, args.queries)
+    noise = rng.uniform(0.5, 2.0, (args.queries, 1)).astype(np.float32)
+    queries = vectors[picks] + noise * rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+
+    baseline = run("float32", vectors, queries, args.batch_size)
+    print(f"[Compression]: float32 hit rate {np.mean([hit is not None for hit in baseline['hits']]):.3f}")
+
+    results: Dict[str, Any] = {"vectors": {}}
+    for mode in args.modes:
+        result = baseline if mode == "float32" else run(mode, vectors, queries, args.batch_size)
+        agreement = np.mean([(hit is None) == (other is None) for hit, other in zip(baseline["hits"], result["hits"])])
+
+        results["vectors"][mode] = summary = {
+            **result["stats"],
+            "latency_ms": round(result["latency_ms"], 3),
+            "agreement": float(agreement),
+            "recall": recall(baseline, result),
+            "near_threshold_recall": recall(baseline, result, margin=0.02),
+            "max_score_error": float(np.abs(result["scores"] - baseline["scores"]).max()),
+        }
+        print(f"[Compression]: {mode} {json.dumps(summary)}")
+
+    raw_bytes, stored_bytes = 0, 0
+    for response in responses(1000):
+        stored, _ = compress(response, RESPONSE_COMPRESSION_THRESHOLD)
+        raw_bytes += len(json.dumps(response).encode())
+        stored_bytes += len(stored if isinstance(stored, str) else json.dumps(stored))
+
+    results["responses"] = {
+        "threshold": RESPONSE_COMPRESSION_THRESHOLD,
+        "raw_bytes_per_entry": raw_bytes / 1000,
+        "stored_bytes_per_entry": stored_bytes / 1000,
+    }
+    print(f"[Compression]: responses {json.dumps(results['responses'])}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Compares single-call OCR with tiled, process-parallel OCR on a large screenshot.
+
+    python -m benchmarks.ocr_tiles --workers 4
+    python -m benchmarks.ocr_tiles --image path/to/screenshot.png --tile-size 1024 --overlap 128
+
+Without `--image`, a synthetic 4K screen full of labels is rendered. Both paths must find the same
+words in the same reading order; the difference is reported and makes the run fail.
+"""
+
+import argparse
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from utils import ImageHandle, TiledOCR
+from utils.ocr import tesseract
+
+WORDS = ["Submit", "Cancel", "Settings", "Profile", "Search", "Logout", "Dashboard", "Upload", "Export", "Help"]
+
+
+def screenshot(width: int = 3840, height: int = 2160, seed: int = 0) -> Image.Image:
+    """
+    Renders a grid of well separated labels
+    """
+
+    rng = np.random.default_rng(seed)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=28)
+
+    for y in range(40, height - 60, 90):
+        for x in range(40, width - 260, 300):
+            draw.text((x + int(rng.integers(0, 60)), y), str(rng.choice(WORDS)), fill="black", font=font)
+
+    return image
+
+
+def texts(elements: List[Dict[str, Any]]) -> List[str]:
+    return [element["text"].strip() for element in elements]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--image", help="Screenshot to OCR (defaults to a synthetic 4K screen)")
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument("--overlap", type=int, default=128)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    handle = ImageHandle(path=args.image) if args.image else ImageHandle(image=screenshot())
+    grayscale = handle.grayscale
+    print(f"[OCRTiles]: image={handle.size[0]}x{handle.size[1]}")
+
+    start_time = time.perf_counter()
+    single = tesseract(grayscale)
+    single_time = time.perf_counter() - start_time
+
+    tiler = TiledOCR(tile_size=args.tile_size, overlap=args.overlap, workers=args.workers)
+    try:
+        # Warm the pool so worker start-up is not billed to the OCR itself
+        tiler(grayscale[: args.tile_size + 1, : args.tile_size + 1])
+
+        start_time = time.perf_counter()
+        tiled = tiler(grayscale)
+        tiled_time = time.perf_counter() - start_time
+    finally:
+        tiler.close()
+
+    print(f"[OCRTiles]: single={single_time:.4f}s words={len(single)}")
+    print(f"[OCRTiles]: tiled={tiled_time:.4f}s words={len(tiled)} speedup={single_time / tiled_time:.2f}x")
+
+    missing, extra = Counter(texts(single)) - Counter(texts(tiled)), Counter(texts(tiled)) - Counter(texts(single))
+    if missing or extra:
+        print(f"[OCRTiles]: MISMATCH missing={dict(missing)} extra={dict(extra)}")
+        sys.exit(1)
+
+    # OCRIndex.find returns the first match in this order, so it has to agree too
+    for position, (expected, found) in enumerate(zip(texts(single), texts(tiled))):
+        if expected != found:
+            print(f"[OCRTiles]: ORDER MISMATCH at word {position}: single={expected!r} tiled={found!r}")
+            sys.exit(1)
+
+    print("[OCRTiles]: same words found in the same order")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Evaluates reduced-precision inference (int8 dynamic quantization, bf16 autocast) against fp32.
+
+    python -m benchmarks.precision --models text clip detector --precisions int8 bf16
+    python -m benchmarks.precision --images assets/source.jpg --output precision.json
+
+For each model and precision it reports latency, the resident memory added by loading the model
+and the accuracy change against the fp32 baseline:
+
+- text: embedding cosine drift and semantic cache hit agreement (same hit/miss decision at
+  SIMILARITY_THRESHOLD over every prompt pair)
+- clip: region and label embedding cosine drift
+- detector: mean IoU of each fp32 detection with its best match, and the change in detection count
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+
+from constants import SIMILARITY_THRESHOLD
+from manager.process import rss
+from utils.precision import autocast, quantize, resolve
+
+PROMPTS = [
+    "select all apples",
+    "pick apples",
+    "click the submit button",
+    "press submit",
+    "open the settings menu",
+    "go to settings",
+    "where is the search bar",
+    "find the search field",
+    "log out of my account",
+    "sign out",
+    "show me the red car",
+    "highlight the blue truck",
+]
+
+LABELS = ["submit button", "search bar", "settings icon", "user avatar", "close"]
+
+
+def cosine_drift(baseline: np.ndarray, variant: np.ndarray) -> Dict[str, float]:
+    """
+    `1 - cosine` between matching rows
+    """
+
+    baseline = baseline / np.linalg.norm(baseline, axis=1, keepdims=True)
+    variant = variant / np.linalg.norm(variant, axis=1, keepdims=True)
+    drift = 1 - np.sum(baseline * variant, axis=1)
+
+    return {"mean_drift": float(drift.mean()), "max_drift": float(drift.max())}
+
+
+def timed(function: Callable[[], Any], repeat: int) -> float:
+    """
+    Mean latency of `function` in milliseconds, after one warm-up call
+    """
+
+    function()
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        function()
+
+    return (time.perf_counter() - start_time) / repeat * 1000
+
+
+def loaded(factory: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Builds a model, recording the resident memory it added
+    """
+
+    start_rss = rss()
+    model = factory()
+    return {"model": model, "rss_mb": max(0, rss() - start_rss) / 2**20}
+
+
+def screenshots(paths: List[str]) -> List[Image.Image]:
+    """
+    Images to evaluate on, a synthetic UI mock-up when none are given
+    """
+
+    if paths:
+        return [Image.open(path).convert("RGB") for path in paths]
+
+    image = Image.new("RGB", (1280, 800), "white")
+    draw = ImageDraw.Draw(image)
+    for index, (x, y) in enumerate(itertools.product(range(40, 1200, 240), range(40, 760, 180))):
+        draw.rectangle((x, y, x + 180, y + 120), outline="black", fill=("red", "green", "blue", "orange")[index % 4])
+
+    return [image]
+
+
+def evaluate_text(precision: str, repeat: int) -> Dict[str, Any]:
+    from utils.text import TextProcessor
+
+    baseline = TextProcessor(memo_capacity=1)
+    variant = loaded(lambda: TextProcessor(memo_capacity=1, precision=precision))
+    processor = variant["model"]
+
+    expected = np.stack(baseline.embeddings(PROMPTS))
+    actual = np.stack(processor.embeddings(PROMPTS))
+
+    def similarities(embeddings: np.ndarray) -> np.ndarray:
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return normalized @ normalized.T
+
+    pairs = ~np.eye(len(PROMPTS), dtype=bool)
+    agreement = (similarities(expected) >= SIMILARITY_THRESHOLD) == (similarities(actual) >= SIMILARITY_THRESHOLD)
+
+    # A memo of one entry and alternating prompts keeps every call a miss
+    prompts = itertools.cycle(PROMPTS)
+    return {
+        "latency_ms": timed(lambda: processor.embedding(next(prompts)), repeat),
+        "baseline_latency_ms": timed(lambda: baseline.embedding(next(prompts)), repeat),
+        "rss_mb": variant["rss_mb"],
+        **cosine_drift(expected, actual),
+        "hit_agreement": float(agreement[pairs].mean()),
+    }
+
+
+def evaluate_clip(precision: str, repeat: int, images: List[Image.Image]) -> Dict[str, Any]:
+    import clip
+
+    model, preprocessor = clip.load("ViT-L/14", device="cpu")
+    model.eval()
+    variant = loaded(lambda: quantize(copy.deepcopy(model), precision))
+
+    crops = torch.stack(
+        [
+            preprocessor(image.crop((x, y, x + image.width // 3, y + image.height // 3)))
+            for image in images
+            for x, y in itertools.product((0, image.width // 3), (0, image.height // 3))
+        ]
+    )
+    tokens = clip.tokenize(LABELS)
+
+    def encode(encoder: torch.nn.Module, current: str) -> Dict[str, np.ndarray]:
+        with torch.no_grad(), autocast(current):
+            return {
+                "regions": encoder.encode_image(crops).float().numpy(),
+                "labels": encoder.encode_text(tokens).float().numpy(),
+            }
+
+    expected, actual = encode(model, "fp32"), encode(variant["model"], precision)
+    return {
+        "latency_ms": timed(lambda: encode(variant["model"], precision), repeat),
+        "baseline_latency_ms": timed(lambda: encode(model, "fp32"), repeat),
+        "rss_mb": variant["rss_mb"],
+        "regions": cosine_drift(expected["regions"], actual["regions"]),
+        "labels": cosine_drift(expected["labels"], actual["labels"]),
+    }
+
+
+def evaluate_detector(precision: str, repeat: int, images: List[Image.Image]) -> Dict[str, Any]:
+    from torchvision.models.detection import fasterrcnn_resnet50_fpn
+    from torchvision.ops import box_iou
+    from torchvision.transforms import Compose, Normalize, Resize, ToTensor
+
+    model = fasterrcnn_resnet50_fpn(weights=True).eval()
+    variant = loaded(lambda: quantize(copy.deepcopy(model), precision))
+
+    transform = Compose([Resize((224, 224)), ToTensor(), Normalize((0.5,), (0.5,))])
+    batch = [transform(image) for image in images]
+
+    def detect(detector: torch.nn.Module, current: str) -> List[torch.Tensor]:
+        with torch.no_grad(), autocast(current):
+            return [detection["boxes"].float()[detection["scores"] > 0.5] for detection in detector(batch)]
+
+    ious, counts = [], []
+    for expected, actual in zip(detect(model, "fp32"), detect(variant["model"], precision)):
+        counts.append(len(actual) - len(expected))
+        if len(expected):
+            best = box_iou(expected, actual).max(dim=1).values if len(actual) else torch.zeros(len(expected))
+            ious.extend(best.tolist())
+
+    return {
+        "latency_ms": timed(lambda: detect(variant["model"], precision), repeat),
+        "baseline_latency_ms": timed(lambda: detect(model, "fp32"), repeat),
+        "rss_mb": variant["rss_mb"],
+        "mean_iou": float(np.mean(ious)) if ious else None,
+        "count_delta": counts,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", default=["text", "clip", "detector"])
+    parser.add_argument("--precisions", nargs="+", default=["int8", "bf16"])
+    parser.add_argument("--images", nargs="*", default=[])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    images = screenshots(args.images)
+    evaluations = {
+        "text": lambda precision: evaluate_text(precision, args.repeat),
+        "clip": lambda precision: evaluate_clip(precision, args.repeat, images),
+        "detector": lambda precision: evaluate_detector(precision, args.repeat, images),
+    }
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name in args.models:
+        for precision in args.precisions:
+            if (effective := resolve(precision)) == "fp32":
+                print(f"[Precision]: {name} {precision} skipped (runs as fp32 here)")
+                continue
+
+            results.setdefault(name, {})[effective] = result = evaluations[name](effective)
+            print(f"[Precision]: {name} {effective} {json.dumps(result)}")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
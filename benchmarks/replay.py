@@ -0,0 +1,375 @@
+"""
+Replays a prompt / image workload through `Interaction` and reports where the time goes.
+
+    python -m benchmarks.replay --requests 2000 --output replay.json
+    python -m benchmarks.replay --workload recorded.jsonl --backend numpy --concurrency 4
+    python -m benchmarks.replay --baseline replay.json --tolerance 0.2
+
+Models and the text encoder are replaced by the deterministic stand-ins of `benchmarks.stubs`
+(`--models real` keeps the configured ones), so runs are offline and repeatable. Everything else
+(cache tiers, vector DB, media storage, box merging, annotation) is the real code path.
+
+A workload is JSON lines of `{"prompt": ..., "file_path": ...}` (`file_path` optional). Without
+`--workload` a synthetic one is generated (Zipf-popular intents phrased several ways, some about
+generated screenshots); `--save-workload` writes it out for later replays, with the screenshots in
+a `<name>_screens` directory next to it.
+
+Reports hit rate, throughput, peak RSS and p50 / p95 / p99 latency end to end, for hits, misses and
+coalesced requests (which waited on a concurrent request's model call), and per stage: embed,
+search, insert, media_store, model and annotate. With `--baseline`, exits non-zero when p95 / p99
+latency or throughput regress past the tolerance.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Type
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import database
+from database import DBManager, MediaStorage
+from manager.process import peak_rss, rss
+from service import Interaction
+from utils import ImageProcessor
+from utils.logs import configure_logging
+from utils.metrics import REGISTRY, recent_spans, span
+
+from .stubs import StubTextProcessor, factories
+
+STAGES = ["embed", "search", "insert", "media_store", "model", "annotate"]
+
+BACKENDS: Dict[str, Callable[[], DBManager]] = {
+    "qdrant": lambda: database.VectorDB(name="replay"),
+    "numpy": lambda: database.NumpyVectorDB(name="replay"),
+    "faiss": lambda: database.FaissVectorDB(name="replay"),
+}
+
+TEXT_INTENTS = [
+    ("what is the capital of {}", "tell me the capital city of {}", "{} capital"),
+    ("how do I reset my {} password", "reset {} password", "I forgot my {} password"),
+    ("summarize the latest news about {}", "latest {} news summary", "what happened with {} recently"),
+]
+TEXT_TOPICS = ["france", "japan", "brazil", "kenya", "canada", "email", "bank", "router", "github", "python"]
+
+IMAGE_INTENTS = [
+    ("click the {}", "press the {}", "tap on the {}"),
+    ("select all {}", "pick all the {}", "highlight every {}"),
+    ("where is the {}", "find the {}", "locate the {}"),
+]
+IMAGE_TARGETS = ["submit button", "search bar", "red apples", "settings icon", "shopping cart", "close button"]
+
+
+class Stages:
+    """
+    Stage timings of the request running on the current thread
+    """
+
+    def __init__(self) -> None:
+        self.__local = threading.local()
+
+    def start(self) -> None:
+        self.__local.timings = {}
+
+    def finish(self) -> Dict[str, float]:
+        timings, self.__local.timings = getattr(self.__local, "timings", {}), None
+        return timings
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            if (timings := getattr(self.__local, "timings", None)) is not None:
+                timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start_time
+
+
+class Timed:
+    """
+    Proxy billing calls of the methods in `methods` (name -> stage) to their stage
+    """
+
+    def __init__(self, target: Any, stages: Stages, methods: Dict[str, str]) -> None:
+        self.__target = target
+        self.__stages = stages
+        self.__methods = methods
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self.__target, name)
+        if (stage := self.__methods.get(name)) is None:
+            return attribute
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            with self.__stages.timed(stage):
+                return attribute(*args, **kwargs)
+
+        return timed
+
+
+def annotator(stages: Stages, output_dir: str) -> Type[ImageProcessor]:
+    """
+    `ImageProcessor` billing annotation to its stage and saving to `output_dir`
+    """
+
+    class TimedImageProcessor(ImageProcessor):
+        def draw_boundaries(self, coords: List, directory: str, **kwargs: Any) -> Optional[str]:
+            with stages.timed("annotate"):
+                return super().draw_boundaries(coords, output_dir, **kwargs)
+
+    return TimedImageProcessor
+
+
+def screenshots(directory: str, count: int, seed: int = 0) -> List[str]:
+    """
+    Writes `count` synthetic UI screenshots and returns their paths
+    """
+
+    rng = np.random.default_rng(seed)
+    paths = []
+    for index in range(count):
+        image = Image.new("RGB", (1280, 800), "white")
+        draw = ImageDraw.Draw(image)
+        for x, y, width, height in rng.integers((0, 0, 40, 20), (1200, 760, 300, 120), (30, 4)).tolist():
+            fill = tuple(rng.integers(0, 255, 3).tolist())
+            draw.rectangle((x, y, x + width, y + height), outline="black", fill=fill)
+
+        paths.append(os.path.join(directory, f"screen_{index}.png"))
+        image.save(paths[-1])
+
+    return paths
+
+
+def synthetic(count: int, images: List[str], image_ratio: float, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generates `count` requests. Intents follow a Zipf distribution and each is phrased one of
+    several ways, so the workload has exact repeats, paraphrases and one-off prompts.
+    """
+
+    rng = np.random.default_rng(seed)
+    requests = []
+    for _ in range(count):
+        if images and rng.random() < image_ratio:
+            intents, subjects, extras = IMAGE_INTENTS, IMAGE_TARGETS, {"file_path": str(rng.choice(images))}
+        else:
+            intents, subjects, extras = TEXT_INTENTS, TEXT_TOPICS, {}
+
+        phrasings = intents[int(rng.integers(len(intents)))]
+        subject = subjects[min(len(subjects), int(rng.zipf(1.5))) - 1]
+        requests.append({"prompt": phrasings[int(rng.integers(len(phrasings)))].format(subject), **extras})
+
+    return requests
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """
+    Count, mean and p50 / p95 / p99 of `values` (seconds) in milliseconds
+    """
+
+    if not values:
+        return {"count": 0}
+
+    milliseconds = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "mean": round(float(milliseconds.mean()), 3),
+        **{f"p{q}": round(float(np.percentile(milliseconds, q)), 3) for q in (50, 95, 99)},
+    }
+
+
+def interaction(args: argparse.Namespace, stages: Stages, directory: str) -> Interaction:
+    """
+    Builds an `Interaction` whose components bill their calls to `stages`
+    """
+
+    if args.models == "stub":
+        text_processor, model_factories = StubTextProcessor(), factories(latency=args.model_latency)
+    else:
+        from manager.model import FACTORIES
+        from utils import TextProcessor
+
+        text_processor, model_factories = TextProcessor(), FACTORIES
+
+    return Interaction(
+        vector_db_path=None,
+        snapshot_path=None,
+        vector_db=Timed(
+            BACKENDS[args.backend](),
+            stages,
+            {"search": "search", "search_many": "search", "insert": "insert", "insert_many": "insert"},
+        ),
+        annotate=args.annotate,
+        model_factories={
+            name: (lambda factory=factory: Timed(factory(), stages, {"execute": "model", "detect": "model"}))
+            for name, factory in model_factories.items()
+        },
+        text_processor=Timed(text_processor, stages, {"embedding": "embed", "embeddings": "embed"}),
+        media_storage=Timed(
+            MediaStorage(storage_dir=os.path.join(directory, "assets")),
+            stages,
+            {"get_hash": "media_store", "insert": "media_store", "search": "media_store"},
+        ),
+        image_processor=annotator(stages, os.path.join(directory, "generated")),
+        metrics_port=None,
+    )
+
+
+def replay(service: Interaction, stages: Stages, requests: List[Dict[str, Any]], concurrency: int) -> List[Dict]:
+    """
+    Sends every request through `service.call`, returning per request timings
+    """
+
+    def send(request: Dict[str, Any]) -> Dict[str, Any]:
+        extras = {"file_path": request["file_path"]} if request.get("file_path") else {}
+
+        stages.start()
+        start_time = time.perf_counter()
+        with span("replay.request") as parent:
+            service.call(request["prompt"], **extras)
+        total = time.perf_counter() - start_time
+
+        timings = stages.finish()
+        # hit, miss or coalesced (waited on a concurrent request's model call), as recorded by `Interaction.call`
+        result = next(
+            item["attributes"].get("result")
+            for item in reversed(recent_spans(parent.trace_id))
+            if item["name"] == "interaction.call"
+        )
+        return {"total": total, "result": result, **timings}
+
+    if concurrency <= 1:
+        return [send(request) for request in requests]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(send, requests))
+
+
+def regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Returns a description of every measurement worse than `baseline` by more than `tolerance`
+    """
+
+    failures = []
+    for key in ("p95", "p99"):
+        current, previous = results["latency_ms"]["total"].get(key), baseline["latency_ms"]["total"].get(key)
+        if current is not None and previous and current > previous * (1 + tolerance):
+            failures.append(f"latency_ms.total.{key}: {current:.3f} vs {previous:.3f} baseline")
+
+    current, previous = results["throughput_rps"], baseline["throughput_rps"]
+    if previous and current < previous * (1 - tolerance):
+        failures.append(f"throughput_rps: {current:.1f} vs {previous:.1f} baseline")
+
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", help="JSON lines of recorded requests")
+    parser.add_argument("--save-workload", help="Write the replayed workload as JSON lines")
+    parser.add_argument("--requests", type=int, default=1000, help="Synthetic workload size")
+    parser.add_argument("--images", type=int, default=4, help="Synthetic screenshots")
+    parser.add_argument("--image-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="qdrant", choices=list(BACKENDS))
+    parser.add_argument("--models", default="stub", choices=["stub", "real"])
+    parser.add_argument("--model-latency", type=float, default=0.05, help="Seconds each stub model call sleeps")
+    parser.add_argument("--annotate", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="Log the service's per-request detail and spans")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    configure_logging("DEBUG" if args.verbose else "WARNING")
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.workload:
+            with open(args.workload) as workload_file:
+                requests = [json.loads(line) for line in workload_file if line.strip()]
+        else:
+            screens_dir = f"{os.path.splitext(args.save_workload)[0]}_screens" if args.save_workload else directory
+            os.makedirs(screens_dir, exist_ok=True)
+
+            images = screenshots(os.path.abspath(screens_dir), args.images, seed=args.seed)
+            requests = synthetic(args.requests, images, args.image_ratio, seed=args.seed)
+
+        if args.save_workload:
+            with open(args.save_workload, "w") as workload_file:
+                workload_file.writelines(json.dumps(request) + "\n" for request in requests)
+
+        stages = Stages()
+        start_rss = rss()
+
+        service = interaction(args, stages, directory)
+        try:
+            start_time = time.perf_counter()
+            timings = replay(service, stages, requests, args.concurrency)
+            wall_time = time.perf_counter() - start_time
+        finally:
+            service.close()
+
+        stats = service.stats()
+
+    hits = [timing for timing in timings if timing["result"] == "hit"]
+    misses = [timing for timing in timings if timing["result"] == "miss"]
+    coalesced = [timing for timing in timings if timing["result"] == "coalesced"]
+
+    results = {
+        "config": {
+            key: getattr(args, key)
+            for key in ("workload", "requests", "images", "image_ratio", "seed", "backend", "models", "model_latency")
+        }
+        | {"annotate": args.annotate, "concurrency": args.concurrency},
+        "requests": len(timings),
+        "hit_rate": round(len(hits) / len(timings), 4) if timings else 0.0,
+        "wall_seconds": round(wall_time, 3),
+        "throughput_rps": round(len(timings) / wall_time, 2) if wall_time else 0.0,
+        "latency_ms": {
+            "total": percentiles([timing["total"] for timing in timings]),
+            "hit": percentiles([timing["total"] for timing in hits]),
+            "miss": percentiles([timing["total"] for timing in misses]),
+            "coalesced": percentiles([timing["total"] for timing in coalesced]),
+            **{stage: percentiles([timing[stage] for timing in timings if stage in timing]) for stage in STAGES},
+        },
+        "peak_rss_mb": round(peak_rss() / 2**20, 1),
+        "rss_growth_mb": round(max(0, rss() - start_rss) / 2**20, 1),
+        "cache": stats,
+        "spans": REGISTRY.snapshot()["llm_cache_span_seconds"],
+    }
+
+    print(
+        f"[Replay]: {results['requests']} requests, hit_rate={results['hit_rate']:.3f}, "
+        f"throughput={results['throughput_rps']:.1f}/s, peak_rss={results['peak_rss_mb']}MB"
+    )
+    for name, summary in results["latency_ms"].items():
+        if summary["count"]:
+            print(
+                f"    {name:<12} n={summary['count']:<6} "
+                f"p50={summary['p50']:.3f}ms p95={summary['p95']:.3f}ms p99={summary['p99']:.3f}ms"
+            )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2, default=str)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            failures = regressions(results, json.load(baseline_file), args.tolerance)
+
+        for failure in failures:
+            print(f"[Replay]: REGRESSION {failure}")
+
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
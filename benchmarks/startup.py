@@ -0,0 +1,153 @@
+"""
+Measures cold start: `python -X importtime` of the service package and time to first response.
+
+    python -m benchmarks.startup --output startup.json
+    python -m benchmarks.startup --baseline startup.json --tolerance 0.25
+
+With `--baseline`, exits non-zero when a measurement regresses past the tolerance or when a heavy
+dependency is imported eagerly again.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported by `import service`
+HEAVY_MODULES = [
+    "torch",
+    "torchvision",
+    "clip",
+    "sentence_transformers",
+    "cv2",
+    "pytesseract",
+    "nltk",
+    "moondream",
+    "qdrant_client",
+    "faiss",
+]
+
+FIRST_RESPONSE = """
+import json, sys, time
+start_time = time.perf_counter()
+from main import ChatInterface
+interface = ChatInterface()
+ready_time = time.perf_counter()
+interface.query(sys.argv[1])
+print(json.dumps({"construct": ready_time - start_time, "first_response": time.perf_counter() - start_time}))
+"""
+
+
+def import_times(module: str) -> Dict:
+    """
+    Runs `python -X importtime -c "import <module>"` in a fresh interpreter and parses its report
+    """
+
+    start_time = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed_time = time.perf_counter() - start_time
+
+    # Lines look like `import time:  self [us] | cumulative | imported package`
+    modules: Dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = int(cumulative)
+
+    return {
+        "wall_seconds": elapsed_time,
+        "import_seconds": modules.get(module, 0) / 1e6,
+        "heavy_modules": [name for name in HEAVY_MODULES if name in modules],
+        "slowest": sorted(modules.items(), key=lambda item: item[1], reverse=True)[:15],
+    }
+
+
+def first_response(prompt: str) -> Dict:
+    """
+    Times construction of `ChatInterface` and its first query in a fresh interpreter
+    """
+
+    start_time = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-c", FIRST_RESPONSE, prompt], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    elapsed_time = time.perf_counter() - start_time
+
+    return {"wall_seconds": elapsed_time, **json.loads(process.stdout.strip().splitlines()[-1])}
+
+
+def regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Returns a description of every measurement worse than `baseline` by more than `tolerance`
+    """
+
+    failures = [f"{name} imported eagerly" for name in results["imports"]["heavy_modules"]]
+    checks = [("imports", "import_seconds"), ("first_response", "construct"), ("first_response", "first_response")]
+
+    for section, key in checks:
+        current: Optional[float] = results.get(section, {}).get(key)
+        previous: Optional[float] = baseline.get(section, {}).get(key)
+
+        if current is not None and previous and current > previous * (1 + tolerance):
+            failures.append(f"{section}.{key}: {current:.4f}s vs {previous:.4f}s baseline")
+
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="service")
+    parser.add_argument("--prompt", default="What is the capital of France?")
+    parser.add_argument("--skip-first-response", action="store_true", help="Only measure imports (no models needed)")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--baseline", help="Compare against a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = {"imports": import_times(args.module)}
+    imports = results["imports"]
+    print(
+        f"[Startup]: import {args.module}={imports['import_seconds']:.4f}s "
+        f"process={imports['wall_seconds']:.4f}s heavy={imports['heavy_modules']}"
+    )
+    for name, cumulative in imports["slowest"]:
+        print(f"    {cumulative / 1e6:.4f}s {name}")
+
+    if not args.skip_first_response:
+        results["first_response"] = first_response(args.prompt)
+        response = results["first_response"]
+        print(
+            f"[Startup]: construct={response['construct']:.4f}s "
+            f"first_response={response['first_response']:.4f}s process={response['wall_seconds']:.4f}s"
+        )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            failures = regressions(results, json.load(baseline_file), args.tolerance)
+
+        for failure in failures:
+            print(f"[Startup]: REGRESSION {failure}")
+
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Deterministic local stand-ins for the models, so workloads replay offline and identically every run.
+
+Outputs depend only on the inputs (SHA-256 based, never Python's salted `hash`), and `latency`
+sleeps emulate the model call.
+"""
+
+import hashlib
+import re
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from constants import INDEX_DIMENSION
+from utils import EmbeddingContext, ImageHandle
+
+STOP_WORDS = {"a", "all", "an", "and", "at", "for", "in", "is", "me", "my", "of", "on", "the", "to", "where", "with"}
+
+
+def digest(*parts: str) -> bytes:
+    """
+    Stable digest of `parts`
+    """
+
+    return hashlib.sha256("\x1f".join(parts).encode()).digest()
+
+
+class StubTextProcessor:
+    """
+    Feature-hashed bag of words and character trigrams, L2-normalized. Prompts sharing words
+    score high, so paraphrases can hit the semantic tier like they do with the real encoder.
+    """
+
+    # Marks stored vectors as this encoder's, see `Cache.reindex`
+    precision = "stub"
+
+    def __init__(self, dimension: int = INDEX_DIMENSION) -> None:
+        self.__dimension: int = dimension
+
+    def __features(self, text: str) -> List[str]:
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        trigrams = [word[index : index + 3] for word in words for index in range(max(1, len(word) - 2))]
+
+        return [f"w:{word}" for word in words if word not in STOP_WORDS] + [f"t:{trigram}" for trigram in trigrams]
+
+    def embedding(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.__dimension, dtype=np.float32)
+        for feature in self.__features(text):
+            value = int.from_bytes(digest(feature)[:8], "little")
+            vector[value % self.__dimension] += 1.0 if value & (1 << 63) else -1.0
+
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        return [self.embedding(text) for text in texts]
+
+    def extract(self, prompt: str, context: Optional[EmbeddingContext] = None) -> str:
+        words = [word for word in re.findall(r"[a-z0-9]+", prompt.lower()) if word not in STOP_WORDS]
+        return " ".join(words[-2:]) or prompt
+
+
+class StubLLM:
+    """
+    Text model returning a canned answer of roughly `response_bytes`
+    """
+
+    def __init__(self, latency: float = 0.0, response_bytes: int = 256) -> None:
+        self.__latency: float = latency
+        self.__response_bytes: int = response_bytes
+
+    def execute(self, query: str, **kwargs: Dict) -> str:
+        time.sleep(self.__latency)
+
+        answer = f"Stub answer to '{query}'. "
+        return (answer * (self.__response_bytes // len(answer) + 1))[: self.__response_bytes]
+
+
+class StubMoonDream:
+    """
+    Vision model returning up to `max_boxes` normalized boxes, seeded by the image and identifier
+    """
+
+    def __init__(self, latency: float = 0.0, max_boxes: int = 8) -> None:
+        self.__latency: float = latency
+        self.__max_boxes: int = max_boxes
+
+    def detect(self, image: Union[str, ImageHandle], identifier: str) -> List[Dict[str, Any]]:
+        time.sleep(self.__latency)
+
+        rng = np.random.default_rng(int.from_bytes(digest(ImageHandle.of(image).hash, identifier)[:8], "little"))
+        boxes = []
+        for x_min, y_min, width, height in rng.random((int(rng.integers(1, self.__max_boxes + 1)), 4)):
+            x_min, y_min = x_min * 0.8, y_min * 0.8
+            boxes.append(
+                {
+                    "x_min": float(x_min),
+                    "y_min": float(y_min),
+                    "x_max": float(x_min + 0.05 + width * 0.15),
+                    "y_max": float(y_min + 0.05 + height * 0.15),
+                }
+            )
+
+        return boxes
+
+
+def factories(latency: float = 0.0) -> Dict[str, Any]:
+    """
+    `ModelManager` factories serving every model name with a stand-in
+    """
+
+    return {
+        "clip": lambda: StubLLM(latency=latency),
+        "ollama": lambda: StubLLM(latency=latency),
+        "moon_dream": lambda: StubMoonDream(latency=latency),
+    }
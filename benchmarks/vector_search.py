@@ -0,0 +1,128 @@
+"""
+Compares semantic cache search latency of the Qdrant local backend, the NumPy matrix and FAISS indexes.
+
+    python -m benchmarks.vector_search --sizes 10000 100000 1000000 --queries 200
+    python -m benchmarks.vector_search --sizes 100000 --images 1000
+
+With `--images`, half the entries are spread over that many images and lookups for an image are
+timed as well (`image_p50_ms`); they should only cost as much as that image's entries.
+"""
+
+import argparse
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from constants import INDEX_DIMENSION
+from database import DBManager, FaissVectorDB, NumpyVectorDB, VectorDB
+
+BACKENDS: Dict[str, Callable[[int], DBManager]] = {
+    "qdrant": lambda size: VectorDB(name="bench"),
+    "numpy": lambda size: NumpyVectorDB(name="bench", capacity=size),
+    "faiss-flat": lambda size: FaissVectorDB(name="bench", index_type="flat"),
+    "faiss-hnsw": lambda size: FaissVectorDB(name="bench", index_type="hnsw"),
+    "faiss-ivf": lambda size: FaissVectorDB(name="bench", index_type="ivf", nlist=max(1, int(np.sqrt(size)))),
+}
+
+
+def media_hash(index: int, size: int, images: int) -> Optional[str]:
+    """
+    Image of entry `index`: the second half of the entries is spread over `images` images
+    """
+
+    return f"image-{index % images}" if images and index >= size // 2 else None
+
+
+def entries(vectors: np.ndarray, offset: int, size: int, images: int) -> List[Dict]:
+    """
+    Builds `insert_many` entries for `vectors`
+    """
+
+    return [
+        {
+            "key": f"query {offset + index}",
+            "embedding": vector,
+            "response": f"response {offset + index}",
+            "metadata": {"extras": {}, "timestamp": time.time(), "file_path": None},
+            "media_hash": media_hash(offset + index, size, images),
+        }
+        for index, vector in enumerate(vectors)
+    ]
+
+
+def timed(db: DBManager, queries: np.ndarray, media_hashes: List[Optional[str]]) -> np.ndarray:
+    """
+    Single-query search latencies in milliseconds
+    """
+
+    latencies = []
+    for query, query_hash in zip(queries, media_hashes):
+        start_time = time.perf_counter()
+        db.search(embedding=query, media_hash=query_hash)
+        latencies.append(time.perf_counter() - start_time)
+
+    return np.array(latencies) * 1000
+
+
+def run(name: str, size: int, vectors: np.ndarray, picks: np.ndarray, queries: np.ndarray, batch_size: int, images: int) -> Dict:
+    """
+    Loads `vectors` into backend `name` and times single-query searches
+    """
+
+    db = BACKENDS[name](size)
+
+    start_time = time.perf_counter()
+    for offset in range(0, size, batch_size):
+        db.insert_many(entries(vectors[offset : offset + batch_size], offset, size, images))
+    load_time = time.perf_counter() - start_time
+
+    latencies = timed(db, queries, [None] * len(queries))
+    result = {
+        "backend": name,
+        "size": size,
+        "load_s": round(load_time, 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+    }
+
+    if images:
+        # Queries near image entries, looked up within their image
+        image_picks = size // 2 + picks % (size - size // 2)
+        image_queries = vectors[image_picks] + (queries - vectors[picks])
+        latencies = timed(db, image_queries, [media_hash(pick, size, images) for pick in image_picks])
+        result["image_p50_ms"] = round(float(np.percentile(latencies, 50)), 3)
+        result["image_p95_ms"] = round(float(np.percentile(latencies, 95)), 3)
+
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--images", type=int, default=0, help="spread half the entries over this many images")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument(
+        "--qdrant-max-size", type=int, default=100_000, help="skip the Qdrant local backend above this size"
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, INDEX_DIMENSION), dtype=np.float32)
+        # Queries are perturbed copies of stored vectors so most of them should hit
+        picks = rng.integers(0, size, args.queries)
+        queries = vectors[picks] + 0.1 * rng.standard_normal((args.queries, INDEX_DIMENSION), dtype=np.float32)
+
+        for name in args.backends:
+            if name == "qdrant" and size > args.qdrant_max_size:
+                print(f"[VectorSearch]: skipping {name} at {size=}")
+                continue
+
+            print(f"[VectorSearch]: {run(name, size, vectors, picks, queries, args.batch_size, args.images)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Measures how long a persistent `VectorDB` takes to load N entries on startup.
+
+    python -m benchmarks.warm_start --entries 1000 10000
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from constants import INDEX_DIMENSION
+from database import VectorDB
+
+
+def populate(path: str, entries: int) -> None:
+    """
+    Fills a persistent collection at `path` with `entries` random vectors
+    """
+
+    db = VectorDB(name="cache", path=path)
+    vectors = np.random.default_rng(0).standard_normal((entries, INDEX_DIMENSION), dtype=np.float32)
+
+    db.insert_many(
+        [
+            {
+                "key": f"query {index}",
+                "embedding": vector,
+                "response": f"response {index}",
+                "metadata": {"extras": {}, "timestamp": time.time(), "file_path": None},
+            }
+            for index, vector in enumerate(vectors)
+        ]
+    )
+    db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, nargs="+", default=[1_000, 10_000])
+    args = parser.parse_args()
+
+    for entries in args.entries:
+        with tempfile.TemporaryDirectory() as path:
+            populate(path, entries)
+
+            start_time = time.time()
+            db = VectorDB(name="cache", path=path)
+            elapsed_time = time.time() - start_time
+
+            print(f"[WarmStart]: entries={db.count()} load={elapsed_time:.4f}s")
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
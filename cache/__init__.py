@@ -1,13 +1,46 @@
+import io
+import json
+import logging
+import os
+import tarfile
+import tempfile
+import threading
 import time
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
+
+from constants import RESPONSE_COMPRESSION_THRESHOLD
 from database import DBManager, MediaStorage
-from utils import TextProcessor
+from utils import EmbeddingContext, LRUCache, TextProcessor
+from utils.metrics import REGISTRY, span
+
+from .compression import compress, decompress, encode
+from .eviction import POLICIES
+from .ledger import Ledger
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = REGISTRY.counter("llm_cache_lookups_total", "Cache lookups by tier and result", ["tier", "result"])
+REMOVALS = REGISTRY.counter("llm_cache_removals_total", "Entries removed by the size limits or TTL", ["reason"])
+ENTRIES = REGISTRY.gauge("llm_cache_entries", "Entries in the cache")
+BYTES = REGISTRY.gauge("llm_cache_bytes", "Response and media bytes tracked against the cache limits")
 
 
 class Cache:
     """
     Cache Layer
+
+    Lookups go through two tiers: an in-process exact-match tier keyed on the normalized
+    prompt plus the media content hash, then the semantic tier backed by `vector_db`.
+
+    The cache can be bounded by entry count and by bytes (responses plus stored media), in which
+    case entries are evicted by the `eviction` policy ("lru", "lfu" or "ttl") and their media files
+    are removed once no other entry uses them. With `sweep_interval`, a background thread removes
+    expired entries instead of waiting for a lookup to land on them.
+
+    Responses of at least `compress_threshold` bytes are stored zlib compressed in the semantic tier
+    (`None` disables it) and decompressed on the way out; the exact tier keeps them as is.
     """
 
     def __init__(
@@ -16,13 +49,48 @@ class Cache:
         media_storage: MediaStorage,
         text_processor: TextProcessor,
         ttl_in_seconds: float = 3600,
+        exact_capacity: int = 4096,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        eviction: str = "lru",
+        sweep_interval: Optional[float] = None,
+        compress_threshold: Optional[int] = RESPONSE_COMPRESSION_THRESHOLD,
     ) -> None:
+        if eviction not in POLICIES:
+            raise ValueError(f"eviction must be one of {sorted(POLICIES)}")
+
         self.__db: DBManager = vector_db
         self.__media_storage = media_storage
 
         self.__ttl: float = ttl_in_seconds
+        self.__compress_threshold: Optional[int] = compress_threshold
         self.__text_processor: TextProcessor = text_processor
 
+        self.__exact = LRUCache(capacity=exact_capacity, ttl_in_seconds=ttl_in_seconds)
+        self.__stats: Dict[str, Dict[str, int]] = {
+            "exact": {"hits": 0, "misses": 0},
+            "semantic": {"hits": 0, "misses": 0},
+            "eviction": {"evictions": 0, "expirations": 0},
+            "compression": {"compressed": 0, "raw_bytes": 0, "stored_bytes": 0},
+        }
+
+        self.__lock = threading.RLock()
+        self.__ledger = Ledger(POLICIES[eviction](), max_entries=max_entries, max_bytes=max_bytes)
+        self.__load_ledger()
+
+        self.__stop = threading.Event()
+        if sweep_interval:
+            threading.Thread(
+                target=self.__sweep_loop, args=(sweep_interval,), name="cache-sweeper", daemon=True
+            ).start()
+
+    def __normalize(self, key: str) -> str:
+        """
+        Normalizes the query for exact matching (case and whitespace insensitive).
+        """
+
+        return " ".join(key.lower().split())
+
     def __generate_key(self, key: str, media_hash: Optional[str] = None) -> str:
         """
         Generates a unique cache key based on the query and media file hash (if available).
@@ -30,50 +98,321 @@ class Cache:
 
         return f"{key}:{media_hash}" if media_hash else key
 
+    def __exact_key(self, key: str, context: Optional[EmbeddingContext] = None, **kwargs: Dict) -> str:
+        """
+        Returns the exact-match tier key for `key` and the media file (if any) in `kwargs`.
+        The key is computed once per request and kept on `context`.
+        """
+
+        if context and context.key:
+            return context.key
+
+        file_path = kwargs.get("file_path")
+        media_hash = self.__media_storage.get_hash(file_path) if file_path else None
+        exact_key = self.__generate_key(self.__normalize(key), media_hash)
+
+        if context:
+            context.key, context.media_hash = exact_key, media_hash
+
+        return exact_key
+
     def __upload_media(self, **kwargs: Dict) -> Optional[str]:
         """
         Save `media_file`
         """
 
         if file_path := kwargs.get("file_path"):
-            print(f"[Cache]: Saved media file {file_path}")
-            return self.__media_storage.insert(file_path)
+            saved_path = self.__media_storage.insert(file_path)
+            logger.debug("[Cache]: Saved media file %s", file_path)
+
+            return saved_path
 
         return None
 
-    def set(self, key: str, value: str, **kwargs: Dict) -> None:
+    def __load_ledger(self) -> None:
         """
-        Adds a new query-response pair to the cache.
+        Registers entries already present in the vector DB (persistent or restored caches)
+        """
+
+        with self.__lock:
+            for point in self.__db.points():
+                payload = point["payload"]
+                self.__track(payload["query"], payload["response"], payload.get("media_hash"), payload["metadata"])
+
+            self.__enforce()
+
+    def __track(self, query: str, response: Any, media_hash: Optional[str], metadata: Dict) -> None:
+        """
+        Records a stored entry in the ledger. Must hold the lock.
+        """
+
+        size = len(query.encode()) + len(str(response).encode())
+        orphan = self.__ledger.add(
+            self.__generate_key(query, media_hash),
+            query=query,
+            media_hash=media_hash,
+            file_path=metadata.get("file_path"),
+            timestamp=metadata["timestamp"],
+            size=size,
+        )
+
+        if orphan and os.path.exists(orphan):
+            self.__media_storage.delete(orphan)
+
+        self.__measure()
+
+    def __measure(self) -> None:
+        """
+        Publishes the current size
+        """
+
+        ENTRIES.set(len(self.__ledger))
+        BYTES.set(self.__ledger.bytes)
+
+    def __remove(self, key: str, reason: Optional[str] = None) -> None:
+        """
+        Removes a ledger entry from the vector DB, along with its media file once unused.
+        `reason` is the counter to bump ("evictions" or "expirations").
+        """
+
+        with self.__lock:
+            entry, orphan = self.__ledger.remove(key)
+            if entry is None:
+                return
+
+            self.__db.delete(entry["query"], media_hash=entry["media_hash"])
+            if reason:
+                self.__stats["eviction"][reason] += 1
+                REMOVALS.inc(reason=reason)
+
+            # Only stored copies are tracked, never the caller's own file
+            if orphan and os.path.exists(orphan):
+                self.__media_storage.delete(orphan)
+
+            self.__measure()
+
+    def __enforce(self) -> None:
+        """
+        Evicts entries until the cache is back within its limits
+        """
+
+        with self.__lock:
+            for key in self.__ledger.overflow():
+                self.__remove(key, "evictions")
+
+    def __sweep_loop(self, interval: float) -> None:
+        """
+        Background expiry loop
+        """
+
+        while not self.__stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as exception:
+                logger.warning("[Cache]: sweep failed %s", exception)
+
+    def sweep(self) -> int:
+        """
+        Removes every expired entry and returns how many were removed.
+        """
+
+        with self.__lock:
+            expired = self.__ledger.expired(time.time(), self.__ttl)
+
+        for key in expired:
+            self.__remove(key, "expirations")
+
+        return len(expired)
+
+    def close(self) -> None:
+        """
+        Stops the background sweeper.
+        """
+
+        self.__stop.set()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns hit/miss counters per tier, eviction/expiration counters, current size and
+        response compression counters.
+        """
+
+        stats = {tier: dict(counters) for tier, counters in self.__stats.items()}
+        stats["eviction"].update(entries=len(self.__ledger), bytes=self.__ledger.bytes)
+
+        return stats
+
+    def reconcile(self) -> int:
+        """
+        Drops entries whose stored media file no longer exists (e.g. after a partial restore).
+        Returns the number of dropped entries.
+        """
+
+        stale = [
+            self.__generate_key(point["payload"]["query"], point["payload"].get("media_hash"))
+            for point in self.__db.points()
+            if (file_path := point["payload"]["metadata"].get("file_path"))
+            and not os.path.exists(file_path)
+        ]
+
+        for key in stale:
+            self.__remove(key)
+
+        if stale:
+            logger.info("[Cache]: Dropped %d entries with missing media files", len(stale))
+
+        return len(stale)
+
+    def reindex(self, batch_size: int = 256) -> int:
+        """
+        Re-embeds entries encoded at another precision than the text processor's (entries without
+        one predate the setting and are fp32), so hit decisions never compare vectors of different
+        encoders. Returns the number of re-embedded entries.
+        """
+
+        precision = self.__text_processor.precision
+        stale = [point for point in self.__db.points() if point["payload"]["metadata"].get("precision", "fp32") != precision]
+
+        for offset in range(0, len(stale), batch_size):
+            batch = stale[offset : offset + batch_size]
+            embeddings = self.__text_processor.embeddings([point["payload"]["query"] for point in batch])
+
+            self.__db.import_points(
+                {
+                    "id": point["id"],
+                    "vector": np.asarray(embedding, dtype=np.float32).tolist(),
+                    "payload": {**point["payload"], "metadata": {**point["payload"]["metadata"], "precision": precision}},
+                }
+                for point, embedding in zip(batch, embeddings)
+            )
+
+        if stale:
+            logger.warning("[Cache]: Re-embedded %d entries encoded at another precision than %s", len(stale), precision)
+
+        return len(stale)
+
+    def export_snapshot(self, archive_path: str) -> int:
+        """
+        Writes every entry and its media file to a `.tar.gz` archive so another node can warm start.
+        Returns the number of exported entries.
+        """
+
+        count, media = 0, set()
+        buffer = io.BytesIO()
+
+        for point in self.__db.points():
+            file_path = point["payload"]["metadata"].get("file_path")
+            if file_path and os.path.exists(file_path):
+                media.add(file_path)
+
+            buffer.write((json.dumps(point) + "\n").encode())
+            count += 1
+
+        with tarfile.open(archive_path, "w:gz") as archive:
+            info = tarfile.TarInfo(name="points.jsonl")
+            info.size = buffer.tell()
+            buffer.seek(0)
+            archive.addfile(info, buffer)
+
+            for file_path in media:
+                archive.add(file_path, arcname=f"media/{os.path.basename(file_path)}")
+
+        logger.info("[Cache]: Exported %d entries and %d media files to %s", count, len(media), archive_path)
+        return count
+
+    def import_snapshot(self, archive_path: str) -> int:
+        """
+        Loads entries and media files written by `export_snapshot`.
+        Returns the number of imported entries.
+        """
+
+        start_time = time.time()
+
+        with tempfile.TemporaryDirectory() as directory, tarfile.open(archive_path, "r:gz") as archive:
+            archive.extractall(directory, filter="data")
+
+            restored: Dict[str, str] = {}
+            media_dir = os.path.join(directory, "media")
+            if os.path.isdir(media_dir):
+                for file_name in os.listdir(media_dir):
+                    restored[file_name] = self.__media_storage.insert(os.path.join(media_dir, file_name))
+
+            def points():
+                with open(os.path.join(directory, "points.jsonl")) as lines:
+                    for line in lines:
+                        point = json.loads(line)
+                        metadata = point["payload"]["metadata"]
+
+                        if file_path := metadata.get("file_path"):
+                            metadata["file_path"] = restored.get(os.path.basename(file_path))
+
+                        yield point
+
+            count = self.__db.import_points(points())
+
+        self.__load_ledger()
+        self.reindex()
+        elapsed_time = time.time() - start_time
+        logger.info("[Cache]: Imported %d entries from %s in %.4f seconds", count, archive_path, elapsed_time)
+
+        return count
+
+    def context(self, key: str) -> EmbeddingContext:
+        """
+        Returns a request-scoped embedding context for `key`.
+        """
+
+        return EmbeddingContext(self.__text_processor, key)
+
+    def __entry(
+        self, key: str, value: str, context: Optional[EmbeddingContext], **kwargs: Dict
+    ) -> Dict:
+        """
+        Stores the media file (if any) and builds the vector DB entry for `key`.
         """
 
         # Handle media file upload if provided
         saved_path = self.__upload_media(**kwargs)
-        # media_hash = self.__media_storage.get_hash(saved_path) if saved_path else None
 
         timestamp: float = time.time()
-        embedding = self.__text_processor.embedding(key)
-        # new_key: str = self.__generate_key(key, media_hash)
-        # print(f"[VectorDB]: {new_key=}")
-
-        self.__db.insert(
-            key=key,
-            response=value,
-            embedding=embedding,
-            metadata={
-                "extras": kwargs,
-                "timestamp": timestamp,
-                "file_path": saved_path,
-            },
-        )
+        context = context or self.context(key)
+        exact_key = self.__exact_key(key, context, **kwargs)
+        entry_key = self.__generate_key(key, context.media_hash)
+
+        self.__exact.set(exact_key, (value, saved_path, entry_key), timestamp=timestamp)
+
+        # Vectors are only comparable with vectors encoded at the same precision (see `reindex`)
+        metadata = {
+            "extras": kwargs,
+            "timestamp": timestamp,
+            "file_path": saved_path,
+            "precision": self.__text_processor.precision,
+        }
+        stored, encoding = compress(value, self.__compress_threshold)
+        if encoding:
+            metadata["encoding"] = encoding
+
+            counters = self.__stats["compression"]
+            counters["compressed"] += 1
+            counters["raw_bytes"] += len(encode(value)[0])
+            counters["stored_bytes"] += len(stored)
 
-    def get(self, key: str, **kwargs: Dict) -> Tuple[str, Optional[str]]:
+        return {
+            "key": key,
+            "response": stored,
+            "embedding": context.embedding,
+            "media_hash": context.media_hash,
+            "metadata": metadata,
+        }
+
+    def __resolve(
+        self, exact_key: str, cached: Optional[Dict], **kwargs: Dict
+    ) -> Tuple[str, Optional[str]]:
         """
-        Retrieves the cached response for a given query.
+        Validates a semantic tier result against the TTL and resolves its media file.
         """
 
-        embedding = self.__text_processor.embedding(key)
-
-        if cached := self.__db.search(embedding=embedding):
+        if cached:
             current_time: float = time.time()
             cached_at: float = cached["metadata"]["timestamp"]
 
@@ -88,10 +427,150 @@ class Cache:
                 else:
                     media_file = None
 
-                return cached["response"], media_file
+                entry_key = self.__generate_key(cached["query"], cached.get("media_hash"))
+                with self.__lock:
+                    self.__ledger.touch(entry_key)
+
+                response = decompress(cached["response"], cached["metadata"].get("encoding"))
+
+                self.__stats["semantic"]["hits"] += 1
+                LOOKUPS.inc(tier="semantic", result="hit")
+                self.__exact.set(exact_key, (response, media_file, entry_key), timestamp=cached_at)
 
-            self.__db.delete(key)
-            if file_path:
-                self.__media_storage.delete(file_path)
+                return response, media_file
 
+            self.__remove(self.__generate_key(cached["query"], cached.get("media_hash")), "expirations")
+            self.__exact.delete(exact_key)
+
+        self.__stats["semantic"]["misses"] += 1
+        LOOKUPS.inc(tier="semantic", result="miss")
         return None, None
+
+    def set(
+        self, key: str, value: str, context: Optional[EmbeddingContext] = None, **kwargs: Dict
+    ) -> None:
+        """
+        Adds a new query-response pair to the cache.
+        """
+
+        self.__store([self.__entry(key, value, context, **kwargs)])
+
+    def set_many(
+        self, items: List[Tuple[str, str, Optional[EmbeddingContext], Dict]]
+    ) -> None:
+        """
+        Adds several `(key, value, context, extras)` pairs with a single bulk write.
+        """
+
+        self.__store([self.__entry(key, value, context, **extras) for key, value, context, extras in items])
+
+    def __store(self, entries: List[Dict]) -> None:
+        """
+        Writes `entries` to the vector DB, records them and enforces the size limits
+        """
+
+        with span("store", entries=len(entries)):
+            if len(entries) == 1:
+                self.__db.insert(**entries[0])
+            else:
+                self.__db.insert_many(entries)
+
+        with self.__lock:
+            for entry in entries:
+                self.__track(entry["key"], entry["response"], entry["media_hash"], entry["metadata"])
+
+            self.__enforce()
+
+    def __lookup(self, exact_key: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Exact tier lookup; entries evicted or expired from the semantic tier count as misses
+        """
+
+        if exact := self.__exact.get(exact_key):
+            response, media_file, entry_key = exact
+
+            with self.__lock:
+                tracked = self.__ledger.touch(entry_key)
+
+            if tracked:
+                self.__stats["exact"]["hits"] += 1
+                LOOKUPS.inc(tier="exact", result="hit")
+                return response, media_file
+
+            self.__exact.delete(exact_key)
+
+        self.__stats["exact"]["misses"] += 1
+        LOOKUPS.inc(tier="exact", result="miss")
+        return None
+
+    def peek(
+        self, key: str, context: Optional[EmbeddingContext] = None, **kwargs: Dict
+    ) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Exact tier lookup that leaves the hit / miss counters alone. Lets a caller that missed
+        re-check for a response stored meanwhile (e.g. by a concurrent call for the same key).
+        """
+
+        context = context or self.context(key)
+        if exact := self.__exact.get(self.__exact_key(key, context, **kwargs)):
+            response, media_file, entry_key = exact
+
+            with self.__lock:
+                if self.__ledger.touch(entry_key):
+                    return response, media_file
+
+        return None
+
+    def get(
+        self, key: str, context: Optional[EmbeddingContext] = None, **kwargs: Dict
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Retrieves the cached response for a given query.
+        """
+
+        context = context or self.context(key)
+        exact_key = self.__exact_key(key, context, **kwargs)
+
+        if exact := self.__lookup(exact_key):
+            return exact
+
+        embedding = context.embedding
+        with span("search"):
+            cached = self.__db.search(embedding=embedding, media_hash=context.media_hash)
+
+        return self.__resolve(exact_key, cached, **kwargs)
+
+    def get_many(
+        self, keys: List[str], contexts: List[EmbeddingContext], extras: List[Dict]
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        Retrieves cached responses for several queries, in input order.
+        Exact tier misses are encoded in one batch and searched with one batched request.
+        """
+
+        results: List[Tuple[str, Optional[str]]] = [(None, None)] * len(keys)
+        exact_keys = [
+            self.__exact_key(key, context, **kwargs)
+            for key, context, kwargs in zip(keys, contexts, extras)
+        ]
+
+        misses: List[int] = []
+        for index, exact_key in enumerate(exact_keys):
+            if exact := self.__lookup(exact_key):
+                results[index] = exact
+            else:
+                misses.append(index)
+
+        if misses:
+            embeddings = self.__text_processor.embeddings([keys[index] for index in misses])
+            for index, embedding in zip(misses, embeddings):
+                contexts[index].embedding = embedding
+
+            media_hashes = [contexts[index].media_hash for index in misses]
+            with span("search", queries=len(misses)):
+                searched = self.__db.search_many(embeddings=embeddings, media_hashes=media_hashes)
+
+            for index, cached in zip(misses, searched):
+                results[index] = self.__resolve(exact_keys[index], cached, **extras[index])
+
+        return results
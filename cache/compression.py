@@ -0,0 +1,55 @@
+import base64
+import json
+import zlib
+from typing import Any, Optional, Tuple
+
+# Stored response encodings, recorded in the entry metadata
+TEXT = "zlib"
+JSON = "zlib+json"
+
+
+def encode(response: Any) -> Tuple[bytes, str]:
+    """
+    Returns the bytes `compress` works on and the encoding they will be stored under
+    """
+
+    if isinstance(response, str):
+        return response.encode(), TEXT
+
+    return json.dumps(response).encode(), JSON
+
+
+def compress(response: Any, threshold: Optional[int], level: int = 6) -> Tuple[Any, Optional[str]]:
+    """
+    Returns `(stored, encoding)`. Responses of at least `threshold` bytes are zlib compressed and
+    base64 encoded (payloads are JSON); smaller ones, or ones that do not shrink, are stored as is.
+    """
+
+    if threshold is None:
+        return response, None
+
+    try:
+        raw, encoding = encode(response)
+    except (TypeError, ValueError):
+        return response, None
+
+    if len(raw) < threshold:
+        return response, None
+
+    stored = base64.b64encode(zlib.compress(raw, level)).decode("ascii")
+    if len(stored) >= len(raw):
+        return response, None
+
+    return stored, encoding
+
+
+def decompress(stored: Any, encoding: Optional[str]) -> Any:
+    """
+    Reverses `compress`
+    """
+
+    if not encoding:
+        return stored
+
+    raw = zlib.decompress(base64.b64decode(stored))
+    return json.loads(raw) if encoding == JSON else raw.decode()
@@ -0,0 +1,145 @@
+import heapq
+import itertools
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Heaps are rebuilt from the live entries once stale items outnumber them (plus this slack)
+COMPACT_SLACK = 64
+
+
+class EvictionPolicy(metaclass=ABCMeta):
+    """
+    Base Eviction Policy, decides which cache entry goes first when the cache is over capacity
+    """
+
+    @abstractmethod
+    def add(self, key: str, timestamp: float) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def touch(self, key: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove(self, key: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def victim(self) -> Optional[str]:
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """
+    Evicts the least recently used entry
+    """
+
+    def __init__(self) -> None:
+        self.__order: "OrderedDict[str, None]" = OrderedDict()
+
+    def add(self, key: str, timestamp: float) -> None:
+        self.__order[key] = None
+        self.__order.move_to_end(key)
+
+    def touch(self, key: str) -> None:
+        if key in self.__order:
+            self.__order.move_to_end(key)
+
+    def remove(self, key: str) -> None:
+        self.__order.pop(key, None)
+
+    def victim(self) -> Optional[str]:
+        return next(iter(self.__order), None)
+
+
+class LFUPolicy(EvictionPolicy):
+    """
+    Evicts the least frequently used entry, oldest use first on ties
+    """
+
+    def __init__(self) -> None:
+        self.__tick = itertools.count()
+        self.__current: Dict[str, Tuple[int, int]] = {}
+        self.__heap: List[Tuple[int, int, str]] = []
+
+    def __push(self, key: str, hits: int) -> None:
+        rank = (hits, next(self.__tick))
+        self.__current[key] = rank
+        heapq.heappush(self.__heap, (*rank, key))
+        self.__compact()
+
+    def __compact(self) -> None:
+        """
+        Drops stale heap items (touched or removed keys), so hits never grow the heap without bound
+        """
+
+        if len(self.__heap) > 2 * len(self.__current) + COMPACT_SLACK:
+            self.__heap = [(*rank, key) for key, rank in self.__current.items()]
+            heapq.heapify(self.__heap)
+
+    def add(self, key: str, timestamp: float) -> None:
+        self.__push(key, 0)
+
+    def touch(self, key: str) -> None:
+        if (rank := self.__current.get(key)) is not None:
+            self.__push(key, rank[0] + 1)
+
+    def remove(self, key: str) -> None:
+        self.__current.pop(key, None)
+        self.__compact()
+
+    def victim(self) -> Optional[str]:
+        # Stale heap items (touched or removed keys) are dropped lazily
+        while self.__heap:
+            hits, tick, key = self.__heap[0]
+            if self.__current.get(key) == (hits, tick):
+                return key
+
+            heapq.heappop(self.__heap)
+
+        return None
+
+
+class TTLPolicy(EvictionPolicy):
+    """
+    Evicts the entry closest to expiry (the oldest write)
+    """
+
+    def __init__(self) -> None:
+        self.__current: Dict[str, float] = {}
+        self.__heap: List[Tuple[float, str]] = []
+
+    def add(self, key: str, timestamp: float) -> None:
+        self.__current[key] = timestamp
+        heapq.heappush(self.__heap, (timestamp, key))
+        self.__compact()
+
+    def __compact(self) -> None:
+        """
+        Drops stale heap items (re-added or removed keys)
+        """
+
+        if len(self.__heap) > 2 * len(self.__current) + COMPACT_SLACK:
+            self.__heap = [(timestamp, key) for key, timestamp in self.__current.items()]
+            heapq.heapify(self.__heap)
+
+    def touch(self, key: str) -> None:
+        pass
+
+    def remove(self, key: str) -> None:
+        self.__current.pop(key, None)
+        self.__compact()
+
+    def victim(self) -> Optional[str]:
+        while self.__heap:
+            timestamp, key = self.__heap[0]
+            if self.__current.get(key) == timestamp:
+                return key
+
+            heapq.heappop(self.__heap)
+
+        return None
+
+
+POLICIES = {"lru": LRUPolicy, "lfu": LFUPolicy, "ttl": TTLPolicy}
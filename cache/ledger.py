@@ -0,0 +1,143 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+from .eviction import EvictionPolicy
+
+
+class Ledger:
+    """
+    Book-keeping for every cached entry: size, timestamp and media file references.
+    Media files can be shared by several entries (same image), so they are reference counted
+    and only reported as orphaned once the last entry using them is removed.
+    """
+
+    def __init__(
+        self,
+        policy: EvictionPolicy,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> None:
+        self.__policy: EvictionPolicy = policy
+        self.__max_entries: Optional[int] = max_entries
+        self.__max_bytes: Optional[int] = max_bytes
+
+        self.__bytes: int = 0
+        self.__entries: Dict[str, Dict] = {}
+        self.__media: Dict[str, Tuple[int, int]] = {}  # file path -> (references, size)
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__entries
+
+    @property
+    def bytes(self) -> int:
+        return self.__bytes
+
+    def add(
+        self,
+        key: str,
+        query: str,
+        media_hash: Optional[str],
+        file_path: Optional[str],
+        timestamp: float,
+        size: int,
+    ) -> Optional[str]:
+        """
+        Records an entry (replacing any previous one under `key`).
+        Returns a media file orphaned by the replacement, if any.
+        """
+
+        orphan = self.remove(key)[1] if key in self.__entries else None
+
+        if file_path:
+            references, media_size = self.__media.get(file_path, (0, 0))
+            if not references:
+                media_size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+                self.__bytes += media_size
+
+            self.__media[file_path] = (references + 1, media_size)
+
+        self.__entries[key] = {
+            "query": query,
+            "media_hash": media_hash,
+            "file_path": file_path,
+            "timestamp": timestamp,
+            "size": size,
+        }
+
+        self.__bytes += size
+        self.__policy.add(key, timestamp)
+
+        return orphan if orphan != file_path else None
+
+    def touch(self, key: str) -> bool:
+        """
+        Records a use of `key`; returns whether it is still tracked
+        """
+
+        if key not in self.__entries:
+            return False
+
+        self.__policy.touch(key)
+        return True
+
+    def remove(self, key: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Forgets `key`. Returns the entry and its media file if no other entry references it.
+        """
+
+        if (entry := self.__entries.pop(key, None)) is None:
+            return None, None
+
+        self.__bytes -= entry["size"]
+        self.__policy.remove(key)
+
+        orphan = None
+        if file_path := entry["file_path"]:
+            references, media_size = self.__media[file_path]
+            if references > 1:
+                self.__media[file_path] = (references - 1, media_size)
+            else:
+                del self.__media[file_path]
+                self.__bytes -= media_size
+                orphan = file_path
+
+        return entry, orphan
+
+    def overflow(self) -> List[str]:
+        """
+        Returns the keys to evict, in policy order, to get back within the limits
+        """
+
+        victims: List[str] = []
+        released: Dict[str, int] = {}
+        entries, size = len(self.__entries), self.__bytes
+
+        while (self.__max_entries is not None and entries > self.__max_entries) or (
+            self.__max_bytes is not None and size > self.__max_bytes and entries > 0
+        ):
+            if (key := self.__policy.victim()) is None:
+                break
+
+            # Take it out of the policy now so the next `victim` call moves on
+            self.__policy.remove(key)
+            victims.append(key)
+
+            entries -= 1
+            size -= self.__entries[key]["size"]
+            if file_path := self.__entries[key]["file_path"]:
+                released[file_path] = released.get(file_path, 0) + 1
+                references, media_size = self.__media[file_path]
+                if released[file_path] == references:
+                    size -= media_size
+
+        return victims
+
+    def expired(self, now: float, ttl: float) -> List[str]:
+        """
+        Returns every key written more than `ttl` seconds before `now`
+        """
+
+        return [key for key, entry in self.__entries.items() if now - entry["timestamp"] > ttl]
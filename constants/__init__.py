@@ -1 +1,32 @@
 INDEX_DIMENSION = 384
+
+# Minimum cosine similarity for a semantic cache hit
+SIMILARITY_THRESHOLD = 0.6
+
+# Upper bound on threads used to offload blocking work (embedding, CLIP, OCR, sync model clients)
+EXECUTOR_WORKERS = 8
+
+# Max concurrent in-flight calls per model on the async path
+MODEL_CONCURRENCY = {"clip": 1, "ollama": 4, "moon_dream": 4}
+
+# Moondream encoded images kept per model, bounded by count and estimated bytes
+ENCODED_IMAGE_CACHE_CAPACITY = 64
+ENCODED_IMAGE_CACHE_BYTES = 512 * 1024 * 1024
+
+# OCR results kept in memory (by image content hash) and the word grid cell size in pixels
+OCR_CACHE_CAPACITY = 256
+OCR_GRID_CELL = 64
+
+# Tiled OCR: tile edge and overlap in pixels (overlap should exceed the largest word)
+OCR_TILE_SIZE = 1024
+OCR_TILE_OVERLAP = 128
+
+# CLIP region crops encoded per forward pass, and label text embeddings kept in memory
+CLIP_BATCH_SIZE = 32
+CLIP_TEXT_CACHE_CAPACITY = 1024
+
+# Memory budget of the CLIP detection / region embedding cache
+REGION_CACHE_BYTES = 256 * 1024 * 1024
+
+# Responses of at least this many bytes are stored compressed in the semantic cache
+RESPONSE_COMPRESSION_THRESHOLD = 4096
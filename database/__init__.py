@@ -1,7 +1,25 @@
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
-from database.abstract import DBManager
-from database.media import MediaStorage
-from database.vector import VectorDB
+from utils.lazy import lazy_exports
 
-DB = Union[DBManager, VectorDB, MediaStorage]
+if TYPE_CHECKING:
+    from database.abstract import DBManager
+    from database.faiss_vector import FaissVectorDB
+    from database.media import MediaStorage
+    from database.numpy_vector import NumpyVectorDB
+    from database.vector import VectorDB
+
+    DB = Union[DBManager, VectorDB, FaissVectorDB, NumpyVectorDB, MediaStorage]
+
+# Backends (qdrant, faiss) load only when selected
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        "DBManager": "database.abstract",
+        "FaissVectorDB": "database.faiss_vector",
+        "MediaStorage": "database.media",
+        "NumpyVectorDB": "database.numpy_vector",
+        "VectorDB": "database.vector",
+    },
+    {"DB": ("DBManager", "VectorDB", "FaissVectorDB", "NumpyVectorDB", "MediaStorage")},
+)
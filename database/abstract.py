@@ -1,5 +1,15 @@
+import hashlib
 from abc import ABCMeta, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+def point_id(key: str, media_hash: Optional[str] = None) -> int:
+    """
+    Returns the stable numeric id stored for `key` (scoped to `media_hash` when given)
+    """
+
+    key = f"{key}:{media_hash}" if media_hash else key
+    return int(hashlib.md5(key.encode()).hexdigest(), 16) % (10**8)
 
 
 class DBManager(metaclass=ABCMeta):
@@ -18,3 +28,50 @@ class DBManager(metaclass=ABCMeta):
     @abstractmethod
     def search(self, **kwargs: Dict[str, Any]) -> Optional[str]:
         raise NotImplementedError
+
+    def insert_many(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        Inserts several entries; backends with a bulk write should override this.
+        """
+
+        for entry in entries:
+            self.insert(**entry)
+
+    def search_many(
+        self, embeddings: List[Any], media_hashes: Optional[List[Optional[str]]] = None, **kwargs: Dict[str, Any]
+    ) -> List[Optional[Dict]]:
+        """
+        Runs one search per embedding; backends with a batched search should override this.
+        """
+
+        media_hashes = media_hashes or [None] * len(embeddings)
+        return [
+            self.search(embedding=embedding, media_hash=media_hash, **kwargs)
+            for embedding, media_hash in zip(embeddings, media_hashes)
+        ]
+
+    def points(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every stored entry as `{"id", "vector", "payload"}` (used for snapshots).
+        """
+
+        raise NotImplementedError
+
+    def import_points(self, points: Iterable[Dict[str, Any]]) -> int:
+        """
+        Writes entries produced by `points` and returns how many were written.
+        """
+
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """
+        Returns the number of stored entries.
+        """
+
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """
+        Releases the underlying storage.
+        """
@@ -0,0 +1,381 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set
+
+import faiss
+import numpy as np
+
+from constants import INDEX_DIMENSION, SIMILARITY_THRESHOLD
+
+from .abstract import DBManager, point_id
+
+if TYPE_CHECKING:
+    from torch import Tensor
+
+INDEX_TYPES = {"flat", "hnsw", "ivf"}
+
+
+class FaissVectorDB(DBManager):
+    """
+    In-process Vector DB Layer backed by FAISS
+
+    Vectors are L2-normalized so inner product equals cosine similarity. Payloads live in a
+    side store keyed by the same ids `VectorDB` uses. Every write gets a fresh internal label;
+    replaced or deleted labels are tombstoned (and removed from the index where FAISS allows it),
+    and the index is rebuilt once tombstones pile up.
+
+    Only text entries go into the FAISS index. Entries tied to an image are grouped by media hash
+    and image queries score just that group, which is small and exact.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        dimension: int = INDEX_DIMENSION,
+        index_type: str = "flat",
+        nlist: int = 100,
+        nprobe: int = 8,
+        hnsw_m: int = 32,
+        ttl_in_seconds: Optional[float] = None,
+    ) -> None:
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {sorted(INDEX_TYPES)}")
+
+        self.__name: str = name
+        self.__dimension: int = dimension
+        self.__index_type: str = index_type
+
+        self.__nlist: int = nlist
+        self.__nprobe: int = nprobe
+        self.__hnsw_m: int = hnsw_m
+        self.__ttl: Optional[float] = ttl_in_seconds
+
+        self.__lock = threading.RLock()
+        self.__payloads: Dict[int, Dict] = {}
+        self.__vectors: Dict[int, np.ndarray] = {}
+        self.__scopes: Dict[str, Set[int]] = {}  # media hash -> ids
+
+        self.__labels: Dict[int, int] = {}  # label -> id
+        self.__rows: Dict[int, int] = {}  # id -> label
+        self.__next_label: int = 0
+        self.__tombstones: int = 0
+
+        self.create(name=self.__name)
+
+    def __build(self) -> faiss.Index:
+        """
+        Returns an empty index of the configured type. IVF falls back to a flat index until
+        enough vectors exist to train its coarse quantizer.
+        """
+
+        if self.__index_type == "hnsw":
+            return faiss.IndexHNSWFlat(self.__dimension, self.__hnsw_m, faiss.METRIC_INNER_PRODUCT)
+
+        if self.__index_type == "ivf" and len(indexed := self.__indexed()) >= self.__train_size():
+            quantizer = faiss.IndexFlatIP(self.__dimension)
+            index = faiss.IndexIVFFlat(quantizer, self.__dimension, self.__nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(np.stack([self.__vectors[_id] for _id in indexed]))
+            index.nprobe = self.__nprobe
+            return index
+
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.__dimension))
+
+    def __indexed(self) -> List[int]:
+        """
+        Ids of the text entries that live in the FAISS index
+        """
+
+        return [_id for _id, payload in self.__payloads.items() if not payload.get("media_hash")]
+
+    def __train_size(self) -> int:
+        """
+        Number of vectors needed before the IVF index is trained
+        """
+
+        return self.__nlist * 39
+
+    def __trained(self) -> bool:
+        """
+        Whether the current index is the trained IVF index
+        """
+
+        return isinstance(self.__index, faiss.IndexIVF)
+
+    def __removable(self) -> bool:
+        """
+        Whether the current index supports `add_with_ids` / `remove_ids` (HNSW does not)
+        """
+
+        return not isinstance(self.__index, faiss.IndexHNSW)
+
+    def __rebuild(self) -> None:
+        """
+        Re-creates the index from the side store, dropping every tombstone
+        """
+
+        self.__index = self.__build()
+        self.__labels, self.__rows = {}, {}
+        self.__next_label, self.__tombstones = 0, 0
+
+        if ids := self.__indexed():
+            self.__add(ids, np.stack([self.__vectors[_id] for _id in ids]))
+
+    def __add(self, ids: List[int], vectors: np.ndarray) -> None:
+        """
+        Adds normalized `vectors` under fresh labels
+        """
+
+        labels = np.arange(self.__next_label, self.__next_label + len(ids), dtype=np.int64)
+        self.__next_label += len(ids)
+
+        for label, _id in zip(labels.tolist(), ids):
+            self.__labels[label] = _id
+            self.__rows[_id] = label
+
+        if self.__removable():
+            self.__index.add_with_ids(vectors, labels)
+        else:
+            self.__index.add(vectors)
+
+    def __discard(self, _id: int) -> None:
+        """
+        Tombstones the label currently stored for `_id` and drops it from its media scope
+        """
+
+        if (payload := self.__payloads.get(_id)) and (media_hash := payload.get("media_hash")):
+            self.__scopes.get(media_hash, set()).discard(_id)
+            if not self.__scopes.get(media_hash):
+                self.__scopes.pop(media_hash, None)
+
+        if (label := self.__rows.pop(_id, None)) is None:
+            return
+
+        del self.__labels[label]
+        if self.__removable():
+            self.__index.remove_ids(np.array([label], dtype=np.int64))
+        else:
+            self.__tombstones += 1
+
+    def __normalize(self, embeddings: List[Any]) -> np.ndarray:
+        """
+        Returns a contiguous, L2-normalized float32 matrix
+        """
+
+        vectors = np.ascontiguousarray(np.stack([np.asarray(e, dtype=np.float32).ravel() for e in embeddings]))
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def __expired(self, payload: Dict) -> bool:
+        """
+        Whether `payload` is past the configured TTL
+        """
+
+        return self.__ttl is not None and time.time() - payload["metadata"]["timestamp"] > self.__ttl
+
+    def __upsert(self, ids: List[int], vectors: np.ndarray, payloads: List[Dict]) -> None:
+        """
+        Writes entries, replacing existing ones with the same id
+        """
+
+        indexed: List[int] = []
+        for _id, vector, payload in zip(ids, vectors, payloads):
+            self.__discard(_id)
+            self.__vectors[_id] = vector
+            self.__payloads[_id] = payload
+
+            if media_hash := payload.get("media_hash"):
+                self.__scopes.setdefault(media_hash, set()).add(_id)
+            else:
+                indexed.append(_id)
+
+        if self.__index_type == "ivf" and not self.__trained() and len(self.__rows) + len(indexed) >= self.__train_size():
+            self.__rebuild()
+        elif indexed:
+            self.__add(indexed, np.stack([self.__vectors[_id] for _id in indexed]))
+
+        if self.__tombstones > max(64, len(self.__vectors) // 4):
+            self.__rebuild()
+
+    def create(self, name: str) -> None:
+        """
+        Creates an empty index
+        """
+
+        with self.__lock:
+            self.__index = self.__build()
+
+    def insert(
+        self, key: str, embedding: "Tensor", response: str, metadata: Dict, media_hash: Optional[str] = None
+    ) -> None:
+        """
+        Insert data into the index
+        """
+
+        self.insert_many(
+            [{"key": key, "embedding": embedding, "response": response, "metadata": metadata, "media_hash": media_hash}]
+        )
+
+    def insert_many(self, entries: List[Dict]) -> None:
+        """
+        Insert several entries with a single index write
+        """
+
+        if not entries:
+            return
+
+        # Later duplicates win, as with sequential upserts
+        latest = {point_id(entry["key"], entry.get("media_hash")): entry for entry in entries}
+        vectors = self.__normalize([entry["embedding"] for entry in latest.values()])
+        payloads = [
+            {
+                "query": entry["key"],
+                "response": entry["response"],
+                "metadata": entry["metadata"],
+                "media_hash": entry.get("media_hash"),
+            }
+            for entry in latest.values()
+        ]
+
+        with self.__lock:
+            self.__upsert(list(latest.keys()), vectors, payloads)
+
+    def search(
+        self, embedding: "Tensor", threshold: float = SIMILARITY_THRESHOLD, media_hash: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Search response for given `query` among entries for the same media (or text-only entries)
+        """
+
+        return self.search_many([embedding], media_hashes=[media_hash], threshold=threshold)[0]
+
+    def search_many(
+        self,
+        embeddings: List["Tensor"],
+        media_hashes: Optional[List[Optional[str]]] = None,
+        threshold: float = SIMILARITY_THRESHOLD,
+    ) -> List[Optional[Dict]]:
+        """
+        Search responses for several embeddings; text queries share one index query
+        """
+
+        if not embeddings:
+            return []
+
+        queries = self.__normalize(embeddings)
+        media_hashes = media_hashes or [None] * len(embeddings)
+        results: List[Optional[Dict]] = [None] * len(embeddings)
+
+        with self.__lock:
+            for index, media_hash in enumerate(media_hashes):
+                if media_hash:
+                    results[index] = self.__search_scope(queries[index], media_hash, threshold)
+
+            text = [index for index, media_hash in enumerate(media_hashes) if not media_hash]
+            if text and self.__labels:
+                for index, closest in zip(text, self.__search_index(queries[text], threshold)):
+                    results[index] = closest
+
+        return results
+
+    def __search_scope(self, query: np.ndarray, media_hash: str, threshold: float) -> Optional[Dict]:
+        """
+        Exact search over the entries stored for one image
+        """
+
+        for _id in [_id for _id in self.__scopes.get(media_hash, ()) if self.__expired(self.__payloads[_id])]:
+            self.__delete(_id)
+
+        if not (ids := list(self.__scopes.get(media_hash, ()))):
+            return None
+
+        scores = np.stack([self.__vectors[_id] for _id in ids]) @ query
+        best = int(np.argmax(scores))
+
+        return self.__payloads[ids[best]] if scores[best] >= threshold else None
+
+    def __search_index(self, queries: np.ndarray, threshold: float) -> List[Optional[Dict]]:
+        """
+        Searches text entries in the FAISS index
+        """
+
+        limit = min(self.__index.ntotal, 2 + self.__tombstones)
+        scores, labels = self.__index.search(queries, limit)
+
+        results: List[Optional[Dict]] = []
+        for row_scores, row_labels in zip(scores, labels):
+            closest = None
+            for score, label in zip(row_scores.tolist(), row_labels.tolist()):
+                if (_id := self.__labels.get(label)) is None:
+                    continue
+
+                payload = self.__payloads[_id]
+                if self.__expired(payload):
+                    self.__delete(_id)
+                    continue
+
+                closest = payload if score >= threshold else None
+                break
+
+            results.append(closest)
+
+        return results
+
+    def __delete(self, _id: int) -> None:
+        """
+        Removes `_id` from the index and side store
+        """
+
+        self.__discard(_id)
+        self.__vectors.pop(_id, None)
+        self.__payloads.pop(_id, None)
+
+    def delete(self, query: str, media_hash: Optional[str] = None) -> None:
+        """
+        Deletes an entry from the index.
+        """
+
+        with self.__lock:
+            self.__delete(point_id(query, media_hash))
+
+    def expire(self) -> int:
+        """
+        Removes every entry past the TTL and returns how many were removed
+        """
+
+        with self.__lock:
+            expired = [_id for _id, payload in self.__payloads.items() if self.__expired(payload)]
+            for _id in expired:
+                self.__delete(_id)
+
+        return len(expired)
+
+    def count(self) -> int:
+        """
+        Returns the number of stored entries
+        """
+
+        return len(self.__payloads)
+
+    def points(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every stored entry with its vector and payload
+        """
+
+        with self.__lock:
+            items = [(_id, self.__vectors[_id], payload) for _id, payload in self.__payloads.items()]
+
+        for _id, vector, payload in items:
+            yield {"id": _id, "vector": vector.tolist(), "payload": payload}
+
+    def import_points(self, points: Iterable[Dict[str, Any]]) -> int:
+        """
+        Upserts entries produced by `points`
+        """
+
+        points = list(points)
+        if points:
+            vectors = self.__normalize([point["vector"] for point in points])
+            with self.__lock:
+                self.__upsert([point["id"] for point in points], vectors, [point["payload"] for point in points])
+
+        return len(points)
@@ -1,20 +1,79 @@
 import hashlib
+import json
 import os
+import re
 import shutil
-from typing import Any, Dict, Optional
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from utils.lru import LRUCache
+from utils.metrics import span
 
 from .abstract import DBManager
 
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}$")
+
 
 class MediaStorage(DBManager):
     """
     Storage Layer for managing media files.
+
+    Files are content addressed (`<sha256><ext>`). A persistent hash -> file name index
+    (`.index.json`) makes lookups O(1), and file hashes are memoized per path on
+    (inode, size, mtime) so unchanged files are never re-read.
     """
 
-    def __init__(self, storage_dir: str = "./assets") -> None:
+    INDEX_FILE = ".index.json"
+
+    def __init__(self, storage_dir: str = "./assets", memo_capacity: int = 65536) -> None:
         self.__storage_dir = storage_dir
         os.makedirs(self.__storage_dir, exist_ok=True)
 
+        self.__lock = threading.RLock()
+        self.__hashes = LRUCache(capacity=memo_capacity)
+        self.__index: Dict[str, str] = self.__load_index()
+
+    @property
+    def __index_path(self) -> str:
+        return os.path.join(self.__storage_dir, self.INDEX_FILE)
+
+    def __load_index(self) -> Dict[str, str]:
+        """
+        Reads the persisted index, building it from the directory once if it does not exist
+        """
+
+        if os.path.exists(self.__index_path):
+            with open(self.__index_path) as index_file:
+                return json.load(index_file)
+
+        index = {}
+        for file_name in os.listdir(self.__storage_dir):
+            file_hash = os.path.splitext(file_name)[0]
+            if HASHED_NAME.match(file_hash) and os.path.isfile(os.path.join(self.__storage_dir, file_name)):
+                index[file_hash] = file_name
+
+        self.__save_index(index)
+        return index
+
+    def __save_index(self, index: Dict[str, str]) -> None:
+        """
+        Atomically persists `index`
+        """
+
+        temporary_path = f"{self.__index_path}.tmp"
+        with open(temporary_path, "w") as index_file:
+            json.dump(index, index_file)
+
+        os.replace(temporary_path, self.__index_path)
+
+    def __signature(self, file_path: str) -> Tuple[int, int, int]:
+        """
+        Returns the (inode, size, mtime) triple used to detect changed files
+        """
+
+        stat = os.stat(file_path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
     def create(self, name: str) -> None:
         """
         Creates a subdirectory for media storage if needed
@@ -32,11 +91,20 @@ class MediaStorage(DBManager):
         Generate a unique hash for a given file based on its content.
         """
 
+        try:
+            key = os.path.abspath(file_path)
+            signature = self.__signature(file_path)
+        except FileNotFoundError as exception:
+            raise ValueError(f"File {file_path} not found.") from exception
+
+        if (memo := self.__hashes.get(key)) and memo[0] == signature:
+            return memo[1]
+
         hasher = hashlib.sha256()
 
         try:
-            with open(file_path, "rb") as media_file:
-                while chunk := media_file.read(8192):
+            with span("media.hash"), open(file_path, "rb") as media_file:
+                while chunk := media_file.read(1 << 20):
                     hasher.update(chunk)
         except FileNotFoundError as exception:
             raise ValueError(f"File {file_path} not found.") from exception
@@ -46,21 +114,58 @@ class MediaStorage(DBManager):
                 f"Error hashing file {file_path}: {exception}"
             ) from exception
 
-        return hasher.hexdigest()
+        file_hash = hasher.hexdigest()
+        self.__hashes.set(key, (signature, file_hash))
+
+        return file_hash
+
+    def path(self, file_hash: str) -> Optional[str]:
+        """
+        Returns the stored path for `file_hash`, if present.
+        """
+
+        with self.__lock:
+            if not (file_name := self.__index.get(file_hash)):
+                return None
+
+            stored_path = os.path.join(self.__storage_dir, file_name)
+            if os.path.exists(stored_path):
+                return stored_path
+
+            # Removed behind our back
+            del self.__index[file_hash]
+            self.__save_index(self.__index)
+
+        return None
 
     def insert(self, key: str, **kwargs: Dict[str, Any]) -> str:
         """
         Store a file in the media storage directory.
+        Identical content is stored once. New files are copied, never hardlinked: a link would share
+        the inode with the caller's file, so rewriting that file in place would change the stored copy
+        under its old hash.
         """
 
         if not os.path.exists(key):
             raise FileNotFoundError(f"File {key} not found.")
 
         file_hash = self.get_hash(key)
+        if stored_path := self.path(file_hash):
+            return stored_path
+
         extension = os.path.splitext(key)[1]
         stored_path = os.path.join(self.__storage_dir, f"{file_hash}{extension}")
 
-        shutil.copy(key, stored_path)
+        with span("media.insert"), self.__lock:
+            if not os.path.exists(stored_path):
+                # Copied next to its final name first, so a partial copy is never indexed
+                temporary_path = f"{stored_path}.tmp"
+                shutil.copyfile(key, temporary_path)
+                os.replace(temporary_path, stored_path)
+
+            self.__index[file_hash] = os.path.basename(stored_path)
+            self.__save_index(self.__index)
+
         return stored_path
 
     def search(self, **kwargs: Dict[str, Any]) -> Optional[str]:
@@ -73,22 +178,7 @@ class MediaStorage(DBManager):
         if not file_path:
             raise ValueError("file_path is required for search.")
 
-        file_hash = self.get_hash(file_path)
-
-        matched_files = [
-            os.path.join(self.__storage_dir, file_name)
-            for file_name in os.listdir(self.__storage_dir)
-            if file_name.startswith(file_hash)
-        ]
-
-        if not matched_files:
-            return None
-
-        elif len(matched_files) == 1:
-            return matched_files[0]
-
-        else:
-            raise RuntimeError(f"Multiple files found matching the hash: {file_hash}")
+        return self.path(self.get_hash(file_path))
 
     def delete(self, file_path: str) -> None:
         """
@@ -99,3 +189,9 @@ class MediaStorage(DBManager):
             os.remove(file_path)
         else:
             raise FileNotFoundError(f"File {file_path} not found.")
+
+        with self.__lock:
+            file_hash = os.path.splitext(os.path.basename(file_path))[0]
+            if self.__index.get(file_hash) == os.path.basename(file_path):
+                del self.__index[file_hash]
+                self.__save_index(self.__index)
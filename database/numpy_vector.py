@@ -0,0 +1,535 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from constants import INDEX_DIMENSION, SIMILARITY_THRESHOLD
+
+from .abstract import DBManager, point_id
+
+# Row storage: dtype and file suffix of the matrix
+STORAGES = {"float32": (np.float32, "f32"), "float16": (np.float16, "f16"), "int8": (np.int8, "i8")}
+
+# Rows converted to float32 per block while scoring compressed storage. Small enough for the block
+# to stay in CPU cache between the conversion and the product: int8 then scores about as fast as
+# float32, while float16 stays several times slower (NumPy converts half floats without SIMD).
+SCORE_BLOCK = 1024
+
+
+class NumpyVectorDB(DBManager):
+    """
+    Brute-force Vector DB Layer over one contiguous, L2-normalized matrix
+
+    Each lookup is a single matrix-vector (or matrix-matrix for batches) product. Rows are
+    preallocated and the matrix doubles when full; deleted rows go to a free list and are reused.
+    With `path`, the matrix is a memory-mapped file (`<path>.f32`) plus a metadata file
+    (`<path>.json`) written on `flush`, so other processes can open it with `read_only=True`.
+
+    `storage="float16"` halves the matrix and `storage="int8"` stores each row scalar-quantized with
+    its own scale (a quarter of the size). With `rescore`, full precision copies are kept as well
+    (memory-mapped under `<path>.f32` when persistent) and the best `rescore` compressed matches are
+    re-ranked with exact scores, so the threshold is applied to exact similarities.
+
+    Rows tied to an image are indexed by media hash; image queries only score that image's rows
+    and text queries skip every image row.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        dimension: int = INDEX_DIMENSION,
+        capacity: int = 1024,
+        path: Optional[str] = None,
+        read_only: bool = False,
+        storage: str = "float32",
+        rescore: int = 0,
+    ) -> None:
+        if storage not in STORAGES:
+            raise ValueError(f"storage must be one of {sorted(STORAGES)}")
+
+        self.__name: str = name
+        self.__dimension: int = dimension
+        self.__path: Optional[str] = path
+        self.__read_only: bool = read_only
+        self.__storage: str = storage
+        self.__rescore: int = rescore if storage != "float32" else 0
+
+        if read_only and not path:
+            raise ValueError("read_only requires a `path` written by another instance")
+
+        self.__lock = threading.RLock()
+        self.__capacity: int = max(1, capacity)
+        self.__size: int = 0  # rows in use, including freed ones below the high-water mark
+
+        self.__rows: Dict[int, int] = {}  # id -> row
+        self.__row_ids: Dict[int, int] = {}  # row -> id
+        self.__free: List[int] = []
+        self.__payloads: Dict[int, Dict] = {}
+        self.__scopes: Dict[str, Set[int]] = {}  # media hash -> rows
+
+        self.__scales: Optional[np.ndarray] = None  # per row, int8 storage
+        self.__originals: Optional[np.ndarray] = None  # full precision rows, with `rescore`
+
+        self.create(name=self.__name)
+
+    @property
+    def __metadata_path(self) -> str:
+        return f"{self.__path}.json"
+
+    def __array(self, suffix: str, dtype: Any, shape: Tuple[int, ...]) -> np.ndarray:
+        """
+        Returns a zeroed array, or the one mapped from `<path>.<suffix>`
+        """
+
+        if not self.__path:
+            return np.zeros(shape, dtype=dtype)
+
+        file_path = f"{self.__path}.{suffix}"
+        if self.__read_only:
+            return np.memmap(file_path, dtype=dtype, mode="r", shape=shape)
+
+        mode = "r+" if os.path.exists(file_path) else "w+"
+        return np.memmap(file_path, dtype=dtype, mode=mode, shape=shape)
+
+    def __allocate(self, capacity: int) -> None:
+        """
+        Allocates (or maps) the `capacity x dimension` matrix, its int8 scales and full precision copies
+        """
+
+        dtype, suffix = STORAGES[self.__storage]
+        self.__matrix = self.__array(suffix, dtype, (capacity, self.__dimension))
+
+        if self.__storage == "int8":
+            self.__scales = self.__array("scales", np.float32, (capacity,))
+
+        if self.__rescore:
+            self.__originals = self.__array("f32", np.float32, (capacity, self.__dimension))
+
+    def __arrays(self) -> List[np.ndarray]:
+        """
+        Every per-row array backing the vectors
+        """
+
+        return [array for array in (self.__matrix, self.__scales, self.__originals) if array is not None]
+
+    def __grow(self, required: int) -> None:
+        """
+        Doubles the capacity until `required` rows fit
+        """
+
+        if required <= self.__capacity:
+            return
+
+        capacity = self.__capacity
+        while capacity < required:
+            capacity *= 2
+
+        previous = self.__arrays()
+        if self.__path:
+            for array in previous:
+                array.flush()
+
+        self.__allocate(capacity)
+        if not self.__path:
+            for array, current in zip(previous, self.__arrays()):
+                current[: self.__size] = array[: self.__size]
+
+        valid, media = np.zeros(capacity, dtype=bool), np.zeros(capacity, dtype=bool)
+        valid[: self.__size] = self.__valid[: self.__size]
+        media[: self.__size] = self.__media[: self.__size]
+
+        self.__valid, self.__media, self.__capacity = valid, media, capacity
+
+    def __normalize(self, embeddings: Any) -> np.ndarray:
+        """
+        Returns `embeddings` as an L2-normalized float32 matrix (one row per embedding)
+        """
+
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors = vectors.reshape(-1, self.__dimension)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def __compress(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Converts normalized rows to the storage dtype, returning the int8 scales alongside
+        """
+
+        if self.__storage != "int8":
+            return vectors.astype(STORAGES[self.__storage][0]), None
+
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.rint(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def __vector(self, row: int) -> np.ndarray:
+        """
+        Returns the stored vector of `row` in float32
+        """
+
+        if self.__originals is not None:
+            return np.array(self.__originals[row])
+
+        vector = np.asarray(self.__matrix[row], dtype=np.float32)
+        return vector * self.__scales[row] if self.__scales is not None else vector
+
+    def __scores(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Scores `queries` against `rows` (every row below the high-water mark when `None`).
+        Compressed rows are converted to float32 one block at a time into a reused buffer, and int8
+        scores are dequantized once per row (by its scale) rather than per element.
+        """
+
+        count = self.__size if rows is None else len(rows)
+
+        if self.__storage == "float32":
+            return queries @ (self.__matrix[: self.__size] if rows is None else self.__matrix[rows]).T
+
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        block = np.empty((min(count, SCORE_BLOCK), self.__dimension), dtype=np.float32)
+
+        for start in range(0, count, SCORE_BLOCK):
+            end = min(count, start + SCORE_BLOCK)
+            index = slice(start, end) if rows is None else rows[start:end]
+
+            converted = block[: end - start]
+            converted[...] = self.__matrix[index]
+            np.matmul(queries, converted.T, out=scores[:, start:end])
+
+        if self.__scales is not None:
+            scores *= self.__scales[: self.__size] if rows is None else self.__scales[rows]
+
+        return scores
+
+    def __check_writable(self) -> None:
+        if self.__read_only:
+            raise PermissionError(f"{self.__name} was opened read-only")
+
+    def __load(self) -> None:
+        """
+        Reads the metadata written by `flush`
+        """
+
+        with open(self.__metadata_path) as metadata_file:
+            metadata = json.load(metadata_file)
+
+        if (storage := metadata.get("storage", "float32")) != self.__storage:
+            raise ValueError(f"{self.__path} stores {storage} vectors, not {self.__storage}")
+
+        if self.__rescore and not metadata.get("originals"):
+            raise ValueError(f"{self.__path} has no full precision vectors, open it with rescore=0")
+
+        self.__capacity, self.__size = metadata["capacity"], metadata["size"]
+        self.__rows = {int(_id): row for _id, row in metadata["rows"].items()}
+        self.__row_ids = {row: _id for _id, row in self.__rows.items()}
+        self.__payloads = {int(_id): payload for _id, payload in metadata["payloads"].items()}
+
+        self.__free = sorted(set(range(self.__size)) - set(self.__rows.values()), reverse=True)
+        self.__valid = np.zeros(self.__capacity, dtype=bool)
+        self.__valid[list(self.__rows.values())] = True
+
+        self.__scopes = {}
+        self.__media = np.zeros(self.__capacity, dtype=bool)
+        for _id, row in self.__rows.items():
+            self.__scope(row, self.__payloads[_id].get("media_hash"))
+
+    def __scope(self, row: int, media_hash: Optional[str]) -> None:
+        """
+        Files `row` under `media_hash` (or marks it as a text row)
+        """
+
+        self.__media[row] = bool(media_hash)
+        if media_hash:
+            self.__scopes.setdefault(media_hash, set()).add(row)
+
+    def __unscope(self, row: int, media_hash: Optional[str]) -> None:
+        """
+        Removes `row` from the scope of `media_hash`
+        """
+
+        if media_hash and (rows := self.__scopes.get(media_hash)) is not None:
+            rows.discard(row)
+            if not rows:
+                del self.__scopes[media_hash]
+
+        self.__media[row] = False
+
+    def create(self, name: str) -> None:
+        """
+        Allocates the matrix, reopening persisted state when `path` already holds one
+        """
+
+        with self.__lock:
+            if self.__path and os.path.exists(self.__metadata_path):
+                self.__load()
+            elif self.__read_only:
+                raise FileNotFoundError(f"{self.__metadata_path} not found")
+            else:
+                self.__valid = np.zeros(self.__capacity, dtype=bool)
+                self.__media = np.zeros(self.__capacity, dtype=bool)
+
+            self.__allocate(self.__capacity)
+
+    def refresh(self) -> None:
+        """
+        Re-reads state flushed by the writer (read-only instances)
+        """
+
+        with self.__lock:
+            self.__load()
+            self.__allocate(self.__capacity)
+
+    def flush(self) -> None:
+        """
+        Persists the matrix and metadata so readers can pick them up
+        """
+
+        if not self.__path or self.__read_only:
+            return
+
+        with self.__lock:
+            for array in self.__arrays():
+                array.flush()
+
+            metadata = {
+                "storage": self.__storage,
+                "originals": self.__originals is not None,
+                "capacity": self.__capacity,
+                "size": self.__size,
+                "rows": self.__rows,
+                "payloads": self.__payloads,
+            }
+
+            temporary_path = f"{self.__metadata_path}.tmp"
+            with open(temporary_path, "w") as metadata_file:
+                json.dump(metadata, metadata_file)
+
+            os.replace(temporary_path, self.__metadata_path)
+
+    def __upsert(self, ids: List[int], vectors: np.ndarray, payloads: List[Dict]) -> None:
+        """
+        Writes normalized `vectors`, reusing the row of an existing id or a free row
+        """
+
+        new = len([_id for _id in dict.fromkeys(ids) if _id not in self.__rows])
+        self.__grow(self.__size + max(0, new - len(self.__free)))
+        stored, scales = self.__compress(vectors)
+
+        for index, (_id, payload) in enumerate(zip(ids, payloads)):
+            if (row := self.__rows.get(_id)) is None:
+                if self.__free:
+                    row = self.__free.pop()
+                else:
+                    row, self.__size = self.__size, self.__size + 1
+
+                self.__rows[_id] = row
+                self.__row_ids[row] = _id
+            else:
+                self.__unscope(row, self.__payloads[_id].get("media_hash"))
+
+            self.__matrix[row] = stored[index]
+            if scales is not None:
+                self.__scales[row] = scales[index]
+            if self.__originals is not None:
+                self.__originals[row] = vectors[index]
+
+            self.__valid[row] = True
+            self.__payloads[_id] = payload
+            self.__scope(row, payload.get("media_hash"))
+
+    def insert(
+        self, key: str, embedding: Any, response: str, metadata: Dict, media_hash: Optional[str] = None
+    ) -> None:
+        """
+        Insert data into the matrix
+        """
+
+        self.insert_many(
+            [{"key": key, "embedding": embedding, "response": response, "metadata": metadata, "media_hash": media_hash}]
+        )
+
+    def insert_many(self, entries: List[Dict]) -> None:
+        """
+        Insert several entries with one vectorized write
+        """
+
+        self.__check_writable()
+        if not entries:
+            return
+
+        vectors = self.__normalize(np.stack([np.asarray(entry["embedding"]) for entry in entries]))
+        payloads = [
+            {
+                "query": entry["key"],
+                "response": entry["response"],
+                "metadata": entry["metadata"],
+                "media_hash": entry.get("media_hash"),
+            }
+            for entry in entries
+        ]
+
+        with self.__lock:
+            self.__upsert([point_id(entry["key"], entry.get("media_hash")) for entry in entries], vectors, payloads)
+
+    def top_k(self, embeddings: Any, k: int = 2, media_hash: Optional[str] = None) -> List[List[Tuple[float, Dict]]]:
+        """
+        Returns the `k` best `(score, payload)` pairs for each embedding, best first,
+        among rows for `media_hash` (or among text rows when it is `None`)
+        """
+
+        queries = self.__normalize(embeddings)
+
+        with self.__lock:
+            if media_hash:
+                rows = np.fromiter(self.__scopes.get(media_hash, ()), dtype=np.int64)
+                scores = self.__scores(queries, rows)
+                eligible = len(rows)
+            else:
+                rows = np.arange(self.__size)
+                mask = self.__valid[: self.__size] & ~self.__media[: self.__size]
+                scores = self.__scores(queries, None)
+                scores[:, ~mask] = -np.inf
+                eligible = int(mask.sum())
+
+            if not eligible:
+                return [[] for _ in range(len(queries))]
+
+            k = min(k, eligible)
+            depth = min(max(k, self.__rescore), eligible)
+            candidates = np.argpartition(-scores, depth - 1, axis=1)[:, :depth]
+
+            if self.__originals is not None:
+                # Exact scores for the compressed shortlist
+                candidate_scores = np.einsum("qkd,qd->qk", self.__originals[rows[candidates]], queries)
+            else:
+                candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+
+            order = np.argsort(-candidate_scores, axis=1)[:, :k]
+            ranked = np.take_along_axis(candidates, order, axis=1)
+            ranked_scores = np.take_along_axis(candidate_scores, order, axis=1)
+
+            return [
+                [
+                    (float(score), self.__payloads[self.__row_ids[int(rows[column])]])
+                    for column, score in zip(columns.tolist(), row_scores.tolist())
+                ]
+                for columns, row_scores in zip(ranked, ranked_scores)
+            ]
+
+    def search(
+        self, embedding: Any, threshold: float = SIMILARITY_THRESHOLD, media_hash: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Search response for given `query` among entries for the same media (or text-only entries)
+        """
+
+        return self.search_many([embedding], media_hashes=[media_hash], threshold=threshold)[0]
+
+    def search_many(
+        self,
+        embeddings: List[Any],
+        media_hashes: Optional[List[Optional[str]]] = None,
+        threshold: float = SIMILARITY_THRESHOLD,
+    ) -> List[Optional[Dict]]:
+        """
+        Search responses for several embeddings with one matrix product per media scope
+        """
+
+        if not len(embeddings):
+            return []
+
+        media_hashes = media_hashes or [None] * len(embeddings)
+        groups: Dict[Optional[str], List[int]] = {}
+        for index, media_hash in enumerate(media_hashes):
+            groups.setdefault(media_hash, []).append(index)
+
+        results: List[Optional[Dict]] = [None] * len(embeddings)
+        for media_hash, indices in groups.items():
+            queries = np.stack([np.asarray(embeddings[index]) for index in indices])
+
+            for index, matches in zip(indices, self.top_k(queries, k=1, media_hash=media_hash)):
+                results[index] = matches[0][1] if matches and matches[0][0] >= threshold else None
+
+        return results
+
+    def delete(self, query: str, media_hash: Optional[str] = None) -> None:
+        """
+        Deletes an entry and frees its row for reuse.
+        """
+
+        self.__check_writable()
+        _id = point_id(query, media_hash)
+
+        with self.__lock:
+            if (row := self.__rows.pop(_id, None)) is not None:
+                del self.__row_ids[row]
+                self.__valid[row] = False
+                self.__free.append(row)
+                self.__unscope(row, self.__payloads.pop(_id, {}).get("media_hash"))
+
+    def count(self) -> int:
+        """
+        Returns the number of stored entries
+        """
+
+        return len(self.__rows)
+
+    def points(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every stored entry with its vector and payload
+        """
+
+        with self.__lock:
+            items = [(_id, self.__vector(row), self.__payloads[_id]) for _id, row in self.__rows.items()]
+
+        for _id, vector, payload in items:
+            yield {"id": _id, "vector": vector.tolist(), "payload": payload}
+
+    def import_points(self, points: Iterable[Dict[str, Any]]) -> int:
+        """
+        Upserts entries produced by `points`
+        """
+
+        self.__check_writable()
+
+        points = list(points)
+        if points:
+            vectors = self.__normalize([point["vector"] for point in points])
+            with self.__lock:
+                self.__upsert([point["id"] for point in points], vectors, [point["payload"] for point in points])
+
+        return len(points)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the storage mode and vector bytes per entry. `bytes_per_entry` is the scored matrix
+        (plus int8 scales); `rescore_bytes_per_entry` the full precision copies, on disk with `path`.
+        `bytes` totals the allocated vectors, including the full precision copies when held in memory.
+        """
+
+        bytes_per_entry = self.__matrix.itemsize * self.__dimension
+        if self.__scales is not None:
+            bytes_per_entry += self.__scales.itemsize
+
+        rescore_bytes_per_entry = 4 * self.__dimension if self.__originals is not None else 0
+        total_per_entry = bytes_per_entry + (rescore_bytes_per_entry if not self.__path else 0)
+
+        return {
+            "storage": self.__storage,
+            "rescore": self.__rescore,
+            "entries": len(self.__rows),
+            "capacity": self.__capacity,
+            "bytes_per_entry": bytes_per_entry,
+            "rescore_bytes_per_entry": rescore_bytes_per_entry,
+            "bytes": total_per_entry * self.__capacity,
+        }
+
+    def close(self) -> None:
+        """
+        Flushes memory-mapped state
+        """
+
+        self.flush()
@@ -1,13 +1,32 @@
 import hashlib
-from typing import Dict, Optional
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set
 
+import numpy as np
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, PointStruct, VectorParams
-from torch import Tensor, tensor
+from qdrant_client.models import (
+    Distance,
+    Filter,
+    IsEmptyCondition,
+    IsNullCondition,
+    PayloadField,
+    PointStruct,
+    ScoredPoint,
+    SearchRequest,
+    VectorParams,
+)
 
-from constants import INDEX_DIMENSION
+from constants import INDEX_DIMENSION, SIMILARITY_THRESHOLD
 
-from .abstract import DBManager
+from .abstract import DBManager, point_id
+
+if TYPE_CHECKING:
+    from torch import Tensor
+
+logger = logging.getLogger(__name__)
 
 
 class VectorDB(DBManager):
@@ -15,12 +34,30 @@ class VectorDB(DBManager):
     Vector DB Layer
     """
 
-    def __init__(self, name: str) -> None:
+    def __init__(self, name: str, path: Optional[str] = None) -> None:
+        """
+        `path` enables Qdrant's local on-disk storage so the cache survives restarts,
+        otherwise the collection lives in memory. Local mode keeps full float32 vectors;
+        compressed storage is provided by `NumpyVectorDB(storage=...)`.
+        """
+
         self.__name: str = name
-        self.__client = QdrantClient(":memory:")
+        # Local mode client is not safe for concurrent writers and readers
+        self.__lock = threading.RLock()
+        # Local mode ignores payload indexes and filters every point, image lookups go through this instead
+        self.__scopes: Dict[str, Set[int]] = {}  # media hash -> ids
 
+        start_time = time.time()
+        self.__client = QdrantClient(path=path) if path else QdrantClient(":memory:")
         self.create(name=self.__name)
 
+        if path:
+            self.__migrate()
+            self.__load_scopes()
+
+            elapsed_time = time.time() - start_time
+            logger.info("[VectorDB]: Loaded %d entries from %s in %.4f seconds", self.count(), path, elapsed_time)
+
     def create(self, name: str) -> None:
         """
         Creates a new collection
@@ -29,58 +66,330 @@ class VectorDB(DBManager):
         if not self.__client.collection_exists(name):
             self.__client.create_collection(
                 collection_name=name,
-                vectors_config=VectorParams(
-                    size=INDEX_DIMENSION, distance=Distance.COSINE
-                ),
+                vectors_config=VectorParams(size=INDEX_DIMENSION, distance=Distance.COSINE),
             )
 
-    def __get_id(self, query: str) -> int:
+    def __migrate(self) -> None:
+        """
+        Upgrades entries written before the media hash was stored in the payload and point id.
+        Their image entries would otherwise match text-only lookups under ids that are never read.
+        The hash is recomputed from the stored media copy; entries whose copy is gone are dropped.
+        """
+
+        # `media_hash` missing altogether, as opposed to null for text-only entries
+        legacy = Filter(
+            must=[IsEmptyCondition(is_empty=PayloadField(key="media_hash"))],
+            must_not=[IsNullCondition(is_null=PayloadField(key="media_hash"))],
+        )
+
+        records, offset = [], None
+        with self.__lock:
+            while True:
+                batch, offset = self.__client.scroll(
+                    collection_name=self.__name,
+                    scroll_filter=legacy,
+                    limit=256,
+                    offset=offset,
+                    with_vectors=True,
+                    with_payload=True,
+                )
+                records.extend(batch)
+
+                if offset is None:
+                    break
+
+        if not records:
+            return
+
+        points, stale = [], []
+        for record in records:
+            media_hash, file_path = None, record.payload["metadata"].get("file_path")
+
+            if file_path:
+                if not os.path.exists(file_path):
+                    stale.append(record.id)
+                    continue
+
+                hasher = hashlib.sha256()
+                with open(file_path, "rb") as media_file:
+                    while chunk := media_file.read(1 << 20):
+                        hasher.update(chunk)
+                media_hash = hasher.hexdigest()
+
+            point_key = self.__get_id(record.payload["query"], media_hash)
+            if point_key != record.id:
+                stale.append(record.id)
+
+            points.append(PointStruct(id=point_key, vector=record.vector, payload={**record.payload, "media_hash": media_hash}))
+
+        with self.__lock:
+            if stale:
+                self.__client.delete(collection_name=self.__name, points_selector=stale)
+            if points:
+                self.__client.upsert(collection_name=self.__name, points=points)
+
+        dropped = len(records) - len(points)
+        logger.warning(
+            "[VectorDB]: Migrated %d entries stored without a media hash, dropped %d whose media file is missing",
+            len(points),
+            dropped,
+        )
+
+    def __load_scopes(self) -> None:
+        """
+        Rebuilds the media hash -> ids index from the stored image entries
+        """
+
+        offset = None
+        with self.__lock:
+            while True:
+                records, offset = self.__client.scroll(
+                    collection_name=self.__name,
+                    scroll_filter=Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key="media_hash"))]),
+                    limit=1024,
+                    offset=offset,
+                    with_payload=["media_hash"],
+                )
+                for record in records:
+                    self.__scope(record.id, record.payload["media_hash"])
+
+                if offset is None:
+                    break
+
+    def __scope(self, _id: int, media_hash: Optional[str]) -> None:
+        """
+        Files `_id` under `media_hash`, text-only entries are not indexed
+        """
+
+        if media_hash:
+            self.__scopes.setdefault(media_hash, set()).add(_id)
+
+    def __unscope(self, _id: int, media_hash: Optional[str]) -> None:
+        """
+        Removes `_id` from the scope of `media_hash`
+        """
+
+        if media_hash and (ids := self.__scopes.get(media_hash)) is not None:
+            ids.discard(_id)
+            if not ids:
+                del self.__scopes[media_hash]
+
+    def __get_id(self, query: str, media_hash: Optional[str] = None) -> int:
         """
         Returns Hashed `id`
         """
 
-        return int(hashlib.md5(query.encode()).hexdigest(), 16) % (10**8)
+        return point_id(query, media_hash)
 
-    def insert(
-        self, key: str, embedding: Tensor, response: str, metadata: Dict
-    ) -> None:
+    def __point(
+        self, key: str, embedding: "Tensor", response: str, metadata: Dict, media_hash: Optional[str] = None
+    ) -> PointStruct:
         """
-        Insert data into the collections
+        Builds the `PointStruct` stored for `key`
         """
 
-        point = PointStruct(
-            id=self.__get_id(key),
-            vector=tensor(embedding).cpu().numpy().tolist(),
-            payload={"query": key, "response": response, "metadata": metadata},
+        return PointStruct(
+            id=self.__get_id(key, media_hash),
+            vector=np.asarray(embedding, dtype=np.float32).tolist(),
+            payload={"query": key, "response": response, "metadata": metadata, "media_hash": media_hash},
         )
 
-        self.__client.upsert(collection_name=self.__name, points=[point])
+    def __text_filter(self) -> Filter:
+        """
+        Restricts a search to text-only entries
+        """
+
+        return Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="media_hash"))])
+
+    def __search_scope(self, embedding: "Tensor", media_hash: str, threshold: float) -> Optional[Dict]:
+        """
+        Exact search over the entries stored for one image, scoring only their vectors
+        """
 
-    def search(self, embedding: Tensor, threshold: float = 0.6) -> Optional[str]:
+        with self.__lock:
+            if not (ids := list(self.__scopes.get(media_hash, ()))):
+                return None
+
+            records = self.__client.retrieve(collection_name=self.__name, ids=ids, with_vectors=True, with_payload=False)
+            if not records:
+                return None
+
+            vectors = np.asarray([record.vector for record in records], dtype=np.float32)
+            query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+            scores = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query) + 1e-12)
+
+            best = int(np.argmax(scores))
+            logger.debug("[VectorDB]: media_hash=%s candidates=%d closest=%s", media_hash, len(records), scores[best])
+            if scores[best] < threshold:
+                return None
+
+            return self.__client.retrieve(collection_name=self.__name, ids=[records[best].id])[0].payload
+
+    def __closest(self, search_result: List[ScoredPoint], threshold: float) -> Optional[Dict]:
         """
-        Search response for given `query`
+        Returns the payload of the best match if it clears `threshold`
         """
 
-        if search_result := self.__client.search(
-            limit=2,
-            collection_name=self.__name,
-            query_vector=tensor(embedding).tolist(),
-        ):
+        if search_result:
             closest = search_result[0]
-            results = [(item.id, item.version, item.score) for item in search_result]
 
-            print(f"[VectorDB]: {results=}")
-            print(f"[VectorDB]: Closest {(closest.id, closest.version, closest.score)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                results = [(item.id, item.version, item.score) for item in search_result]
+                logger.debug("[VectorDB]: results=%s closest=%s", results, (closest.id, closest.version, closest.score))
 
             if closest.score >= threshold:
                 return closest.payload
 
         return None
 
-    def delete(self, query: str) -> None:
+    def insert(
+        self, key: str, embedding: "Tensor", response: str, metadata: Dict, media_hash: Optional[str] = None
+    ) -> None:
+        """
+        Insert data into the collections
+        """
+
+        self.__upsert([self.__point(key, embedding, response, metadata, media_hash)])
+
+    def insert_many(self, entries: List[Dict]) -> None:
+        """
+        Insert several entries with a single upsert
+        """
+
+        if entries:
+            self.__upsert([self.__point(**entry) for entry in entries])
+
+    def search(
+        self, embedding: "Tensor", threshold: float = SIMILARITY_THRESHOLD, media_hash: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Search response for given `query` among entries for the same media (or text-only entries)
+        """
+
+        if media_hash:
+            return self.__search_scope(embedding, media_hash, threshold)
+
+        with self.__lock:
+            search_result = self.__client.search(
+                limit=2,
+                collection_name=self.__name,
+                query_vector=np.asarray(embedding, dtype=np.float32).tolist(),
+                query_filter=self.__text_filter(),
+            )
+
+        return self.__closest(search_result, threshold)
+
+    def search_many(
+        self,
+        embeddings: List["Tensor"],
+        media_hashes: Optional[List[Optional[str]]] = None,
+        threshold: float = SIMILARITY_THRESHOLD,
+    ) -> List[Optional[Dict]]:
+        """
+        Search responses for several embeddings with a single batched request
+        """
+
+        if not embeddings:
+            return []
+
+        media_hashes = media_hashes or [None] * len(embeddings)
+        results: List[Optional[Dict]] = [None] * len(embeddings)
+
+        for index, media_hash in enumerate(media_hashes):
+            if media_hash:
+                results[index] = self.__search_scope(embeddings[index], media_hash, threshold)
+
+        if text := [index for index, media_hash in enumerate(media_hashes) if not media_hash]:
+            requests = [
+                SearchRequest(
+                    vector=np.asarray(embeddings[index], dtype=np.float32).tolist(),
+                    filter=self.__text_filter(),
+                    limit=2,
+                    with_payload=True,
+                )
+                for index in text
+            ]
+            with self.__lock:
+                search_results = self.__client.search_batch(collection_name=self.__name, requests=requests)
+
+            for index, search_result in zip(text, search_results):
+                results[index] = self.__closest(search_result, threshold)
+
+        return results
+
+    def count(self) -> int:
+        """
+        Returns the number of stored entries
+        """
+
+        with self.__lock:
+            return self.__client.count(collection_name=self.__name, exact=True).count
+
+    def points(self, batch_size: int = 256) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every stored entry with its vector and payload
+        """
+
+        offset = None
+        while True:
+            with self.__lock:
+                records, offset = self.__client.scroll(
+                    collection_name=self.__name,
+                    limit=batch_size,
+                    offset=offset,
+                    with_vectors=True,
+                    with_payload=True,
+                )
+
+            for record in records:
+                yield {"id": record.id, "vector": record.vector, "payload": record.payload}
+
+            if offset is None:
+                break
+
+    def import_points(self, points: Iterable[Dict[str, Any]], batch_size: int = 256) -> int:
+        """
+        Upserts entries produced by `points` in batches
+        """
+
+        total, batch = 0, []
+        for point in points:
+            batch.append(PointStruct(id=point["id"], vector=point["vector"], payload=point["payload"]))
+
+            if len(batch) >= batch_size:
+                self.__upsert(batch)
+                total, batch = total + len(batch), []
+
+        if batch:
+            self.__upsert(batch)
+            total += len(batch)
+
+        return total
+
+    def __upsert(self, points: List[PointStruct]) -> None:
+        """
+        Upserts `points` and files image entries under their media hash
+        """
+
+        with self.__lock:
+            self.__client.upsert(collection_name=self.__name, points=points)
+            for point in points:
+                self.__scope(point.id, point.payload.get("media_hash"))
+
+    def close(self) -> None:
+        """
+        Flushes and releases the underlying storage
+        """
+
+        with self.__lock:
+            self.__client.close()
+
+    def delete(self, query: str, media_hash: Optional[str] = None) -> None:
         """
         Deletes an entry from the database.
         """
 
-        _id = self.__get_id(query)
-        self.__client.delete(collection_name=self.__name, points_selector=[_id])
+        _id = self.__get_id(query, media_hash)
+        with self.__lock:
+            self.__client.delete(collection_name=self.__name, points_selector=[_id])
+            self.__unscope(_id, media_hash)
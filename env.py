@@ -6,3 +6,52 @@ load_dotenv()
 
 MOON_DREAM_API_KEY = environ.get("MOON_DREAM_API_KEY")
 MOON_DREAM_MODEL_PATH = environ.get("MOON_DREAM_MODEL_PATH")
+
+# Local NLTK data directory, missing resources are downloaded here once
+NLTK_DATA_DIR = environ.get("NLTK_DATA_DIR", "./nltk_data")
+
+# Persistent semantic cache (Qdrant local storage) and optional warm-start snapshot
+VECTOR_DB_PATH = environ.get("VECTOR_DB_PATH")
+CACHE_SNAPSHOT_PATH = environ.get("CACHE_SNAPSHOT_PATH")
+
+# Semantic cache vector storage (float32, float16, int8) and quantized matches re-ranked with full vectors
+VECTOR_STORAGE = environ.get("VECTOR_STORAGE", "float32")
+VECTOR_RESCORE = int(environ.get("VECTOR_RESCORE", "0"))
+
+# Cache bounds: entry / byte limits, eviction policy (lru, lfu, ttl) and background expiry interval
+CACHE_MAX_ENTRIES = int(environ["CACHE_MAX_ENTRIES"]) if environ.get("CACHE_MAX_ENTRIES") else None
+CACHE_MAX_BYTES = int(environ["CACHE_MAX_BYTES"]) if environ.get("CACHE_MAX_BYTES") else None
+CACHE_EVICTION = environ.get("CACHE_EVICTION", "lru")
+CACHE_SWEEP_INTERVAL = float(environ["CACHE_SWEEP_INTERVAL"]) if environ.get("CACHE_SWEEP_INTERVAL") else None
+
+# Model answering prompts without an image: clip, or ollama for a natively async client
+TEXT_MODEL = environ.get("TEXT_MODEL", "clip")
+
+# Models loaded in the background at startup (comma separated) and idle time before a model is unloaded
+MODEL_PRELOAD = [name.strip() for name in environ.get("MODEL_PRELOAD", "").split(",") if name.strip()]
+MODEL_IDLE_TIMEOUT = float(environ["MODEL_IDLE_TIMEOUT"]) if environ.get("MODEL_IDLE_TIMEOUT") else None
+
+# Annotated detection images (./assets/generated): on/off, format (png, jpg, webp) and compression level
+ANNOTATIONS_ENABLED = environ.get("ANNOTATIONS_ENABLED", "true").lower() not in {"0", "false", "no", "off"}
+ANNOTATION_FORMAT = environ.get("ANNOTATION_FORMAT", "png").lower()
+ANNOTATION_COMPRESSION = int(environ["ANNOTATION_COMPRESSION"]) if environ.get("ANNOTATION_COMPRESSION") else None
+
+# Optional on-disk tier of the OCR cache (JSON per image content hash)
+OCR_CACHE_DIR = environ.get("OCR_CACHE_DIR")
+
+# Split large screenshots into overlapping tiles OCR'd on a process pool
+OCR_TILED = environ.get("OCR_TILED", "false").lower() in {"1", "true", "yes", "on"}
+
+# Optional on-disk tier of the CLIP detection / region embedding cache
+REGION_CACHE_DIR = environ.get("REGION_CACHE_DIR")
+
+# Inference precision per model (fp32, int8, bf16), e.g. "text=int8,clip=bf16,detector=int8"
+INFERENCE_PRECISION = dict(
+    item.strip().partition("=")[::2] for item in environ.get("INFERENCE_PRECISION", "").split(",") if item.strip()
+)
+if unknown := set(INFERENCE_PRECISION) - {"text", "clip", "detector"}:
+    raise ValueError(f"INFERENCE_PRECISION keys must be among ['clip', 'detector', 'text'], got {sorted(unknown)}")
+
+# Log level (DEBUG adds per-request detail and spans) and local port of the Prometheus endpoint
+LOG_LEVEL = environ.get("LOG_LEVEL", "INFO")
+METRICS_PORT = int(environ["METRICS_PORT"]) if environ.get("METRICS_PORT") else None
@@ -1,9 +1,11 @@
 from os import environ
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
+from env import OCR_CACHE_DIR, OCR_TILED
 from manager import time_it
 from service import Interaction
-from utils import ImageProcessor
+from utils import ImageProcessor, OCRCache, TiledOCR
+from utils.logs import configure_logging
 
 
 class ChatInterface:
@@ -13,6 +15,8 @@ class ChatInterface:
 
     def __init__(self) -> None:
         self.__interaction = Interaction()
+        self.__ocr_cache = OCRCache(directory=OCR_CACHE_DIR)
+        self.__tiler = TiledOCR() if OCR_TILED else None
 
     def query(self, prompt: str, **kwargs: Dict) -> str:
         """
@@ -21,12 +25,26 @@ class ChatInterface:
 
         return self.__interaction.call(prompt, **kwargs)
 
+    def query_batch(self, prompts: List[str], extras: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        Query LLMs for a batch of prompts, `extras` holds per-prompt kwargs (e.g. `file_path`)
+        """
+
+        return self.__interaction.call_many(prompts, extras=extras)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns cache hit/miss counters per tier and per-model load statistics
+        """
+
+        return self.__interaction.stats()
+
     def locate(self, text: str, path: str) -> Optional[Dict]:
         """
         Locates UI elements in the image based on the text using `ocr`
         """
 
-        return ImageProcessor(path=path).get_location(text)
+        return ImageProcessor(path=path, ocr_cache=self.__ocr_cache, tiler=self.__tiler).get_location(text)
 
     def new_action(self, action: str, identifier: str, image_path: str) -> Any:
         """
@@ -38,6 +56,16 @@ class ChatInterface:
         else:
             raise NotImplementedError(f"Action {action} is not implemented")
 
+    def close(self) -> None:
+        """
+        Releases background resources
+        """
+
+        if self.__tiler is not None:
+            self.__tiler.close()
+
+        self.__interaction.close()
+
     def __submit_action(self, path: str, identifier: str) -> Dict:
         """ """
 
@@ -49,9 +77,54 @@ class ChatInterface:
         }
 
 
+class AsyncChatInterface:
+    """
+    Asyncio Client Interface
+    """
+
+    def __init__(self) -> None:
+        self.__interaction = Interaction()
+        self.__ocr_cache = OCRCache(directory=OCR_CACHE_DIR)
+        self.__tiler = TiledOCR() if OCR_TILED else None
+
+    async def query(self, prompt: str, **kwargs: Dict) -> str:
+        """
+        Query LLM
+        """
+
+        return await self.__interaction.acall(prompt, **kwargs)
+
+    async def query_batch(self, prompts: List[str], extras: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        Query LLMs for a batch of prompts, `extras` holds per-prompt kwargs (e.g. `file_path`)
+        """
+
+        return await self.__interaction.acall_many(prompts, extras=extras)
+
+    async def locate(self, text: str, path: str) -> Optional[Dict]:
+        """
+        Locates UI elements in the image based on the text using `ocr`
+        """
+
+        return await self.__interaction.offload(
+            lambda: ImageProcessor(path=path, ocr_cache=self.__ocr_cache, tiler=self.__tiler).get_location(text)
+        )
+
+    def close(self) -> None:
+        """
+        Releases background resources
+        """
+
+        if self.__tiler is not None:
+            self.__tiler.close()
+
+        self.__interaction.close()
+
+
 if __name__ == "__main__":
     # Env
     environ["TOKENIZERS_PARALLELISM"] = "FALSE"
+    configure_logging()
 
     interface = ChatInterface()
     file_path = "assets/source.jpg"
@@ -69,3 +142,4 @@ if __name__ == "__main__":
         response_2 = interface.query(query_1, file_path=file_path)
 
     print(f"{response_2=}")
+    print(f"[Cache]: {interface.stats()}")
@@ -1,6 +1,7 @@
 from typing import Union
 
 from manager.context import time_it
+from manager.flight import SingleFlight
 from manager.model import ModelManager
 
-Manager = Union[time_it, ModelManager]
+Manager = Union[time_it, ModelManager, SingleFlight]
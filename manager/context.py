@@ -1,16 +1,23 @@
+import logging
 import time
 from contextlib import contextmanager
 
+from utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
 
 @contextmanager
 def time_it(label: str = "Execution"):
     """
     Context manager to measure the execution time of a block of code.
+    The block is traced as span `label`.
     """
 
-    start_time = time.time()
-    try:
-        yield
-    finally:
-        elapsed_time = time.time() - start_time
-        print(f"[{label}]: Time Taken: {elapsed_time:.4f} seconds")
+    start_time = time.perf_counter()
+    with span(label):
+        try:
+            yield
+        finally:
+            elapsed_time = time.perf_counter() - start_time
+            logger.info("[%s]: Time Taken: %.4f seconds", label, elapsed_time)
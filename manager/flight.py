@@ -0,0 +1,153 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+
+class Flight:
+    """
+    A single in-flight execution that concurrent callers can wait on
+    """
+
+    def __init__(self, embedding: Optional[np.ndarray] = None, scope: Optional[str] = None) -> None:
+        self.scope: Optional[str] = scope
+        self.embedding: Optional[np.ndarray] = embedding
+
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+        self.event = threading.Event()
+        self.future: Optional[asyncio.Future] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one execution whose result is shared.
+    With a `threshold`, calls whose embedding is at least that similar to an in-flight call
+    within the same `scope` (e.g. the same image) wait on it as well.
+    """
+
+    def __init__(self, threshold: Optional[float] = None) -> None:
+        self.__threshold: Optional[float] = threshold
+
+        self.__lock = threading.Lock()
+        self.__flights: Dict[str, Flight] = {}
+
+    def __normalize(self, embedding: Any) -> Optional[np.ndarray]:
+        """
+        Returns a unit-length float32 copy of `embedding`
+        """
+
+        if embedding is None or self.__threshold is None:
+            return None
+
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+
+        return vector / norm if norm else None
+
+    def __join(self, key: str, embedding: Optional[np.ndarray], scope: Optional[str]) -> Tuple[Flight, bool]:
+        """
+        Returns the flight to wait on for `key` and whether the caller leads it. Must hold the lock.
+        """
+
+        if flight := self.__flights.get(key):
+            return flight, False
+
+        if embedding is not None:
+            for flight in self.__flights.values():
+                if (
+                    flight.scope == scope
+                    and flight.embedding is not None
+                    and float(flight.embedding @ embedding) >= self.__threshold
+                ):
+                    return flight, False
+
+        flight = Flight(embedding=embedding, scope=scope)
+        self.__flights[key] = flight
+
+        return flight, True
+
+    def __land(self, key: str, flight: Flight) -> None:
+        """
+        Removes `flight` so later callers start a fresh execution
+        """
+
+        with self.__lock:
+            if self.__flights.get(key) is flight:
+                del self.__flights[key]
+
+    def do(
+        self,
+        key: str,
+        function: Callable[[], Any],
+        embedding: Any = None,
+        scope: Optional[str] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Runs `function` unless an equivalent call is already in flight.
+        Returns `(result, shared)` where `shared` is True when another caller's result was reused.
+        """
+
+        with self.__lock:
+            flight, leader = self.__join(key, self.__normalize(embedding), scope)
+
+        if not leader:
+            flight.event.wait()
+            if flight.error:
+                raise flight.error
+
+            return flight.result, True
+
+        try:
+            flight.result = function()
+        except BaseException as exception:
+            flight.error = exception
+            raise
+        finally:
+            self.__land(key, flight)
+            flight.event.set()
+
+        return flight.result, False
+
+    async def ado(
+        self,
+        key: str,
+        function: Callable[[], Awaitable[Any]],
+        embedding: Any = None,
+        scope: Optional[str] = None,
+    ) -> Tuple[Any, bool]:
+        """
+        Async variant of `do`: awaits `function()` unless an equivalent call is already in flight
+        """
+
+        with self.__lock:
+            flight, leader = self.__join(key, self.__normalize(embedding), scope)
+            if leader:
+                flight.future = asyncio.get_running_loop().create_future()
+
+        if not leader:
+            loop = asyncio.get_running_loop()
+            if flight.future is None or flight.future.get_loop() is not loop:
+                # Led by a thread or from another event loop, wait for it without blocking this loop
+                await loop.run_in_executor(None, flight.event.wait)
+            else:
+                await asyncio.shield(flight.future)
+
+            if flight.error:
+                raise flight.error
+
+            return flight.result, True
+
+        try:
+            flight.result = await function()
+        except BaseException as exception:
+            flight.error = exception
+            raise
+        finally:
+            self.__land(key, flight)
+            flight.event.set()
+            flight.future.set_result(None)
+
+        return flight.result, False
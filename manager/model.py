@@ -1,27 +1,188 @@
-from typing import Dict
+import gc
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Optional
 
-from env import MOON_DREAM_API_KEY
-from models import Clip, Models, MoonDream, Ollama
+import models
+from env import INFERENCE_PRECISION, MOON_DREAM_API_KEY
+from utils.metrics import REGISTRY, span
+
+from .process import rss
+
+logger = logging.getLogger(__name__)
+
+LOADED = REGISTRY.gauge("llm_cache_models_loaded", "Whether a model is in memory", ["model"])
+
+if TYPE_CHECKING:
+    from models import Models
+
+# Model classes are resolved when the factory runs, so their dependencies load with the model
+FACTORIES: Dict[str, Callable[[], "Models"]] = {
+    "clip": lambda: models.Clip(
+        clip_precision=INFERENCE_PRECISION.get("clip", "fp32"),
+        detector_precision=INFERENCE_PRECISION.get("detector", "fp32"),
+    ),
+    "ollama": lambda: models.Ollama(),
+    "moon_dream": lambda: models.MoonDream(key=MOON_DREAM_API_KEY),
+}
 
 
 class ModelManager:
     """
-    Centralized manager for handling models. Dynamically loads and initializes models.
+    Centralized manager for handling models.
+
+    Models are built from a registry of factories the first time they are requested. Names in
+    `preload` are loaded on a background thread at startup, and with `idle_timeout` a reaper thread
+    unloads models that have not been requested for that many seconds (they reload on next use).
+    Calls already holding a model keep it alive until they finish.
     """
 
-    def __init__(self) -> None:
-        self.__models: Dict[str, Models] = {
-            "clip": Clip(),
-            "ollama": Ollama(),
-            "moon_dream": MoonDream(key=MOON_DREAM_API_KEY),
-        }
+    def __init__(
+        self,
+        factories: Optional[Dict[str, Callable[[], "Models"]]] = None,
+        preload: Iterable[str] = (),
+        idle_timeout: Optional[float] = None,
+    ) -> None:
+        self.__factories: Dict[str, Callable[[], "Models"]] = dict(FACTORIES if factories is None else factories)
+        self.__models: Dict[str, "Models"] = {}
+        self.__last_used: Dict[str, float] = {}
+        self.__stats: Dict[str, Dict[str, float]] = {}
+
+        self.__lock = threading.Lock()
+        self.__locks: Dict[str, threading.Lock] = {}
+        self.__idle_timeout: Optional[float] = idle_timeout
+        self.__stop = threading.Event()
 
-    def model(self, name: str) -> Models:
+        if preload := [name for name in preload if name]:
+            threading.Thread(target=self.preload, args=(preload,), name="model-preload", daemon=True).start()
+
+        if idle_timeout:
+            threading.Thread(target=self.__reap_loop, name="model-reaper", daemon=True).start()
+
+    def __model_lock(self, name: str) -> threading.Lock:
+        """
+        Returns the lock serializing loads of model `name`
+        """
+
+        with self.__lock:
+            return self.__locks.setdefault(name, threading.Lock())
+
+    def __load(self, name: str) -> "Models":
         """
-        Get the requested model by name.
+        Builds model `name`, recording its load time and the resident memory it added
         """
 
-        if name not in self.__models:
+        with self.__model_lock(name):
+            if (model := self.__models.get(name)) is not None:
+                return model
+
+            start_time, start_rss = time.time(), rss()
+            with span("model.load", model=name):
+                model = self.__factories[name]()
+            elapsed_time = time.time() - start_time
+
+            stats = self.__stats.setdefault(name, {"loads": 0, "unloads": 0})
+            stats.update(load_time=elapsed_time, rss=max(0, rss() - start_rss))
+            stats["loads"] += 1
+
+            self.__models[name] = model
+            LOADED.set(1, model=name)
+            logger.info("[ModelManager]: Loaded %s in %.4f seconds", name, elapsed_time)
+
+            return model
+
+    def __reap_loop(self) -> None:
+        """
+        Background loop unloading idle models
+        """
+
+        while not self.__stop.wait(max(1.0, self.__idle_timeout / 2)):
+            self.unload_idle()
+
+    def register(self, name: str, factory: Callable[[], "Models"]) -> None:
+        """
+        Registers (or replaces) the factory for model `name`. A loaded model is unloaded.
+        """
+
+        self.unload(name)
+        self.__factories[name] = factory
+
+    def model(self, name: str) -> "Models":
+        """
+        Get the requested model by name, loading it on first use.
+        """
+
+        if name not in self.__factories:
             raise KeyError(f"Model '{name}' does not exist.")
 
-        return self.__models[name]
+        self.__last_used[name] = time.time()
+        if (model := self.__models.get(name)) is not None:
+            return model
+
+        return self.__load(name)
+
+    def preload(self, names: Iterable[str]) -> None:
+        """
+        Loads `names` ahead of their first request
+        """
+
+        for name in names:
+            try:
+                self.model(name)
+            except Exception as exception:
+                logger.warning("[ModelManager]: Failed to preload %s: %s", name, exception)
+
+    def loaded(self, name: str) -> bool:
+        """
+        Whether model `name` is currently in memory
+        """
+
+        return name in self.__models
+
+    def unload(self, name: str) -> bool:
+        """
+        Drops model `name` so its memory can be reclaimed; returns whether it was loaded
+        """
+
+        with self.__model_lock(name):
+            if self.__models.pop(name, None) is None:
+                return False
+
+            self.__stats[name]["unloads"] += 1
+            LOADED.set(0, model=name)
+
+        gc.collect()
+        logger.info("[ModelManager]: Unloaded %s", name)
+
+        return True
+
+    def unload_idle(self) -> int:
+        """
+        Unloads every model not requested within `idle_timeout`; returns how many were unloaded
+        """
+
+        if not self.__idle_timeout:
+            return 0
+
+        now = time.time()
+        idle = [name for name in list(self.__models) if now - self.__last_used.get(name, 0) > self.__idle_timeout]
+
+        return sum(self.unload(name) for name in idle)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns per-model load counters, last load time (seconds) and resident memory added (bytes)
+        """
+
+        return {
+            name: {"loaded": name in self.__models, **self.__stats.get(name, {"loads": 0, "unloads": 0})}
+            for name in self.__factories
+        }
+
+    def close(self) -> None:
+        """
+        Stops the reaper thread
+        """
+
+        self.__stop.set()
@@ -1,8 +1,24 @@
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
-from models.abstract import BaseLLM
-from models.clip import Clip
-from models.moon_dream import MoonDream
-from models.ollama import Ollama
+from utils.lazy import lazy_exports
 
-Models = Union[Ollama, Clip, MoonDream, BaseLLM]
+if TYPE_CHECKING:
+    from models.abstract import AsyncLLM, BaseLLM
+    from models.clip import Clip
+    from models.moon_dream import MoonDream
+    from models.ollama import Ollama
+
+    Models = Union[Ollama, Clip, MoonDream, BaseLLM, AsyncLLM]
+
+# torch / clip / moondream / ollama load with the model that needs them, not with the package
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        "AsyncLLM": "models.abstract",
+        "BaseLLM": "models.abstract",
+        "Clip": "models.clip",
+        "MoonDream": "models.moon_dream",
+        "Ollama": "models.ollama",
+    },
+    {"Models": ("Ollama", "Clip", "MoonDream", "BaseLLM", "AsyncLLM")},
+)
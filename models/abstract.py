@@ -10,3 +10,13 @@ class BaseLLM(metaclass=ABCMeta):
     @abstractmethod
     def execute(self, prompt: str, **kwargs: Dict[str, Any]) -> Any:
         raise NotImplementedError
+
+
+class AsyncLLM(metaclass=ABCMeta):
+    """
+    Base Class For LLMs exposing a native async client
+    """
+
+    @abstractmethod
+    async def aexecute(self, prompt: str, **kwargs: Dict[str, Any]) -> Any:
+        raise NotImplementedError
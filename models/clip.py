@@ -1,4 +1,5 @@
-from typing import Dict, List, Tuple
+import logging
+from typing import Dict, List, Optional, Tuple, Union
 
 import clip
 import torch
@@ -6,8 +7,19 @@ from PIL import Image
 from torchvision.models.detection import fasterrcnn_resnet50_fpn
 from torchvision.transforms import Compose, Normalize, Resize, ToTensor
 
+from constants import CLIP_BATCH_SIZE, CLIP_TEXT_CACHE_CAPACITY, REGION_CACHE_BYTES
+from env import REGION_CACHE_DIR
 from models import BaseLLM
-from utils import ImageProcessor
+from utils import ImageHandle, ImageProcessor, LRUCache, OCRCache, RegionCache
+from utils.precision import autocast, quantize, resolve
+from utils.regions import boxes_digest
+
+logger = logging.getLogger(__name__)
+
+CLIP_MODEL = "ViT-L/14"
+
+# Part of the region cache keys, change it whenever the detector or its input transform changes
+DETECTOR = "fasterrcnn_resnet50_fpn:224"
 
 
 class Clip(BaseLLM):
@@ -15,26 +27,59 @@ class Clip(BaseLLM):
     Clip Interface
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        batch_size: int = CLIP_BATCH_SIZE,
+        text_cache_capacity: int = CLIP_TEXT_CACHE_CAPACITY,
+        region_cache_bytes: int = REGION_CACHE_BYTES,
+        region_cache_dir: Optional[str] = REGION_CACHE_DIR,
+        clip_precision: str = "fp32",
+        detector_precision: str = "fp32",
+    ) -> None:
         self.__device: str = "cpu"
+        self.__batch_size: int = batch_size
+        # Normalized label embeddings, labels repeat across searches
+        self.__text_embeddings = LRUCache(capacity=text_cache_capacity)
+        # Detections and region embeddings per image, questions about one screenshot reuse them
+        self.__regions = RegionCache(max_bytes=region_cache_bytes, directory=region_cache_dir)
+
         # [ViT-B/16, ViT-B/32, ViT-L/14]
-        self.__model, self.__preprocessor = clip.load("ViT-L/14", device=self.__device)
+        self.__model, self.__preprocessor = clip.load(CLIP_MODEL, device=self.__device)
         self.__detection_model = fasterrcnn_resnet50_fpn(weights=True).to(self.__device)
 
+        self.__model.eval()
         self.__detection_model.eval()
 
+        # Precision is part of the region cache keys, results differ slightly between precisions
+        self.__clip_precision: str = resolve(clip_precision)
+        self.__detector_precision: str = resolve(detector_precision)
+        self.__model = quantize(self.__model, self.__clip_precision)
+        self.__detection_model = quantize(self.__detection_model, self.__detector_precision)
+
         self.__image_processor = ImageProcessor
+        self.__ocr_cache = OCRCache()
 
-    def execute(self, file_path: str, threshold: float = 0.5) -> Tuple:
-        """ """
+    def execute(self, file_path: Union[str, ImageHandle], threshold: float = 0.5) -> Tuple:
+        """
+        Runs the detector (or reuses its cached output for this image) and keeps boxes above `threshold`
+        """
 
-        # transform = Compose([ToTensor()])
-        transform = Compose([Resize((224, 224)), ToTensor(), Normalize((0.5,), (0.5,))])
-        image = Image.open(file_path).convert("RGB")
-        source_image = transform(image).unsqueeze(0).to(self.__device)
+        handle = ImageHandle.of(file_path)
+        image = handle.pil.convert("RGB")
+        key = f"{handle.hash}:{DETECTOR}:{self.__detector_precision}"
 
-        with torch.no_grad():
-            detections = self.__detection_model(source_image)[0]
+        if (cached := self.__regions.get(key)) is not None:
+            detections = {name: torch.from_numpy(array) for name, array in cached.items()}
+        else:
+            # transform = Compose([ToTensor()])
+            transform = Compose([Resize((224, 224)), ToTensor(), Normalize((0.5,), (0.5,))])
+            source_image = transform(image).unsqueeze(0).to(self.__device)
+
+            with torch.no_grad(), autocast(self.__detector_precision):
+                detections = self.__detection_model(source_image)[0]
+
+            detections = {name: tensor if name == "labels" else tensor.float() for name, tensor in detections.items()}
+            self.__regions.set(key, {name: tensor.cpu().numpy() for name, tensor in detections.items()})
 
         boxes = detections["boxes"][detections["scores"] > threshold]
         labels = detections["labels"][detections["scores"] > threshold]
@@ -55,10 +100,11 @@ class Clip(BaseLLM):
         """
 
         labels = []
-        image_data = self.__image_processor(image=image).ocr()
+        image_data = self.__image_processor(image=image, ocr_cache=self.__ocr_cache).ocr_index()
 
-        print(f"OCR Data: {image_data}")
-        print(f"Bounding Boxes: {boxes.tolist()}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[Clip]: OCR Data: %s", image_data.elements)
+            logger.debug("[Clip]: Bounding Boxes: %s", boxes.tolist())
 
         width, height = image.size
 
@@ -67,59 +113,79 @@ class Clip(BaseLLM):
         scaled_boxes[:, [1, 3]] *= height
 
         for box in scaled_boxes:
-            text: List[str] = []
             x_min, y_min, x_max, y_max = map(int, box.tolist())
-
-            for data in image_data:
-                x, y = data["x"], data["y"]
-                width, height = data["width"], data["height"]
-                x_end, y_end = x + width, y + height
-
-                if (
-                    (x_min <= x <= x_max and y_min <= y <= y_max)
-                    or (x_min <= x_end <= x_max and y_min <= y_end <= y_max)
-                    or (x <= x_min <= x_end and y <= y_min <= y_end)
-                    or (x <= x_max <= x_end and y <= y_max <= y_end)
-                ) and data["text"].strip():
-                    text.append(data["text"].strip())
+            text: List[str] = [
+                data["text"].strip()
+                for data in image_data.within((x_min, y_min, x_max, y_max))
+                if data["text"].strip()
+            ]
 
             if text:
                 labels.append(" ".join(text))
 
         return labels
 
-    def embedding(self, image: Image.Image, boxes: torch.Tensor) -> torch.Tensor:
-        """ """
+    def embedding(
+        self, image: Image.Image, boxes: torch.Tensor, image_hash: Optional[str] = None
+    ) -> torch.Tensor:
+        """
+        Encodes every box region of `image`, `batch_size` crops per forward pass.
+        With `image_hash`, the region matrix is cached for this image and set of boxes.
+        """
+
+        key = (
+            f"{image_hash}:{CLIP_MODEL}:{self.__clip_precision}:{boxes_digest(boxes.float().cpu().numpy())}"
+            if image_hash
+            else None
+        )
+        if key and (cached := self.__regions.get(key)) is not None:
+            return torch.from_numpy(cached["embeddings"]).to(self.__device)
 
-        embeddings: List = []
+        crops = []
         for box in boxes:
             box = box.int().cpu().numpy()
             region = image.crop((box[0], box[1], box[2], box[3]))
-            tensor = self.__preprocessor(region).unsqueeze(0).to(self.__device)
+            crops.append(self.__preprocessor(region))
 
-            with torch.no_grad():
-                embedding = self.__model.encode_image(tensor)
+        if not crops:
+            return torch.empty((0, self.__model.visual.output_dim), device=self.__device)
 
-            embeddings.append(embedding)
+        embeddings: List[torch.Tensor] = []
+        with torch.no_grad(), autocast(self.__clip_precision):
+            for start in range(0, len(crops), self.__batch_size):
+                batch = torch.stack(crops[start : start + self.__batch_size]).to(self.__device)
+                embeddings.append(self.__model.encode_image(batch).float())
 
-        return torch.cat(embeddings, dim=0)
+        embeddings = torch.cat(embeddings, dim=0)
+        if key:
+            self.__regions.set(key, {"embeddings": embeddings.cpu().numpy()})
+
+        return embeddings
+
+    def text_embedding(self, label: str) -> torch.Tensor:
+        """
+        Returns the L2-normalized embedding of `label` (memoized)
+        """
+
+        if (cached := self.__text_embeddings.get(label)) is not None:
+            return cached
+
+        with torch.no_grad(), autocast(self.__clip_precision):
+            embedding = self.__model.encode_text(clip.tokenize(label).to(self.__device)).float()
+            embedding = torch.nn.functional.normalize(embedding, p=2, dim=-1)
+
+        self.__text_embeddings.set(label, embedding)
+        return embedding
 
     def search(self, label: str, regions: torch.Tensor) -> int:
-        """ """
+        """
+        Returns the index of the region closest to `label`
+        """
 
         with torch.no_grad():
             normalized_regions = torch.nn.functional.normalize(regions, p=2, dim=-1)
-            label_embedding = self.__model.encode_text(
-                clip.tokenize(label).to(self.__device)
-            )
-            normalized_label_embedding = torch.nn.functional.normalize(
-                label_embedding, p=2, dim=-1
-            )
+            normalized_label_embedding = self.text_embedding(label)
 
-            # embedding = self.__model.encode_text(clip.tokenize(label).to(self.__device))
-            # normalized_embedding = torch.nn.functional.normalize(embedding, p=2, dim=-1)
-
-        # similarities = torch.nn.functional.cosine_similarity(normalized_embedding, regions)
         similarities = torch.nn.functional.cosine_similarity(
             normalized_label_embedding, normalized_regions
         )
@@ -127,3 +193,27 @@ class Clip(BaseLLM):
         # print(f"[Clip]: similarity % {similarities[closest_match_index].item()}")
 
         return closest_match_index
+
+    def locate(
+        self, file_path: Union[str, ImageHandle], label: str, threshold: float = 0.5
+    ) -> Optional[List[float]]:
+        """
+        Returns the detected box that best matches `label`. Once an image has been seen, this costs
+        one text encode (none for a repeated label) and a cosine over the cached region matrix.
+        """
+
+        handle = ImageHandle.of(file_path)
+        _, image, boxes, _ = self.execute(handle, threshold=threshold)
+
+        if not len(boxes):
+            return None
+
+        regions = self.embedding(image, boxes, image_hash=handle.hash)
+        return boxes[self.search(label, regions)].tolist()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns region cache counters
+        """
+
+        return self.__regions.stats()
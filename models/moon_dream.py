@@ -1,10 +1,29 @@
-from typing import Any, Dict, List, Optional
+import sys
+from typing import Any, Dict, List, Optional, Union
 
 import moondream as md
 from moondream.types import EncodedImage
-from PIL import Image, ImageFile
 
+from constants import ENCODED_IMAGE_CACHE_BYTES, ENCODED_IMAGE_CACHE_CAPACITY
 from models import BaseLLM
+from utils import ImageHandle, LRUCache
+
+
+def encoded_size(encoded: EncodedImage) -> int:
+    """
+    Estimates the memory held by `encoded` (arrays / tensors by `nbytes`, strings by length)
+    """
+
+    size = 0
+    for value in getattr(encoded, "__dict__", {}).values() or [encoded]:
+        if (nbytes := getattr(value, "nbytes", None)) is not None:
+            size += int(nbytes)
+        elif isinstance(value, (str, bytes)):
+            size += len(value)
+        else:
+            size += sys.getsizeof(value)
+
+    return size
 
 
 class MoonDream(BaseLLM):
@@ -12,7 +31,17 @@ class MoonDream(BaseLLM):
     MoonDream Interface
     """
 
-    def __init__(self, path: Optional[str] = None, key: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        key: Optional[str] = None,
+        cache_capacity: int = ENCODED_IMAGE_CACHE_CAPACITY,
+        cache_bytes: Optional[int] = ENCODED_IMAGE_CACHE_BYTES,
+    ) -> None:
+        # Encoded images by content hash, so prompts about the same image skip the vision encoder
+        self.__encoded = LRUCache(capacity=cache_capacity, max_bytes=cache_bytes, size_of=encoded_size)
+        self.__stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
         if path:
             self.__model = md.vl(model=path)
 
@@ -22,15 +51,31 @@ class MoonDream(BaseLLM):
         else:
             raise ValueError("One of the `path` or `key` is required")
 
-    def __encoded_image(self, path: str) -> EncodedImage:
+    def __encoded_image(self, path: Union[str, ImageHandle]) -> EncodedImage:
         """
         Returns `EncodedImage`
         """
 
-        image: ImageFile = Image.open(path)
-        return self.__model.encode_image(image)
+        image = ImageHandle.of(path)
+
+        if (encoded := self.__encoded.get(image.hash)) is not None:
+            self.__stats["hits"] += 1
+            return encoded
+
+        self.__stats["misses"] += 1
+        encoded = self.__model.encode_image(image.pil)
+        self.__encoded.set(image.hash, encoded)
+
+        return encoded
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns encoded image cache counters
+        """
+
+        return {**self.__stats, "entries": len(self.__encoded), "bytes": self.__encoded.bytes}
 
-    def detect(self, file_path: str, identifier: str) -> List[Dict[str, float]]:
+    def detect(self, file_path: Union[str, ImageHandle], identifier: str) -> List[Dict[str, float]]:
         """
         Returns box coords corresponding to given `identifier`
         """
@@ -45,10 +90,10 @@ class MoonDream(BaseLLM):
         Query on the `image` file
         """
 
-        path = kwargs.get("file_path")
+        path = kwargs.get("image") or kwargs.get("file_path")
 
         if not path:
-            raise ValueError("Please provide `file_path` of the image")
+            raise ValueError("Please provide `file_path` (or an `ImageHandle` as `image`) of the image")
 
         image = self.__encoded_image(path)
         response = self.__model.query(image=image, question=prompt)
@@ -1,29 +1,67 @@
-from typing import List
+import threading
+from typing import Dict, List
 
-from ollama import ChatResponse, chat
+from ollama import AsyncClient, ChatResponse, chat
 
-from .abstract import BaseLLM
+from .abstract import AsyncLLM, BaseLLM
 
 
-class Ollama(BaseLLM):
+class Ollama(BaseLLM, AsyncLLM):
     """
     Ollama Interface
     """
 
     def __init__(self, model_name: str = "mistral") -> None:
-        self.__messages: List[str] = []
+        self.__lock = threading.Lock()
+        self.__messages: List[Dict[str, str]] = []
         self.__model_name: str = model_name
+        self.__async_client = AsyncClient()
 
     def execute(self, prompt: str) -> str:
         """
         Execute The Prompt
         """
 
-        content = prompt.strip().replace("\n\n", "\n")
+        message = self.__message(prompt)
+        response: ChatResponse = chat(model=self.__model_name, messages=self.__history(message))
 
-        self.__messages.append({"role": "user", "content": content})
-        response: ChatResponse = chat(model=self.__model_name, messages=self.__messages)
+        return self.__reply(message, response)
 
-        response: str = response.message.content.strip()
-        self.__messages.append({"role": "assistant", "content": response})
-        return response
+    async def aexecute(self, prompt: str) -> str:
+        """
+        Execute The Prompt without blocking the event loop
+        """
+
+        message = self.__message(prompt)
+        response: ChatResponse = await self.__async_client.chat(
+            model=self.__model_name, messages=self.__history(message)
+        )
+
+        return self.__reply(message, response)
+
+    def __message(self, prompt: str) -> Dict[str, str]:
+        """
+        Builds the user message, normalizing the prompt before sending it
+        """
+
+        return {"role": "user", "content": prompt.strip().replace("\n\n", "\n")}
+
+    def __history(self, message: Dict[str, str]) -> List[Dict[str, str]]:
+        """
+        Returns this request's messages: the conversation so far followed by `message`
+        """
+
+        with self.__lock:
+            return [*self.__messages, message]
+
+    def __reply(self, message: Dict[str, str], response: ChatResponse) -> str:
+        """
+        Records the prompt and the assistant reply together in the conversation and returns the reply.
+        Concurrent requests each append their own pair, so turns never interleave.
+        """
+
+        reply: str = response.message.content.strip()
+        with self.__lock:
+            self.__messages.extend([message, {"role": "assistant", "content": reply}])
+
+        return reply
@@ -1,9 +1,52 @@
-from typing import Any, Dict, Optional, Tuple
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Type
+from weakref import WeakKeyDictionary
 
 from cache import Cache
-from database import MediaStorage, VectorDB
-from manager import ModelManager
-from utils import BoxUtility, ImageProcessor, TextProcessor
+from constants import EXECUTOR_WORKERS, MODEL_CONCURRENCY, SIMILARITY_THRESHOLD
+from database import DBManager, MediaStorage, NumpyVectorDB
+from env import (
+    ANNOTATION_COMPRESSION,
+    ANNOTATION_FORMAT,
+    ANNOTATIONS_ENABLED,
+    CACHE_EVICTION,
+    CACHE_MAX_BYTES,
+    CACHE_MAX_ENTRIES,
+    CACHE_SNAPSHOT_PATH,
+    CACHE_SWEEP_INTERVAL,
+    INFERENCE_PRECISION,
+    METRICS_PORT,
+    MODEL_IDLE_TIMEOUT,
+    MODEL_PRELOAD,
+    TEXT_MODEL,
+    VECTOR_DB_PATH,
+    VECTOR_RESCORE,
+    VECTOR_STORAGE,
+)
+from manager import ModelManager, SingleFlight
+from models import AsyncLLM
+from utils import (
+    BoxUtility,
+    EmbeddingContext,
+    ImageHandle,
+    ImageProcessor,
+    ImageWriter,
+    TextProcessor,
+)
+from utils.exporter import release_metrics, serve_metrics
+from utils.metrics import REGISTRY, Span, span
+
+if TYPE_CHECKING:
+    from models import Models
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = REGISTRY.counter("llm_cache_requests_total", "Requests by entry point and result", ["path", "result"])
 
 
 class Interaction:
@@ -11,64 +54,417 @@ class Interaction:
     Service layer to interact with LLMs
     """
 
-    def __init__(self) -> None:
-        self.__manager = ModelManager()
-        self.__db = VectorDB(name="cache")
+    def __init__(
+        self,
+        executor_workers: int = EXECUTOR_WORKERS,
+        concurrency: Optional[Dict[str, int]] = None,
+        coalesce_similar: bool = False,
+        vector_db_path: Optional[str] = VECTOR_DB_PATH,
+        snapshot_path: Optional[str] = CACHE_SNAPSHOT_PATH,
+        vector_db: Optional[DBManager] = None,
+        cache_options: Optional[Dict[str, Any]] = None,
+        annotate: bool = ANNOTATIONS_ENABLED,
+        model_factories: Optional[Dict[str, Callable[[], "Models"]]] = None,
+        text_processor: Optional[TextProcessor] = None,
+        media_storage: Optional[MediaStorage] = None,
+        image_processor: Type[ImageProcessor] = ImageProcessor,
+        metrics_port: Optional[int] = METRICS_PORT,
+        text_model: str = TEXT_MODEL,
+    ) -> None:
+        """
+        `vector_db` selects the semantic cache backend (e.g. `FaissVectorDB`),
+        defaulting to Qdrant (`VectorDB`) stored at `vector_db_path`, or to `NumpyVectorDB` when
+        `VECTOR_STORAGE` compresses the vectors.
+        `cache_options` overrides `Cache` settings such as `max_entries` or `eviction`.
+        `annotate` saves detections drawn on the image to `./assets/generated` in the background.
+        `model_factories`, `text_processor`, `media_storage` and `image_processor` replace the default
+        components (e.g. with local stand-ins for benchmarks).
+        `text_model` answers prompts without an image (`ollama` is called through its async client by `acall`).
+        `metrics_port` serves Prometheus metrics and recent traces on localhost (see `serve_metrics`).
+        """
+
+        self.__manager = ModelManager(
+            factories=model_factories, preload=MODEL_PRELOAD, idle_timeout=MODEL_IDLE_TIMEOUT
+        )
+
+        if vector_db is None and VECTOR_STORAGE != "float32":
+            # Qdrant's local mode always keeps float32 vectors, compressed storage is NumPy's
+            if vector_db_path:
+                os.makedirs(vector_db_path, exist_ok=True)
+
+            vector_db = NumpyVectorDB(
+                name="cache",
+                path=os.path.join(vector_db_path, f"cache.{VECTOR_STORAGE}") if vector_db_path else None,
+                storage=VECTOR_STORAGE,
+                rescore=VECTOR_RESCORE,
+            )
+        elif vector_db is None:
+            # Qdrant's client loads only when it is the selected backend
+            from database import VectorDB
+
+            vector_db = VectorDB(name="cache", path=vector_db_path)
+
+        self.__db = vector_db
+
+        self.__text_model: str = text_model
 
         self.__box_utils = BoxUtility()
-        self.__image_processor = ImageProcessor
-        self.__text_processor = TextProcessor()
-        self.__media_storage = MediaStorage(storage_dir="./assets")
+        self.__image_processor = image_processor
+        self.__writer: Optional[ImageWriter] = ImageWriter() if annotate else None
+        self.__text_processor = text_processor or TextProcessor(precision=INFERENCE_PRECISION.get("text", "fp32"))
+        self.__media_storage = media_storage or MediaStorage(storage_dir="./assets")
 
         self.__cache = Cache(
             vector_db=self.__db,
             media_storage=self.__media_storage,
             text_processor=self.__text_processor,
+            **{
+                "max_entries": CACHE_MAX_ENTRIES,
+                "max_bytes": CACHE_MAX_BYTES,
+                "eviction": CACHE_EVICTION,
+                "sweep_interval": CACHE_SWEEP_INTERVAL,
+                **(cache_options or {}),
+            },
+        )
+
+        if vector_db_path:
+            self.__cache.reconcile()
+            self.__cache.reindex()
+
+        if snapshot_path and not self.__db.count():
+            self.__cache.import_snapshot(snapshot_path)
+
+        # Async path: blocking work runs on a bounded pool, model calls are capped per model
+        self.__executor = ThreadPoolExecutor(
+            max_workers=executor_workers, thread_name_prefix="interaction"
         )
+        self.__concurrency: Dict[str, int] = {**MODEL_CONCURRENCY, **(concurrency or {})}
+        self.__semaphores: WeakKeyDictionary = WeakKeyDictionary()
+
+        # Concurrent misses for the same key (or, optionally, a near-identical prompt) share one model call
+        self.__coalesce_similar: bool = coalesce_similar
+        self.__flights = SingleFlight(threshold=SIMILARITY_THRESHOLD if coalesce_similar else None)
+
+        # Shared by every instance in the process, like the metrics registry
+        self.__metrics_port: Optional[int] = metrics_port
+        if metrics_port is not None:
+            serve_metrics(metrics_port)
 
     def call(self, query: str, **kwargs: Dict) -> Tuple[str, Optional[str]]:
         """
         Interact with LLM
         """
 
-        cached, media_files = self.__cache.get(query, **kwargs)
-        if cached:
-            print(f"[CacheHit]: {query}")
-            return cached, media_files
+        with span("interaction.call") as request:
+            context = self.__cache.context(query)
 
-        print(f"[CacheMiss]: {query}")
+            cached, media_files = self.__cache.get(query, context=context, **kwargs)
+            if cached:
+                self.__record(request, query, "hit")
+                return cached, media_files
 
-        if file_path := kwargs.get("file_path"):
-            response = self.__handle_request(query, file_path)
-        else:
-            model = self.__manager.model("clip")
-            response = model.execute(query)
+            response, shared = self.__flights.do(
+                context.key,
+                partial(self.__miss, query, context, **kwargs),
+                **self.__similarity(context),
+            )
 
-        self.__cache.set(query, response, **kwargs)
+            self.__record(request, query, "coalesced" if shared else "miss")
+            return response, None
 
-        return response, None
+    def call_many(
+        self, queries: List[str], extras: Optional[List[Dict]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Interact with LLMs for a batch of queries.
 
-    def __handle_request(self, prompt: str, file_path: str) -> Any:
+        Prompts are encoded and searched in one batch, only the misses are sent to the models
+        (grouped by model) and new responses are written with one bulk upsert. Results come back
+        in input order as `{"query", "response", "media", "hit"}` dicts.
+        """
+
+        extras = extras or [{} for _ in queries]
+        if len(extras) != len(queries):
+            raise ValueError("`extras` must have one entry per query")
+
+        with span("interaction.call_many", queries=len(queries)):
+            contexts = [self.__cache.context(query) for query in queries]
+            cached = self.__cache.get_many(queries, contexts=contexts, extras=extras)
+
+            results: List[Dict[str, Any]] = []
+            groups: Dict[str, List[int]] = {}
+
+            for index, (query, (response, media_files)) in enumerate(zip(queries, cached)):
+                results.append({"query": query, "response": response, "media": media_files, "hit": bool(response)})
+
+                if not response:
+                    groups.setdefault(self.__model_name(**extras[index]), []).append(index)
+
+            misses = {name: len(indices) for name, indices in groups.items()}
+            logger.debug("[Interaction]: batch of %d, misses=%s", len(queries), misses)
+
+            missed = sum(misses.values())
+            REQUESTS.inc(len(queries) - missed, path="call_many", result="hit")
+            REQUESTS.inc(missed, path="call_many", result="miss")
+
+            # Identical misses within the batch are sent to the model once
+            responses: Dict[str, Any] = {}
+            for name, indices in groups.items():
+                for index in indices:
+                    key = contexts[index].key
+                    if key not in responses:
+                        responses[key] = self.__execute(name, queries[index], contexts[index], **extras[index])
+
+                    results[index]["response"] = responses[key]
+
+            self.__cache.set_many(
+                [
+                    (queries[index], results[index]["response"], contexts[index], extras[index])
+                    for indices in groups.values()
+                    for index in indices
+                ]
+            )
+
+            return results
+
+    async def acall(self, query: str, **kwargs: Dict) -> Tuple[str, Optional[str]]:
+        """
+        Interact with LLM without blocking the event loop
+        """
+
+        with span("interaction.acall") as request:
+            context = self.__cache.context(query)
+
+            cached, media_files = await self.offload(self.__cache.get, query, context=context, **kwargs)
+            if cached:
+                self.__record(request, query, "hit")
+                return cached, media_files
+
+            response, shared = await self.__flights.ado(
+                context.key,
+                partial(self.__amiss, query, context, **kwargs),
+                **self.__similarity(context),
+            )
+
+            self.__record(request, query, "coalesced" if shared else "miss")
+            return response, None
+
+    async def acall_many(
+        self, queries: List[str], extras: Optional[List[Dict]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Async variant of `call_many`: the batch is looked up off the event loop, then misses run
+        concurrently through `acall`'s model path, each under its model's concurrency limit
+        """
+
+        extras = extras or [{} for _ in queries]
+        if len(extras) != len(queries):
+            raise ValueError("`extras` must have one entry per query")
+
+        with span("interaction.acall_many", queries=len(queries)):
+            contexts = [self.__cache.context(query) for query in queries]
+            cached = await self.offload(self.__cache.get_many, queries, contexts=contexts, extras=extras)
+
+            results: List[Dict[str, Any]] = []
+            # Identical misses within the batch are sent to the model once
+            groups: Dict[str, List[int]] = {}
+
+            for index, (query, (response, media_files)) in enumerate(zip(queries, cached)):
+                results.append({"query": query, "response": response, "media": media_files, "hit": bool(response)})
+
+                if not response:
+                    groups.setdefault(contexts[index].key, []).append(index)
+
+            missed = sum(len(indices) for indices in groups.values())
+            logger.debug("[Interaction]: async batch of %d, misses=%d", len(queries), missed)
+
+            REQUESTS.inc(len(queries) - missed, path="acall_many", result="hit")
+            REQUESTS.inc(missed, path="acall_many", result="miss")
+
+            responses = await asyncio.gather(
+                *(
+                    self.__flights.ado(
+                        key,
+                        partial(self.__amiss, queries[indices[0]], contexts[indices[0]], **extras[indices[0]]),
+                        **self.__similarity(contexts[indices[0]]),
+                    )
+                    for key, indices in groups.items()
+                )
+            )
+
+            for indices, (response, _) in zip(groups.values(), responses):
+                for index in indices:
+                    results[index]["response"] = response
+
+            return results
+
+    async def offload(self, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs blocking `function` on the bounded executor, inside the caller's trace
+        """
+
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.__executor, partial(context.run, function, *args, **kwargs))
+
+    def export_snapshot(self, archive_path: str) -> int:
+        """
+        Exports the cache so a new node can warm start from it
+        """
+
+        return self.__cache.export_snapshot(archive_path)
+
+    def close(self) -> None:
+        """
+        Releases the executor threads and flushes the vector DB
+        """
+
+        self.__executor.shutdown(wait=True)
+        if self.__writer is not None:
+            self.__writer.close()
+
+        self.__cache.close()
+        self.__manager.close()
+        self.__db.close()
+
+        if self.__metrics_port is not None:
+            release_metrics()
+            self.__metrics_port = None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns cache hit/miss counters per tier and per-model load statistics
+        """
+
+        return {**self.__cache.stats(), "models": self.__manager.stats()}
+
+    def __record(self, request: Span, query: str, result: str) -> None:
+        """
+        Tags the request span and counts it by entry point and result (hit, miss, coalesced)
+        """
+
+        request.set(result=result)
+        REQUESTS.inc(path=request.name.split(".")[-1], result=result)
+        logger.debug("[Interaction]: %s %s", result, query)
+
+    def __model_name(self, **kwargs: Dict) -> str:
+        """
+        Returns the name of the model serving a request with the given `kwargs`
+        """
+
+        return "moon_dream" if kwargs.get("file_path") else self.__text_model
+
+    def __similarity(self, context: EmbeddingContext) -> Dict[str, Any]:
+        """
+        Returns the near-duplicate matching arguments for the in-flight registry
+        """
+
+        if not self.__coalesce_similar:
+            return {}
+
+        return {"embedding": context.embedding, "scope": context.media_hash}
+
+    def __miss(self, query: str, context: EmbeddingContext, **kwargs: Dict) -> Any:
+        """
+        Calls the model for a cache miss and stores the response.
+        A previous call for the same key may have landed since our lookup, so the cache is re-checked first.
+        """
+
+        if stored := self.__cache.peek(query, context=context, **kwargs):
+            return stored[0]
+
+        response = self.__execute(self.__model_name(**kwargs), query, context, **kwargs)
+        self.__cache.set(query, response, context=context, **kwargs)
+
+        return response
+
+    async def __amiss(self, query: str, context: EmbeddingContext, **kwargs: Dict) -> Any:
+        """
+        Async variant of `__miss`
+        """
+
+        if stored := self.__cache.peek(query, context=context, **kwargs):
+            return stored[0]
+
+        name = self.__model_name(**kwargs)
+        async with self.__semaphore(name):
+            response = await self.__aexecute(name, query, context, **kwargs)
+
+        await self.offload(self.__cache.set, query, response, context=context, **kwargs)
+
+        return response
+
+    def __semaphore(self, name: str) -> asyncio.Semaphore:
+        """
+        Returns the concurrency limiter of model `name` for the running event loop
+        """
+
+        semaphores = self.__semaphores.setdefault(asyncio.get_running_loop(), {})
+        if name not in semaphores:
+            semaphores[name] = asyncio.Semaphore(self.__concurrency.get(name, 1))
+
+        return semaphores[name]
+
+    async def __aexecute(
+        self, name: str, query: str, context: Optional[EmbeddingContext], **kwargs: Dict
+    ) -> Any:
+        """
+        Runs `query` against model `name`, natively async when the model supports it
+        """
+
+        model = self.__manager.model(name)
+        if not kwargs.get("file_path") and isinstance(model, AsyncLLM):
+            with span(f"model.{name}"):
+                return await model.aexecute(query)
+
+        return await self.offload(self.__execute, name, query, context, **kwargs)
+
+    def __execute(
+        self, name: str, query: str, context: Optional[EmbeddingContext], **kwargs: Dict
+    ) -> Any:
+        """
+        Runs `query` against model `name`
+        """
+
+        with span(f"model.{name}"):
+            if file_path := kwargs.get("file_path"):
+                return self.__handle_request(query, file_path, context)
+
+            return self.__manager.model(name).execute(query)
+
+    def __handle_request(
+        self, prompt: str, file_path: str, context: Optional[EmbeddingContext] = None
+    ) -> Any:
         """
         Calls LLM, Get the response and generates images to cross check the coordinates
         """
 
         model = self.__manager.model("moon_dream")
-        identifier = self.__text_processor.extract(prompt)
+        with span("extract"):
+            identifier = self.__text_processor.extract(prompt, context=context)
 
-        print(f"[Interaction]: {prompt=} and {identifier=}")
+        logger.debug("[Interaction]: prompt=%r and identifier=%r", prompt, identifier)
 
-        response = model.detect(file_path, identifier)
+        # Decoded once for detection, box scaling and drawing
+        image = ImageHandle(path=file_path, file_hash=context.media_hash if context else None)
+        with span("detect"):
+            response = model.detect(image, identifier)
 
         # for box in response:
-        #     coords = self.__box_utils.absolute_pixels(file_path, box)
-        #     self.__image_processor(file_path).draw_boundary(coords, directory="intermediate")
+        #     coords = self.__box_utils.absolute_pixels(image, box)
+        #     self.__image_processor(handle=image).draw_boundary(coords, directory="intermediate")
 
-        merged_coords = self.__box_utils.merge_boxes(file_path, response)
+        with span("merge", boxes=len(response)):
+            merged_coords = self.__box_utils.merge_boxes(image, response)
 
-        for coords in merged_coords:
-            self.__image_processor(file_path).draw_boundary(
-                coords, directory="generated"
-            )
+        if self.__writer is not None:
+            with span("annotate"):
+                self.__image_processor(handle=image).draw_boundaries(
+                    merged_coords,
+                    directory="generated",
+                    image_format=ANNOTATION_FORMAT,
+                    compression=ANNOTATION_COMPRESSION,
+                    writer=self.__writer,
+                )
 
         return merged_coords
@@ -1,7 +1,64 @@
-from typing import Union
+from typing import TYPE_CHECKING, Union
 
-from utils.box import BoxUtility
-from utils.image import ImageProcessor
-from utils.text import TextProcessor
+from utils.lazy import lazy_exports
 
-Utility = Union[BoxUtility, TextProcessor, ImageProcessor]
+if TYPE_CHECKING:
+    from utils.box import BoxUtility
+    from utils.exporter import MetricsServer
+    from utils.handle import ImageHandle
+    from utils.image import ImageProcessor
+    from utils.lru import LRUCache
+    from utils.ocr import OCRCache, OCRIndex, TiledOCR
+    from utils.regions import RegionCache
+    from utils.text import EmbeddingContext, TextProcessor
+    from utils.writer import ImageWriter
+
+    Utility = Union[
+        BoxUtility,
+        TextProcessor,
+        ImageProcessor,
+        ImageHandle,
+        ImageWriter,
+        OCRCache,
+        OCRIndex,
+        TiledOCR,
+        RegionCache,
+        LRUCache,
+        EmbeddingContext,
+        MetricsServer,
+    ]
+
+# Submodules load on first access
+__getattr__, __dir__ = lazy_exports(
+    __name__,
+    {
+        "BoxUtility": "utils.box",
+        "MetricsServer": "utils.exporter",
+        "ImageHandle": "utils.handle",
+        "ImageProcessor": "utils.image",
+        "LRUCache": "utils.lru",
+        "OCRCache": "utils.ocr",
+        "OCRIndex": "utils.ocr",
+        "TiledOCR": "utils.ocr",
+        "RegionCache": "utils.regions",
+        "EmbeddingContext": "utils.text",
+        "TextProcessor": "utils.text",
+        "ImageWriter": "utils.writer",
+    },
+    {
+        "Utility": (
+            "BoxUtility",
+            "TextProcessor",
+            "ImageProcessor",
+            "ImageHandle",
+            "ImageWriter",
+            "OCRCache",
+            "OCRIndex",
+            "TiledOCR",
+            "RegionCache",
+            "LRUCache",
+            "EmbeddingContext",
+            "MetricsServer",
+        )
+    },
+)
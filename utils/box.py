@@ -1,6 +1,11 @@
+import logging
 from typing import Dict, List, Tuple, Union
 
-from PIL import Image, ImageFile
+import numpy as np
+
+from .handle import ImageHandle
+
+logger = logging.getLogger(__name__)
 
 BoxT = Dict[str, Union[int, float]]
 CoordsT = Tuple[int, int, int, int]
@@ -23,13 +28,12 @@ class BoxUtility:
             int(box["y_max"]),
         )
 
-    def absolute_pixels(self, path: str, box: BoxT) -> CoordsT:
+    def absolute_pixels(self, path: Union[str, ImageHandle], box: BoxT) -> CoordsT:
         """
         Converts normalized coordinates to absolute pixel values based on image dimensions.
         """
 
-        image: ImageFile.ImageFile = Image.open(path)
-        width, height = image.size
+        width, height = ImageHandle.of(path).size
 
         x_min = int(box["x_min"] * width)
         y_min = int(box["y_min"] * height)
@@ -38,13 +42,24 @@ class BoxUtility:
 
         return (x_min, y_min, x_max, y_max)
 
+    def absolute_boxes(self, path: Union[str, ImageHandle], boxes: List[BoxT]) -> np.ndarray:
+        """
+        Vectorized `absolute_pixels`, returns an `(n, 4)` integer array
+        """
+
+        width, height = ImageHandle.of(path).size
+        normalized = np.array(
+            [[box["x_min"], box["y_min"], box["x_max"], box["y_max"]] for box in boxes], dtype=np.float64
+        ).reshape(-1, 4)
+
+        # Truncates toward zero, like `int`
+        return (normalized * np.array([width, height, width, height], dtype=np.float64)).astype(np.int64)
+
     def IOU(self, box1: CoordsT, box2: CoordsT) -> float:
         """
         Calculate Intersection over Union (IoU) between two bounding boxes.
         """
 
-        print(f"[BoxUtility]: {box1=} and {box2=}")
-
         # Intersection coordinates
         x_min_inter = max(box1[0], box2[0])
         y_min_inter = max(box1[1], box2[1])
@@ -57,7 +72,6 @@ class BoxUtility:
 
         # Area of intersection
         inter_area = inter_width * inter_height
-        print(f"[BoxUtility]: {inter_area=}")
 
         # Area of both boxes
         box1_area = (box1[2] - box1[0]) * (box1[3] - box1[1])
@@ -65,43 +79,109 @@ class BoxUtility:
 
         # Area of union
         union_area = box1_area + box2_area - inter_area
-        print(f"[BoxUtility]: {union_area=}")
 
         return inter_area / union_area if union_area > 0 else 0
 
+    def iou_matrix(self, boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+        """
+        Pairwise IoU between `(n, 4)` and `(m, 4)` box arrays, returns an `(n, m)` matrix.
+        Matches `IOU` element-wise.
+        """
+
+        boxes1 = np.asarray(boxes1, dtype=np.int64).reshape(-1, 4)[:, None, :]
+        boxes2 = np.asarray(boxes2, dtype=np.int64).reshape(-1, 4)[None, :, :]
+
+        x_min_inter = np.maximum(boxes1[..., 0], boxes2[..., 0])
+        y_min_inter = np.maximum(boxes1[..., 1], boxes2[..., 1])
+        x_max_inter = np.minimum(boxes1[..., 2], boxes2[..., 2])
+        y_max_inter = np.minimum(boxes1[..., 3], boxes2[..., 3])
+
+        inter_area = np.maximum(0, x_max_inter - x_min_inter) * np.maximum(0, y_max_inter - y_min_inter)
+
+        area1 = (boxes1[..., 2] - boxes1[..., 0]) * (boxes1[..., 3] - boxes1[..., 1])
+        area2 = (boxes2[..., 2] - boxes2[..., 0]) * (boxes2[..., 3] - boxes2[..., 1])
+        union_area = area1 + area2 - inter_area
+
+        iou = np.zeros(inter_area.shape, dtype=np.float64)
+        np.divide(inter_area, union_area, out=iou, where=union_area > 0)
+
+        return iou
+
     def merge_boxes(
-        self, path: str, boxes: List[BoxT], iou_threshold: float = 0.5
+        self,
+        path: Union[str, ImageHandle],
+        boxes: List[BoxT],
+        iou_threshold: float = 0.5,
+        mode: str = "merge",
     ) -> List[CoordsT]:
         """
         Merge overlapping bounding boxes based on IoU.
         Converts normalized boxes to absolute pixels and returns merged absolute pixel boxes.
+
+        `mode="merge"` takes each remaining box in order and grows it into the union of every later box
+        overlapping it by more than `iou_threshold` (checked against the box as it grows).
+        `mode="nms"` keeps the highest scoring box of each overlapping group instead (torchvision NMS,
+        using a box's `score` when present and input order otherwise).
         """
 
-        absolute_boxes: List[CoordsT] = [
-            self.absolute_pixels(path, box) for box in boxes
-        ]
+        if mode not in {"merge", "nms"}:
+            raise ValueError("mode must be one of ['merge', 'nms']")
+
+        absolute_boxes = self.absolute_boxes(path, boxes)
+
+        if mode == "nms":
+            merged = self.__suppress(absolute_boxes, boxes, iou_threshold)
+        else:
+            merged = self.__merge(absolute_boxes, iou_threshold)
+
+        logger.debug("[BoxUtility]: Merged %d boxes into %d (Absolute Pixels): %s", len(boxes), len(merged), merged)
+        return merged
+
+    def __merge(self, boxes: np.ndarray, iou_threshold: float) -> List[CoordsT]:
+        """
+        Sequential union merging. Until the current box grows, its IoU against the remaining boxes
+        does not change, so each step scores every remaining box at once and jumps to the first overlap.
+        """
 
         merged: List[CoordsT] = []
 
-        while absolute_boxes:
-            current_box = absolute_boxes.pop(0)
-            overlapping_boxes = []
+        while len(boxes):
+            current, remaining = boxes[0].copy(), boxes[1:]
+            kept = np.ones(len(remaining), dtype=bool)
+            start = 0
 
-            for box in absolute_boxes:
-                iou = self.IOU(current_box, box)
+            while start < len(remaining):
+                overlapping = np.flatnonzero(self.iou_matrix(current, remaining[start:])[0] > iou_threshold)
+                if not len(overlapping):
+                    break
 
-                if iou > iou_threshold:
-                    current_box = (
-                        min(current_box[0], box[0]),
-                        min(current_box[1], box[1]),
-                        max(current_box[2], box[2]),
-                        max(current_box[3], box[3]),
-                    )
-                else:
-                    overlapping_boxes.append(box)
+                index = start + int(overlapping[0])
+                current[:2] = np.minimum(current[:2], remaining[index, :2])
+                current[2:] = np.maximum(current[2:], remaining[index, 2:])
+                kept[index] = False
+                start = index + 1
 
-            merged.append(current_box)
-            absolute_boxes = overlapping_boxes
+            merged.append(tuple(int(value) for value in current))
+            boxes = remaining[kept]
 
-        print(f"[BoxUtility]: Merged Boxes (Absolute Pixels): {merged}")
         return merged
+
+    def __suppress(self, boxes: np.ndarray, source: List[BoxT], iou_threshold: float) -> List[CoordsT]:
+        """
+        Non-maximum suppression, returning the kept boxes in score order
+        """
+
+        import torch
+        from torchvision.ops import nms
+
+        if not len(boxes):
+            return []
+
+        scores = [box.get("score", box.get("confidence", -index)) for index, box in enumerate(source)]
+        keep = nms(
+            torch.as_tensor(boxes, dtype=torch.float32),
+            torch.as_tensor(scores, dtype=torch.float32),
+            iou_threshold,
+        )
+
+        return [tuple(int(value) for value in boxes[index]) for index in keep.tolist()]
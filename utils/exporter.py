@@ -0,0 +1,120 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from .metrics import REGISTRY, Registry, recent_spans
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsServer:
+    """
+    Serves `registry` over HTTP on a background thread
+
+    - `/metrics`: Prometheus text format
+    - `/traces`: recently finished spans as JSON (`?trace_id=` narrows to one trace)
+
+    Binds to localhost by default; `port=0` picks a free port (see `port`).
+    """
+
+    def __init__(self, port: int, host: str = "127.0.0.1", registry: Registry = REGISTRY) -> None:
+        self.__registry = registry
+        self.__server = ThreadingHTTPServer((host, port), self.__handler())
+        self.__server.daemon_threads = True
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    def __handler(self) -> type:
+        registry = self.__registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+
+                if url.path == "/metrics":
+                    body, content_type = registry.expose().encode(), "text/plain; version=0.0.4; charset=utf-8"
+                elif url.path == "/traces":
+                    trace_id = parse_qs(url.query).get("trace_id", [None])[0]
+                    body, content_type = json.dumps(recent_spans(trace_id)).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: object) -> None:
+                logger.debug("[MetricsServer]: " + format, *args)
+
+        return Handler
+
+    def start(self) -> "MetricsServer":
+        """
+        Starts serving, returns `self`
+        """
+
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__server.serve_forever, name="metrics-server", daemon=True)
+            self.__thread.start()
+            logger.info("[MetricsServer]: Serving http://%s:%d/metrics", *self.__server.server_address[:2])
+
+        return self
+
+    def close(self) -> None:
+        """
+        Stops serving and releases the port
+        """
+
+        if self.__thread is not None:
+            self.__server.shutdown()
+            self.__thread.join()
+            self.__thread = None
+
+        self.__server.server_close()
+
+
+# The registry is process-wide, so is its exporter: components share one server on one port
+_lock = threading.Lock()
+_shared: Optional[MetricsServer] = None
+_users = 0
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> MetricsServer:
+    """
+    Starts the process-wide exporter on first use and returns it. Later callers share the running
+    server (a different `port` is ignored with a warning). Pair each call with `release_metrics`.
+    """
+
+    global _shared, _users
+
+    with _lock:
+        if _shared is None:
+            _shared = MetricsServer(port, host=host).start()
+        elif port not in (0, _shared.port):
+            logger.warning("[MetricsServer]: Already serving on port %d, ignoring port %d", _shared.port, port)
+
+        _users += 1
+        return _shared
+
+
+def release_metrics() -> None:
+    """
+    Releases one `serve_metrics` call, stopping the exporter when it was the last one
+    """
+
+    global _shared, _users
+
+    with _lock:
+        _users = max(0, _users - 1)
+        if _users == 0 and _shared is not None:
+            _shared.close()
+            _shared = None
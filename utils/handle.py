@@ -0,0 +1,124 @@
+import hashlib
+import threading
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+
+class ImageHandle:
+    """
+    Decode-once image shared by every stage of a request (detection, box scaling, drawing, OCR)
+
+    The file is decoded on first use and the size, PIL, NumPy (BGR, as OpenCV expects) and grayscale
+    views are derived lazily and cached. Views are shared, copy before mutating them.
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, image: Optional[Image.Image] = None, file_hash: Optional[str] = None
+    ) -> None:
+        if not path and image is None:
+            raise ValueError("path or image is required")
+
+        self.path: Optional[str] = path
+        self.__pil: Optional[Image.Image] = image
+        self.__size: Optional[Tuple[int, int]] = image.size if image is not None else None
+        self.__array: Optional[np.ndarray] = None
+        self.__grayscale: Optional[np.ndarray] = None
+        self.__hash: Optional[str] = file_hash
+
+        self.__lock = threading.RLock()
+
+    @classmethod
+    def of(cls, image: Union[str, Image.Image, "ImageHandle"]) -> "ImageHandle":
+        """
+        Returns `image` as a handle, wrapping file paths and PIL images
+        """
+
+        if isinstance(image, ImageHandle):
+            return image
+
+        if isinstance(image, Image.Image):
+            return cls(image=image)
+
+        return cls(path=image)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        """
+        Returns `(width, height)`, reading only the file header when the image is not decoded yet
+        """
+
+        if self.__size is None:
+            with self.__lock:
+                if self.__size is None:
+                    with Image.open(self.path) as image:
+                        self.__size = image.size
+
+        return self.__size
+
+    @property
+    def pil(self) -> Image.Image:
+        """
+        Returns the decoded PIL image
+        """
+
+        if self.__pil is None:
+            with self.__lock:
+                if self.__pil is None:
+                    image = Image.open(self.path)
+                    image.load()
+                    self.__pil, self.__size = image, image.size
+
+        return self.__pil
+
+    @property
+    def array(self) -> np.ndarray:
+        """
+        Returns the image as a BGR `uint8` array
+        """
+
+        if self.__array is None:
+            with self.__lock:
+                if self.__array is None:
+                    self.__array = np.ascontiguousarray(np.asarray(self.pil.convert("RGB"))[:, :, ::-1])
+
+        return self.__array
+
+    @property
+    def grayscale(self) -> np.ndarray:
+        """
+        Returns the single channel grayscale array
+        """
+
+        if self.__grayscale is None:
+            with self.__lock:
+                if self.__grayscale is None:
+                    from cv2 import COLOR_BGR2GRAY, cvtColor
+
+                    self.__grayscale = cvtColor(self.array, COLOR_BGR2GRAY)
+
+        return self.__grayscale
+
+    @property
+    def hash(self) -> str:
+        """
+        Returns the SHA-256 of the file content (of the pixels for in-memory images)
+        """
+
+        if self.__hash is None:
+            with self.__lock:
+                if self.__hash is None:
+                    hasher = hashlib.sha256()
+
+                    if self.path:
+                        with open(self.path, "rb") as media_file:
+                            while chunk := media_file.read(1 << 20):
+                                hasher.update(chunk)
+                    else:
+                        hasher.update(f"{self.pil.mode}:{self.pil.size}".encode())
+                        hasher.update(self.pil.tobytes())
+
+                    self.__hash = hasher.hexdigest()
+
+        return self.__hash
@@ -1,13 +1,18 @@
 import hashlib
+import logging
 import time
 from os import makedirs, path
 from random import randint
 from typing import Any, Dict, List, Optional, Tuple
 
-import numpy as np
-from cv2 import COLOR_BGR2GRAY, COLOR_RGB2BGR, cvtColor, imread, imwrite, rectangle
 from PIL import Image
-from pytesseract import Output, image_to_data
+
+from .handle import ImageHandle
+from .metrics import span
+from .ocr import OCRCache, OCRIndex, TiledOCR, tesseract
+from .writer import ImageWriter, encode_params
+
+logger = logging.getLogger(__name__)
 
 CoordsT = Tuple[int, int, int, int]
 
@@ -17,78 +22,115 @@ class ImageProcessor:
     Service layer to work with images
     """
 
-    def __init__(self, path: str = None, image: Image.Image = None) -> None:
-        if path:
-            self.__image = imread(filename=path)
+    def __init__(
+        self,
+        path: str = None,
+        image: Image.Image = None,
+        handle: ImageHandle = None,
+        ocr_cache: Optional[OCRCache] = None,
+        tiler: Optional[TiledOCR] = None,
+    ) -> None:
+        self.__ocr_cache: Optional[OCRCache] = ocr_cache
+        self.__tiler: Optional[TiledOCR] = tiler
+        self.__index: Optional[OCRIndex] = None
 
-        elif image:
-            self.__image = cvtColor(np.array(image), COLOR_RGB2BGR)
+        if handle is not None:
+            self.__handle = handle
 
-        else:
-            raise ValueError("path or image is required")
+        elif path or image:
+            self.__handle = ImageHandle(path=path, image=image)
 
-        self.__grayscale = cvtColor(self.__image, COLOR_BGR2GRAY)
+        else:
+            raise ValueError("path, image or handle is required")
 
     def ocr(self) -> List[Dict[str, Any]]:
         """
         Performs `OCR`
         """
 
-        elements: List[Dict[str, Any]] = []
-        data = image_to_data(self.__grayscale, output_type=Output.DICT)
+        return list(self.ocr_index().elements)
+
+    def ocr_index(self) -> OCRIndex:
+        """
+        Returns the indexed `OCR` result, from the OCR cache (by image content hash) when available
+        """
+
+        if self.__index is None:
+            if self.__ocr_cache is not None:
+                self.__index = self.__ocr_cache.get(self.__handle.hash, self.__tesseract)
+            else:
+                self.__index = OCRIndex(self.__tesseract())
+
+        return self.__index
+
+    def __tesseract(self) -> List[Dict[str, Any]]:
+        """
+        Runs tesseract on the grayscale image, tile by tile when a tiler is configured
+        """
 
-        for index in range(len(data["text"])):
-            if data["text"][index].strip():
-                element = {
-                    "y": data["top"][index],
-                    "x": data["left"][index],
-                    "text": data["text"][index],
-                    "width": data["width"][index],
-                    "height": data["height"][index],
-                }
-                elements.append(element)
+        with span("ocr", tiled=self.__tiler is not None):
+            if self.__tiler is not None:
+                return self.__tiler(self.__handle.grayscale)
 
-        return elements
+            return tesseract(self.__handle.grayscale)
 
     def get_location(self, text: str) -> Optional[Dict]:
         """
         Returns `Location Metadata` for given `text`
         """
 
-        elements = self.ocr()
-
-        return next(
-            (
-                element
-                for element in elements
-                if text.lower() in element["text"].lower()
-            ),
-            None,
-        )
+        return self.ocr_index().find(text)
 
     def draw_boundary(self, coords: CoordsT, directory: str) -> None:
         """
-        Draws a boundary box using given `coords`
+        Draws a boundary box using given `coords` on a copy of the image
+        """
+
+        self.draw_boundaries([coords], directory)
+
+    def draw_boundaries(
+        self,
+        coords: List[CoordsT],
+        directory: str,
+        image_format: str = "png",
+        compression: Optional[int] = None,
+        writer: Optional[ImageWriter] = None,
+    ) -> Optional[str]:
+        """
+        Draws every box in `coords` on one copy of the image and saves it once, through `writer`
+        (off the calling thread) when given. Returns the output path, or `None` if nothing was saved.
         """
 
+        # OpenCV is imported on first use to keep package import cheap
+        from cv2 import imwrite, rectangle
+
         try:
-            x_min, y_min, x_max, y_max = map(int, coords)
-            rectangle(self.__image, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
+            params = encode_params(image_format, compression)
+            image = self.__handle.array.copy()
+
+            for box in coords:
+                x_min, y_min, x_max, y_max = map(int, box)
+                rectangle(image, (x_min, y_min), (x_max, y_max), (0, 255, 0), 2)
 
             output_dir = path.join("./assets", directory)
             makedirs(output_dir, exist_ok=True)
 
-            file_name = f"image__{int(time.time())}__{randint(1, 9999)}.png"
+            file_name = f"image__{int(time.time())}__{randint(1, 9999)}.{image_format}"
             file_path = path.join(output_dir, file_name)
 
-            imwrite(file_path, self.__image)
+            if writer is not None:
+                return file_path if writer.submit(file_path, image, params) else None
+
+            imwrite(file_path, image, params)
+            return file_path
 
         except Exception as exception:
-            print(f"[ImageProcessor]: {exception}")
+            logger.error("[ImageProcessor]: %s", exception)
+            return None
 
     def hashed(self) -> str:
         """
         Returns a unique hash for the image
         """
 
-        return hashlib.sha256(self.__image.tobytes()).hexdigest()
+        return hashlib.sha256(self.__handle.array.tobytes()).hexdigest()
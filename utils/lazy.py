@@ -0,0 +1,35 @@
+import importlib
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+
+def lazy_exports(
+    package: str, exports: Dict[str, str], unions: Optional[Dict[str, Tuple[str, ...]]] = None
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    Returns PEP 562 `__getattr__` / `__dir__` hooks for `package`.
+
+    `exports` maps each public name to the submodule defining it, which is imported on first access.
+    `unions` maps type aliases to the exported names they are a `Union` of.
+    """
+
+    unions = unions or {}
+
+    def __getattr__(name: str) -> Any:
+        module = sys.modules[package]
+
+        if name in exports:
+            value = getattr(importlib.import_module(exports[name]), name)
+        elif name in unions:
+            value = Union[tuple(getattr(module, member) for member in unions[name])]
+        else:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+        # Later lookups hit the module dict directly
+        setattr(module, name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted({*vars(sys.modules[package]), *exports, *unions})
+
+    return __getattr__, __dir__
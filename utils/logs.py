@@ -0,0 +1,12 @@
+import logging
+
+from env import LOG_LEVEL
+
+
+def configure_logging(level: str = LOG_LEVEL) -> None:
+    """
+    Sends log records to stderr as `[Component]: message` lines at `level`.
+    Per-request detail (cache hits, search scores, spans) is logged at DEBUG.
+    """
+
+    logging.basicConfig(level=level.upper(), format="%(message)s")
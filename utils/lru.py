@@ -0,0 +1,103 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """
+    Bounded in-process store with LRU eviction and optional TTL
+
+    With `max_bytes`, entries are also evicted until the total of `size_of(value)` fits the budget.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        ttl_in_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        size_of: Callable[[Any], int] = sys.getsizeof,
+    ) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity must be a positive integer")
+
+        self.__capacity: int = capacity
+        self.__ttl: Optional[float] = ttl_in_seconds
+        self.__max_bytes: Optional[int] = max_bytes
+        self.__size_of: Callable[[Any], int] = size_of
+        self.__bytes: int = 0
+
+        self.__lock = threading.Lock()
+        self.__items: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    @property
+    def bytes(self) -> int:
+        """
+        Total size of the stored values (tracked only with `max_bytes`)
+        """
+
+        return self.__bytes
+
+    def __pop(self, key: Hashable) -> None:
+        """
+        Removes `key` and releases its size. Must hold the lock.
+        """
+
+        if (item := self.__items.pop(key, None)) is not None:
+            self.__bytes -= item[2]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the value for `key` (marking it as recently used), or `None` if absent or expired.
+        """
+
+        with self.__lock:
+            if (item := self.__items.get(key)) is None:
+                return None
+
+            value, timestamp, _ = item
+            if self.__ttl is not None and time.time() - timestamp > self.__ttl:
+                self.__pop(key)
+                return None
+
+            self.__items.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, timestamp: Optional[float] = None) -> None:
+        """
+        Stores `value` under `key`, evicting the least recently used entry when full.
+        `timestamp` is the creation time used for TTL checks (defaults to now).
+        """
+
+        size = self.__size_of(value) if self.__max_bytes is not None else 0
+
+        with self.__lock:
+            self.__pop(key)
+            self.__items[key] = (value, time.time() if timestamp is None else timestamp, size)
+            self.__bytes += size
+
+            while len(self.__items) > self.__capacity or (
+                self.__max_bytes is not None and self.__bytes > self.__max_bytes and len(self.__items) > 1
+            ):
+                self.__pop(next(iter(self.__items)))
+
+    def delete(self, key: Hashable) -> None:
+        """
+        Removes `key` if present.
+        """
+
+        with self.__lock:
+            self.__pop(key)
+
+    def clear(self) -> None:
+        """
+        Removes every entry.
+        """
+
+        with self.__lock:
+            self.__items.clear()
+            self.__bytes = 0
@@ -0,0 +1,334 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Seconds, from a cached exact-tier hit up to a model call
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Finished spans kept for inspection (`recent_spans`, the exporter's `/traces`)
+TRACE_BUFFER = 1024
+
+
+def label_key(names: Tuple[str, ...], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    """
+    Returns the label values of a sample in declaration order
+    """
+
+    if len(labels) != len(names) or any(name not in labels for name in names):
+        raise ValueError(f"expected labels {list(names)}, got {sorted(labels)}")
+
+    return tuple(str(labels[name]) for name in names)
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """
+    Renders `{name="value",...}` in the Prometheus text format
+    """
+
+    if not names:
+        return ""
+
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value))
+
+
+class Counter:
+    """
+    Monotonic count per label set, named with a `_total` suffix
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labels: Tuple[str, ...] = tuple(labels)
+
+        self.__lock = threading.Lock()
+        self.__values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = label_key(self.labels, labels)
+        with self.__lock:
+            self.__values[key] = self.__values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        """
+        Returns `(suffix, label names, label values, value)` rows
+        """
+
+        with self.__lock:
+            return [("", self.labels, key, value) for key, value in self.__values.items()]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.__lock:
+            return {",".join(key): value for key, value in self.__values.items()}
+
+
+class Gauge:
+    """
+    Current value per label set
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labels: Tuple[str, ...] = tuple(labels)
+
+        self.__lock = threading.Lock()
+        self.__values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = label_key(self.labels, labels)
+        with self.__lock:
+            self.__values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = label_key(self.labels, labels)
+        with self.__lock:
+            self.__values[key] = self.__values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        with self.__lock:
+            return [("", self.labels, key, value) for key, value in self.__values.items()]
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.__lock:
+            return {",".join(key): value for key, value in self.__values.items()}
+
+
+class Histogram:
+    """
+    Distribution of observed values (seconds by default) per label set, in cumulative buckets
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.labels: Tuple[str, ...] = tuple(labels)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets)) + (float("inf"),)
+
+        self.__lock = threading.Lock()
+        # label values -> [count per bucket..., sum, count]
+        self.__values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = label_key(self.labels, labels)
+        with self.__lock:
+            if (counts := self.__values.get(key)) is None:
+                counts = self.__values[key] = [0.0] * (len(self.buckets) + 2)
+
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """
+        Observes the duration of the block
+        """
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def samples(self) -> List[Tuple[str, Tuple[str, ...], Tuple[str, ...], float]]:
+        with self.__lock:
+            values = {key: list(counts) for key, counts in self.__values.items()}
+
+        rows = []
+        for key, counts in values.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                rows.append(("_bucket", self.labels + ("le",), key + (format_value(bound),), cumulative))
+
+            rows.append(("_sum", self.labels, key, counts[-2]))
+            rows.append(("_count", self.labels, key, counts[-1]))
+
+        return rows
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self.__lock:
+            return {
+                ",".join(key): {"count": counts[-1], "sum": counts[-2], "mean": counts[-2] / counts[-1]}
+                for key, counts in self.__values.items()
+                if counts[-1]
+            }
+
+
+Metric = Union[Counter, Gauge, Histogram]
+
+
+class Registry:
+    """
+    Named metrics of the process. Metrics are created on first request and shared afterwards,
+    so modules declare what they record at import time.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__metrics: Dict[str, Metric] = {}
+
+    def __get(self, kind: type, name: str, *args: Any, **kwargs: Any) -> Any:
+        with self.__lock:
+            if (metric := self.__metrics.get(name)) is None:
+                metric = self.__metrics[name] = kind(name, *args, **kwargs)
+            elif not isinstance(metric, kind):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.__get(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.__get(Gauge, name, documentation, labels)
+
+    def histogram(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self.__get(Histogram, name, documentation, labels, buckets)
+
+    def expose(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format (0.0.4)
+        """
+
+        with self.__lock:
+            metrics = sorted(self.__metrics.values(), key=lambda metric: metric.name)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, names, values, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{format_labels(names, values)} {format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns every metric as plain values, keyed by metric name then comma-joined label values
+        """
+
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+REGISTRY = Registry()
+
+SPAN_SECONDS = REGISTRY.histogram("llm_cache_span_seconds", "Duration of traced operations", ["span"])
+SPAN_ERRORS = REGISTRY.counter("llm_cache_span_errors_total", "Traced operations that raised", ["span"])
+
+
+class Span:
+    """
+    One timed operation. Spans opened while another is active (in the same thread or task)
+    become its children and share its trace id.
+    """
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes: Any) -> None:
+        self.name: str = name
+        self.span_id: str = f"{random.getrandbits(64):016x}"
+        self.trace_id: str = parent.trace_id if parent else f"{random.getrandbits(64):016x}"
+        self.parent_id: Optional[str] = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = attributes
+
+        self.start: float = time.time()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("span", default=None)
+_finished: Deque[Span] = deque(maxlen=TRACE_BUFFER)
+
+
+def current_span() -> Optional[Span]:
+    """
+    Returns the innermost active span
+    """
+
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Traces the block as `name`, recording its duration in `llm_cache_span_seconds{span=name}`
+    """
+
+    current = Span(name, _current.get(), **attributes)
+    token = _current.set(current)
+    start_time = time.perf_counter()
+
+    try:
+        yield current
+    except BaseException as exception:
+        current.error = type(exception).__name__
+        SPAN_ERRORS.inc(span=name)
+        raise
+    finally:
+        current.duration = time.perf_counter() - start_time
+        _current.reset(token)
+
+        SPAN_SECONDS.observe(current.duration, span=name)
+        _finished.append(current)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "[Trace]: %s %.6fs trace=%s parent=%s %s",
+                name,
+                current.duration,
+                current.trace_id,
+                current.parent_id,
+                current.attributes,
+            )
+
+
+def recent_spans(trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Returns finished spans, oldest first, optionally of one trace
+    """
+
+    return [item.to_dict() for item in list(_finished) if trace_id is None or item.trace_id == trace_id]
@@ -0,0 +1,394 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from constants import OCR_CACHE_CAPACITY, OCR_GRID_CELL, OCR_TILE_OVERLAP, OCR_TILE_SIZE
+
+from .lru import LRUCache
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOKUPS = REGISTRY.counter("llm_cache_ocr_lookups_total", "OCR cache lookups by result", ["result"])
+
+CoordsT = Tuple[int, int, int, int]
+
+
+def tesseract_lines(grayscale: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> List[List[Dict[str, Any]]]:
+    """
+    Runs tesseract on `grayscale` and returns the non-blank words, shifted by `offset` (x, y),
+    grouped by text line in tesseract's reading order
+    """
+
+    from pytesseract import Output, image_to_data
+
+    lines: Dict[Tuple[int, int, int], List[Dict[str, Any]]] = {}
+    data = image_to_data(grayscale, output_type=Output.DICT)
+
+    for index in range(len(data["text"])):
+        if data["text"][index].strip():
+            element = {
+                "y": data["top"][index] + offset[1],
+                "x": data["left"][index] + offset[0],
+                "text": data["text"][index],
+                "width": data["width"][index],
+                "height": data["height"][index],
+            }
+            line = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+            lines.setdefault(line, []).append(element)
+
+    return list(lines.values())
+
+
+def tesseract(grayscale: np.ndarray, offset: Tuple[int, int] = (0, 0)) -> List[Dict[str, Any]]:
+    """
+    Runs tesseract on `grayscale` and returns the non-blank words, shifted by `offset` (x, y)
+    """
+
+    return [element for line in tesseract_lines(grayscale, offset) for element in line]
+
+
+def _tile(grayscale: np.ndarray, offset: Tuple[int, int], core: CoordsT) -> List[List[Dict[str, Any]]]:
+    """
+    Worker: OCRs one tile and keeps the words centred in its core region, by line
+    """
+
+    x_min, y_min, x_max, y_max = core
+    lines = [
+        [
+            element
+            for element in line
+            if x_min <= element["x"] + element["width"] / 2 < x_max
+            and y_min <= element["y"] + element["height"] / 2 < y_max
+        ]
+        for line in tesseract_lines(grayscale, offset)
+    ]
+
+    return [line for line in lines if line]
+
+
+def _join(tiles: List[Tuple[CoordsT, List[List[Dict[str, Any]]]]], reach: int) -> List[List[Dict[str, Any]]]:
+    """
+    Joins the lines of one row of `(core, lines)` tiles, left to right, keeping each tile's lines in
+    tesseract's order. A line starting within `reach` of its core's left edge continues the line of the
+    previous tile ending within `reach` of that edge, on the same height and at most a line height away.
+    """
+
+    lines: List[List[Dict[str, Any]]] = []
+    previous: List[int] = []  # lines of the previous tile reaching its right edge
+
+    for core, tile in tiles:
+        current: List[int] = []
+
+        for line in tile:
+            top = min(element["y"] for element in line)
+            bottom = max(element["y"] + element["height"] for element in line)
+            left = min(element["x"] for element in line)
+            right = max(element["x"] + element["width"] for element in line)
+
+            best, best_overlap = None, 0
+            if left <= core[0] + reach:
+                for index in previous:
+                    other = lines[index][-1]
+                    gap = left - (other["x"] + other["width"])
+                    overlap = min(bottom, other["y"] + other["height"]) - max(top, other["y"])
+
+                    if (
+                        gap <= max(bottom - top, other["height"])
+                        and overlap > best_overlap
+                        and overlap * 2 >= min(bottom - top, other["height"])
+                    ):
+                        best, best_overlap = index, overlap
+
+            if best is not None:
+                previous.remove(best)
+                lines[best].extend(line)
+                index = best
+            else:
+                lines.append(list(line))
+                index = len(lines) - 1
+
+            if right >= core[2] - reach:
+                current.append(index)
+
+        previous = current
+
+    return lines
+
+
+class TiledOCR:
+    """
+    OCR of large images as overlapping tiles on a process pool
+
+    The image is partitioned into `tile_size` cores and each tile is its core grown by half the
+    `overlap` on every side. A word is kept only by the tile whose core holds its centre, so words
+    in overlap areas are reported once, and any word no larger than `overlap` is seen whole by that
+    tile. Words come back in global coordinates and in reading order: tesseract's order within
+    a tile, lines crossing the edge between horizontally adjacent tiles stitched back together,
+    then the next tile, and tile rows top to bottom.
+    """
+
+    def __init__(
+        self, tile_size: int = OCR_TILE_SIZE, overlap: int = OCR_TILE_OVERLAP, workers: Optional[int] = None
+    ) -> None:
+        if overlap >= tile_size:
+            raise ValueError("overlap must be smaller than tile_size")
+
+        self.__tile_size: int = tile_size
+        self.__overlap: int = overlap
+        self.__workers: Optional[int] = workers
+
+        self.__lock = threading.Lock()
+        self.__pool: Optional[ProcessPoolExecutor] = None
+
+    def __executor(self) -> ProcessPoolExecutor:
+        """
+        Starts the process pool on first use
+        """
+
+        with self.__lock:
+            if self.__pool is None:
+                self.__pool = ProcessPoolExecutor(max_workers=self.__workers)
+
+            return self.__pool
+
+    def tiles(self, width: int, height: int) -> List[Tuple[CoordsT, CoordsT]]:
+        """
+        Returns `(tile, core)` rectangles covering a `width x height` image
+        """
+
+        size, margin = self.__tile_size, self.__overlap // 2
+        tiles: List[Tuple[CoordsT, CoordsT]] = []
+
+        for y in range(0, height, size):
+            for x in range(0, width, size):
+                core = (x, y, min(x + size, width), min(y + size, height))
+                tile = (
+                    max(0, x - margin),
+                    max(0, y - margin),
+                    min(width, core[2] + margin),
+                    min(height, core[3] + margin),
+                )
+                tiles.append((tile, core))
+
+        return tiles
+
+    def __call__(self, grayscale: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        OCRs `grayscale`, in one call when it fits a single tile
+        """
+
+        height, width = grayscale.shape[:2]
+        if width <= self.__tile_size and height <= self.__tile_size:
+            return tesseract(grayscale)
+
+        tiles = self.tiles(width, height)
+        futures = [
+            self.__executor().submit(_tile, grayscale[tile[1] : tile[3], tile[0] : tile[2]], tile[:2], core)
+            for tile, core in tiles
+        ]
+
+        # Tiles come row by row, left to right
+        rows: Dict[int, List[Tuple[CoordsT, List[List[Dict[str, Any]]]]]] = {}
+        for (_, core), future in zip(tiles, futures):
+            rows.setdefault(core[1], []).append((core, future.result()))
+
+        return [element for row in rows.values() for line in _join(row, self.__overlap) for element in line]
+
+    def close(self) -> None:
+        """
+        Shuts the process pool down
+        """
+
+        with self.__lock:
+            if self.__pool is not None:
+                self.__pool.shutdown()
+                self.__pool = None
+
+
+class OCRIndex:
+    """
+    OCR words of one image, indexed for lookups
+
+    - `find` answers "first word containing this text" from a text map plus a per-query memo.
+    - `within` answers "words touching this box" from a uniform grid, each word being filed under
+      every cell its rectangle covers.
+    """
+
+    def __init__(self, elements: List[Dict[str, Any]], cell_size: int = OCR_GRID_CELL) -> None:
+        self.elements: List[Dict[str, Any]] = elements
+        self.__cell_size: int = cell_size
+
+        self.__lock = threading.Lock()
+        self.__found: Dict[str, Optional[int]] = {}
+        self.__texts: Dict[str, int] = {}  # lowercased text -> first element with exactly that text
+        self.__grid: Dict[Tuple[int, int], List[int]] = {}
+        self.__extent: Optional[CoordsT] = None  # bounding box of every element
+
+        for position, element in enumerate(elements):
+            self.__texts.setdefault(element["text"].lower(), position)
+
+            x, y = element["x"], element["y"]
+            for cell in self.__cells(x, y, x + element["width"], y + element["height"]):
+                self.__grid.setdefault(cell, []).append(position)
+
+        if elements:
+            self.__extent = (
+                min(element["x"] for element in elements),
+                min(element["y"] for element in elements),
+                max(element["x"] + element["width"] for element in elements),
+                max(element["y"] + element["height"] for element in elements),
+            )
+
+    def __cells(self, x_min: int, y_min: int, x_max: int, y_max: int) -> Iterator[Tuple[int, int]]:
+        """
+        Grid cells covered by the closed rectangle
+        """
+
+        size = self.__cell_size
+        for column in range(x_min // size, x_max // size + 1):
+            for row in range(y_min // size, y_max // size + 1):
+                yield column, row
+
+    def find(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the first element (in OCR order) whose text contains `text`, case-insensitively
+        """
+
+        text = text.lower()
+
+        with self.__lock:
+            if text not in self.__found:
+                # An exact match bounds the scan: only earlier elements can win
+                end = self.__texts.get(text, len(self.elements) - 1) + 1
+                self.__found[text] = next(
+                    (position for position in range(end) if text in self.elements[position]["text"].lower()),
+                    None,
+                )
+
+            position = self.__found[text]
+
+        return self.elements[position] if position is not None else None
+
+    def within(self, box: CoordsT) -> List[Dict[str, Any]]:
+        """
+        Returns the elements overlapping `box` (a corner of either one inside the other), in OCR order
+        """
+
+        if self.__extent is None:
+            return []
+
+        x_min, y_min, x_max, y_max = box
+
+        # Only cells that can hold a word are visited, however large the box
+        search = (
+            max(x_min, self.__extent[0]),
+            max(y_min, self.__extent[1]),
+            min(x_max, self.__extent[2]),
+            min(y_max, self.__extent[3]),
+        )
+
+        if x_min > x_max or y_min > y_max:
+            # Inverted boxes can still match through their corners, check every word
+            candidates = range(len(self.elements))
+        elif search[0] > search[2] or search[1] > search[3]:
+            return []
+        else:
+            candidates = sorted({position for cell in self.__cells(*search) for position in self.__grid.get(cell, ())})
+
+        matches: List[Dict[str, Any]] = []
+        for position in candidates:
+            element = self.elements[position]
+            x, y = element["x"], element["y"]
+            x_end, y_end = x + element["width"], y + element["height"]
+
+            if (
+                (x_min <= x <= x_max and y_min <= y <= y_max)
+                or (x_min <= x_end <= x_max and y_min <= y_end <= y_max)
+                or (x <= x_min <= x_end and y <= y_min <= y_end)
+                or (x <= x_max <= x_end and y <= y_max <= y_end)
+            ):
+                matches.append(element)
+
+        return matches
+
+
+class OCRCache:
+    """
+    OCR results by image content hash, in memory and optionally as JSON files in `directory`
+    """
+
+    def __init__(self, capacity: int = OCR_CACHE_CAPACITY, directory: Optional[str] = None) -> None:
+        self.__memory = LRUCache(capacity=capacity)
+        self.__directory: Optional[str] = directory
+        self.__stats: Dict[str, int] = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __path(self, image_hash: str) -> str:
+        return os.path.join(self.__directory, f"{image_hash}.json")
+
+    def __read(self, image_hash: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the elements stored on disk for `image_hash`, if any
+        """
+
+        if not self.__directory or not os.path.exists(self.__path(image_hash)):
+            return None
+
+        try:
+            with open(self.__path(image_hash)) as ocr_file:
+                return json.load(ocr_file)
+        except (OSError, ValueError) as exception:
+            logger.warning("[OCRCache]: Ignoring unreadable entry %s: %s", image_hash, exception)
+            return None
+
+    def __write(self, image_hash: str, elements: List[Dict[str, Any]]) -> None:
+        """
+        Atomically stores `elements` on disk
+        """
+
+        temporary_path = f"{self.__path(image_hash)}.tmp"
+        with open(temporary_path, "w") as ocr_file:
+            json.dump(elements, ocr_file)
+
+        os.replace(temporary_path, self.__path(image_hash))
+
+    def get(self, image_hash: str, compute: Callable[[], List[Dict[str, Any]]]) -> OCRIndex:
+        """
+        Returns the indexed OCR result for `image_hash`, running `compute` only if neither tier has it
+        """
+
+        if (index := self.__memory.get(image_hash)) is not None:
+            self.__stats["hits"] += 1
+            LOOKUPS.inc(result="hit")
+            return index
+
+        if (elements := self.__read(image_hash)) is not None:
+            self.__stats["disk_hits"] += 1
+            LOOKUPS.inc(result="disk_hit")
+        else:
+            self.__stats["misses"] += 1
+            LOOKUPS.inc(result="miss")
+            elements = compute()
+
+            if self.__directory:
+                self.__write(image_hash, elements)
+
+        index = OCRIndex(elements)
+        self.__memory.set(image_hash, index)
+
+        return index
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns hit / disk hit / miss counters
+        """
+
+        return dict(self.__stats)
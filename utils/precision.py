@@ -0,0 +1,64 @@
+import logging
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, ContextManager
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from torch import nn
+
+PRECISIONS = {"fp32", "int8", "bf16"}
+
+
+def bf16_supported() -> bool:
+    """
+    Whether the CPU has native bfloat16 support (AVX512-BF16 or AMX)
+    """
+
+    import torch
+
+    checks = ("_is_avx512_bf16_supported", "_is_amx_tile_supported")
+    return any(getattr(torch.cpu, check, lambda: False)() for check in checks)
+
+
+def resolve(precision: str) -> str:
+    """
+    Validates `precision`, falling back to fp32 when bf16 is not supported by this CPU
+    """
+
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {sorted(PRECISIONS)}")
+
+    if precision == "bf16" and not bf16_supported():
+        logger.warning("[Precision]: bf16 is not supported on this CPU, using fp32")
+        return "fp32"
+
+    return precision
+
+
+def quantize(model: "nn.Module", precision: str) -> "nn.Module":
+    """
+    Returns `model` prepared for `precision`: int8 dynamically quantizes its linear layers,
+    other precisions leave the weights untouched (bf16 runs under `autocast`).
+    """
+
+    if precision != "int8":
+        return model
+
+    import torch
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def autocast(precision: str) -> ContextManager:
+    """
+    Context in which inference runs at `precision`
+    """
+
+    if precision != "bf16":
+        return nullcontext()
+
+    import torch
+
+    return torch.autocast(device_type="cpu", dtype=torch.bfloat16)
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from constants import REGION_CACHE_BYTES
+
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+ArraysT = Dict[str, np.ndarray]
+
+
+def arrays_size(arrays: ArraysT) -> int:
+    return sum(array.nbytes for array in arrays.values())
+
+
+def boxes_digest(boxes: np.ndarray) -> str:
+    """
+    Short digest identifying a set of boxes, for keys of per-region results
+    """
+
+    return hashlib.sha1(np.ascontiguousarray(boxes, dtype=np.float32).tobytes()).hexdigest()[:16]
+
+
+class RegionCache:
+    """
+    Detection outputs and region embeddings by key (image content hash plus model settings)
+
+    Entries are groups of named NumPy arrays. The memory tier is an LRU bounded by `max_bytes`;
+    with `directory`, entries are also written as `.npz` files and read back on memory misses.
+    """
+
+    def __init__(self, max_bytes: int = REGION_CACHE_BYTES, directory: Optional[str] = None) -> None:
+        self.__memory = LRUCache(capacity=1 << 20, max_bytes=max_bytes, size_of=arrays_size)
+        self.__directory: Optional[str] = directory
+        self.__stats: Dict[str, int] = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.__directory, f"{hashlib.sha1(key.encode()).hexdigest()}.npz")
+
+    def get(self, key: str) -> Optional[ArraysT]:
+        """
+        Returns the arrays stored under `key`, if any
+        """
+
+        if (arrays := self.__memory.get(key)) is not None:
+            self.__stats["hits"] += 1
+            return arrays
+
+        if self.__directory and os.path.exists(path := self.__path(key)):
+            try:
+                with np.load(path) as stored:
+                    arrays = {name: stored[name] for name in stored.files}
+            except (OSError, ValueError) as exception:
+                logger.warning("[RegionCache]: Ignoring unreadable entry %s: %s", path, exception)
+            else:
+                self.__stats["disk_hits"] += 1
+                self.__memory.set(key, arrays)
+                return arrays
+
+        self.__stats["misses"] += 1
+        return None
+
+    def set(self, key: str, arrays: ArraysT) -> None:
+        """
+        Stores `arrays` under `key`
+        """
+
+        self.__memory.set(key, arrays)
+
+        if self.__directory:
+            path = self.__path(key)
+            temporary_path = f"{path}.tmp.npz"
+            np.savez(temporary_path, **arrays)
+            os.replace(temporary_path, path)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns hit / disk hit / miss counters and the memory tier size
+        """
+
+        return {**self.__stats, "entries": len(self.__memory), "bytes": self.__memory.bytes}
@@ -1,8 +1,48 @@
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from sentence_transformers import SentenceTransformer, util
-from torch import Tensor
+import logging
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Union
+
+import numpy as np
+
+from env import NLTK_DATA_DIR
+
+from .lru import LRUCache
+from .metrics import span
+from .precision import autocast, quantize, resolve
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from torch import Tensor
+
+# NLTK resource path -> package name
+NLTK_RESOURCES = {
+    "tokenizers/punkt": "punkt",
+    "corpora/stopwords": "stopwords",
+    "taggers/averaged_perceptron_tagger": "averaged_perceptron_tagger",
+}
+
+
+@lru_cache(maxsize=None)
+def nltk_data(directory: str = NLTK_DATA_DIR) -> None:
+    """
+    Makes the NLTK resources available, downloading only the missing ones into `directory`.
+    Runs once per process.
+    """
+
+    import nltk
+
+    directory = os.path.abspath(directory)
+    if directory not in nltk.data.path:
+        nltk.data.path.insert(0, directory)
+
+    for resource, package in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            logger.info("[TextProcessor]: Downloading NLTK %s to %s", package, directory)
+            nltk.download(package, download_dir=directory, quiet=True)
 
 
 class TextProcessor:
@@ -10,34 +50,74 @@ class TextProcessor:
     Contains utility methods related to Text Embedding and Keywords Extraction
     """
 
-    def __init__(self) -> None:
-        self.__model = SentenceTransformer(model_name_or_path="all-MiniLM-L6-v2")
+    def __init__(self, memo_capacity: int = 2048, precision: str = "fp32") -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self.__precision: str = resolve(precision)
+        self.__model = quantize(SentenceTransformer(model_name_or_path="all-MiniLM-L6-v2"), self.__precision)
+        self.__memo = LRUCache(capacity=memo_capacity)
 
-        nltk.download("punkt", quiet=True)
-        nltk.download("stopwords", quiet=True)
-        nltk.download("averaged_perceptron_tagger", quiet=True)
+        nltk_data()
+        from nltk.corpus import stopwords
 
         self.__stop_words = set(stopwords.words("english"))
 
-    def embedding(self, text: str) -> Tensor:
+    @property
+    def precision(self) -> str:
+        """
+        Precision the embeddings are encoded at (after the bf16 fallback)
+        """
+
+        return self.__precision
+
+    def embedding(self, text: str) -> "Tensor":
+        """
+        Returns Embeddings (memoized for repeated strings)
+        """
+
+        if (cached := self.__memo.get(text)) is not None:
+            return cached
+
+        embedding = self.__encode(text)
+        self.__memo.set(text, embedding)
+
+        return embedding
+
+    def __encode(self, texts: Union[str, List[str]]) -> np.ndarray:
         """
-        Returns Embeddings
+        Encodes at the configured precision, always returning float32
         """
 
-        return self.__model.encode(text)
+        with span("embed", texts=1 if isinstance(texts, str) else len(texts)), autocast(self.__precision):
+            return np.asarray(self.__model.encode(texts), dtype=np.float32)
 
-    def extract(self, prompt: str) -> str:
+    def embeddings(self, texts: List[str]) -> List["Tensor"]:
+        """
+        Returns Embeddings for `texts`, encoding all memo misses in a single batch
+        """
+
+        results = {text: self.__memo.get(text) for text in texts}
+        if missing := [text for text, embedding in results.items() if embedding is None]:
+            for text, embedding in zip(missing, self.__encode(missing)):
+                self.__memo.set(text, embedding)
+                results[text] = embedding
+
+        return [results[text] for text in texts]
+
+    def extract(self, prompt: str, context: Optional["EmbeddingContext"] = None) -> str:
         """
         Extracts the most contextually relevant keyword(s) or phrase(s) from the prompt.
         """
 
+        from nltk import pos_tag, word_tokenize
+
         words = word_tokenize(prompt.lower())
         filtered_words = [
             word for word in words if word.isalnum() and word not in self.__stop_words
         ]
 
         # Part-of-speech tagging to identify nouns and adjectives
-        pos_tags = nltk.pos_tag(filtered_words)
+        pos_tags = pos_tag(filtered_words)
 
         # Combining adjectives and nouns to form meaningful phrases
         phrases = []
@@ -59,11 +139,12 @@ class TextProcessor:
             return prompt  # Fallback to original prompt if no phrases are found
 
         # Computing embeddings for the full prompt and extracted phrases
-        prompt_embedding = self.__model.encode(prompt, convert_to_tensor=True)
-        phrase_embeddings = self.__model.encode(phrases, convert_to_tensor=True)
+        prompt_embedding = np.asarray(context.embedding if context else self.embedding(prompt), dtype=np.float32)
+        phrase_embeddings = np.stack(self.embeddings(phrases)).astype(np.float32)
 
         # Computing cosine similarity between the prompt and each phrase
-        similarities = util.cos_sim(prompt_embedding, phrase_embeddings)[0]
+        norms = np.linalg.norm(phrase_embeddings, axis=1) * np.linalg.norm(prompt_embedding)
+        similarities = (phrase_embeddings @ prompt_embedding / np.where(norms == 0, 1, norms)).tolist()
 
         # Ranking nouns by similarity score
         ranked_phrases = sorted(
@@ -71,3 +152,33 @@ class TextProcessor:
         )
 
         return ranked_phrases[0][0] if ranked_phrases else prompt
+
+
+class EmbeddingContext:
+    """
+    Request-scoped prompt embedding, computed at most once and shared across cache and extraction calls
+    """
+
+    def __init__(self, text_processor: TextProcessor, prompt: str, embedding: Optional["Tensor"] = None) -> None:
+        self.prompt: str = prompt
+        # Exact-match cache key and media content hash, filled in by the cache on first lookup
+        self.key: Optional[str] = None
+        self.media_hash: Optional[str] = None
+
+        self.__embedding: Optional["Tensor"] = embedding
+        self.__text_processor: TextProcessor = text_processor
+
+    @property
+    def embedding(self) -> "Tensor":
+        """
+        Returns the prompt embedding, encoding it on first access
+        """
+
+        if self.__embedding is None:
+            self.__embedding = self.__text_processor.embedding(self.prompt)
+
+        return self.__embedding
+
+    @embedding.setter
+    def embedding(self, embedding: "Tensor") -> None:
+        self.__embedding = embedding
@@ -0,0 +1,114 @@
+import logging
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# cv2 encoder parameter for each format's `compression` setting
+COMPRESSION_PARAMS = {
+    "png": "IMWRITE_PNG_COMPRESSION",  # 0 (fast) - 9 (small)
+    "jpg": "IMWRITE_JPEG_QUALITY",  # 0 - 100
+    "jpeg": "IMWRITE_JPEG_QUALITY",
+    "webp": "IMWRITE_WEBP_QUALITY",  # 1 - 100
+}
+
+
+def encode_params(image_format: str, compression: Optional[int] = None) -> List[int]:
+    """
+    Returns the `cv2.imwrite` parameters for `image_format` at `compression`
+    """
+
+    if image_format not in COMPRESSION_PARAMS:
+        raise ValueError(f"image_format must be one of {sorted(COMPRESSION_PARAMS)}")
+
+    if compression is None:
+        return []
+
+    import cv2
+
+    return [getattr(cv2, COMPRESSION_PARAMS[image_format]), int(compression)]
+
+
+class ImageWriter:
+    """
+    Writes images on a background thread through a bounded queue
+
+    `submit` never blocks the caller: when `max_pending` writes are already queued the image is
+    dropped (and counted), since annotated outputs are diagnostics rather than results.
+    """
+
+    def __init__(self, max_pending: int = 32) -> None:
+        self.__queue: "queue.Queue[Optional[Tuple[str, np.ndarray, List[int]]]]" = queue.Queue(maxsize=max_pending)
+        self.__stats: Dict[str, int] = {"written": 0, "dropped": 0, "failed": 0}
+        self.__closed = False
+
+        self.__thread = threading.Thread(target=self.__run, name="image-writer", daemon=True)
+        self.__thread.start()
+
+    def __run(self) -> None:
+        """
+        Writer loop, a `None` item stops it
+        """
+
+        from cv2 import imwrite
+
+        while (item := self.__queue.get()) is not None:
+            file_path, image, params = item
+
+            try:
+                if not imwrite(file_path, image, params):
+                    raise OSError(f"could not write {file_path}")
+
+                self.__stats["written"] += 1
+            except Exception as exception:
+                self.__stats["failed"] += 1
+                logger.error("[ImageWriter]: %s", exception)
+            finally:
+                self.__queue.task_done()
+
+        self.__queue.task_done()
+
+    def submit(self, file_path: str, image: np.ndarray, params: Optional[List[int]] = None) -> bool:
+        """
+        Queues `image` to be written to `file_path`; returns `False` if it was dropped.
+        `image` must not be modified afterwards.
+        """
+
+        if self.__closed:
+            raise RuntimeError("ImageWriter is closed")
+
+        try:
+            self.__queue.put_nowait((file_path, image, params or []))
+            return True
+        except queue.Full:
+            self.__stats["dropped"] += 1
+            return False
+
+    def flush(self) -> None:
+        """
+        Blocks until every queued image is written
+        """
+
+        self.__queue.join()
+
+    def close(self) -> None:
+        """
+        Writes the queued images and stops the writer thread
+        """
+
+        if self.__closed:
+            return
+
+        self.__closed = True
+        self.__queue.put(None)
+        self.__thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns written / dropped / failed counters
+        """
+
+        return dict(self.__stats)